@@ -2,14 +2,40 @@
 API routes with comprehensive error handling
 backend/api/routes.py
 """
-from fastapi import APIRouter, UploadFile, File, HTTPException, status
-from fastapi.responses import JSONResponse
-from PIL import Image, UnidentifiedImageError
-import io
+from fastapi import APIRouter, UploadFile, File, Header, HTTPException, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel
+from pathlib import Path
+from typing import List, Optional
+import asyncio
+import hmac
 import logging
+import time
 
-from backend.apps.model.predictor import predict_image
-from backend.apps.config import ALLOWED_EXTENSIONS, MAX_FILE_SIZE_MB
+from backend.apps.model import loader
+from backend.apps.model.loader import ModelNotReadyError
+from backend.apps.model.registry import ModelVersionError
+from backend.apps.model.registry_state import registry_state
+from backend.apps.model.batcher import batcher
+from backend.apps.model.tta import TTA_MODES
+from backend.apps.executor import inference_executor, ServerOverloadedError
+from backend.apps.cache import prediction_cache, cache_key
+from backend.apps import encoding, metrics, runtime
+from backend.apps.stream import LatestFrame, PredictionSmoother, StreamClassifier, frame_signature
+from backend.apps.vector_index import embedding_index, VectorIndexError
+from backend.apps.jobs import job_store, job_runner, JobNotFoundError, JobQueueFullError, FINISHED_STATES
+from backend.apps.uploads import (
+    read_upload, sniff_image_format, UploadRejectedError, MULTIPART_OVERHEAD_BYTES, SNIFF_BYTES
+)
+from backend.apps.config import (
+    ALLOWED_EXTENSIONS, MAX_FILE_SIZE_MB, OVERLOAD_RETRY_AFTER_SECONDS,
+    ARCHIVE_EXTENSIONS, MAX_ARCHIVE_SIZE_MB, MAX_BATCH_FILES, MAX_BATCH_REQUEST_MB, BATCH_MAX_SIZE,
+    INFERENCE_BACKEND, PREPROCESS_ENGINE, STREAM_CHANGE_THRESHOLD, STREAM_SMOOTHING,
+    MODEL_DIR, MODEL_ADMIN_TOKEN, API_WORKERS, EMBEDDING_SEARCH_K, EMBEDDING_DUPLICATE_THRESHOLD, JOB_POLL_SECONDS,
+    DETECT_MIN_CONFIDENCE, DETECT_MAX_DETECTIONS
+)
+from backend.utils.image_utils import read_archive, ImageDecodeError, ArchiveError, ArchiveTooLargeError
+from backend.utils.memory_utils import memory_usage
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
@@ -17,6 +43,66 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# Retry-After sent when the job queue is full
+JOB_QUEUE_FULL_RETRY_AFTER_SECONDS = 30
+
+# Largest request body per upload route, enforced as the body arrives
+# (see uploads.BodySizeLimitMiddleware, installed in main.py)
+MAX_FILE_BYTES = MAX_FILE_SIZE_MB * 1024 * 1024
+UPLOAD_BODY_LIMITS = {
+    **dict.fromkeys(("/predict", "/detect", "/embed", "/search"), MAX_FILE_BYTES + MULTIPART_OVERHEAD_BYTES),
+    **dict.fromkeys(("/predict/batch", "/embed/batch", "/jobs"), MAX_BATCH_REQUEST_MB * 1024 * 1024),
+}
+
+# Serving state sampled when /metrics is scraped
+metrics.registry.gauge(
+    "model_info", "Loaded model version, backend and loading state (always 1)",
+    ("model_version", "backend", "preprocess", "state"),
+    function=lambda: {(loader.model_version(), INFERENCE_BACKEND, PREPROCESS_ENGINE, loader.status()["state"]): 1}
+)
+metrics.registry.gauge(
+    "model_weights_bytes", "Weight size of each loaded model version",
+    ("model_version", "active"),
+    function=lambda: {
+        (m["version"], str(m["active"]).lower()): m["weights_mb"] * 1024 * 1024
+        for m in loader.get_predictor().registry.status()["models"]
+    } if loader.is_ready() else {}
+)
+metrics.registry.gauge(
+    "model_ready", "1 once the model is loaded and warmed up",
+    function=lambda: int(loader.is_ready())
+)
+metrics.registry.gauge(
+    "inference_requests_in_flight", "Requests holding an inference slot",
+    function=lambda: inference_executor.stats()["in_flight"]
+)
+metrics.registry.gauge(
+    "batch_queue_depth", "Images waiting for the micro-batcher",
+    function=lambda: batcher.stats()["queue_depth"]
+)
+metrics.registry.gauge(
+    "prediction_cache_entries", "Predictions held in the in-memory cache",
+    function=lambda: prediction_cache.stats()["entries"]
+)
+metrics.registry.gauge(
+    "embedding_index_vectors", "Vectors in the embedding index searched by /search",
+    function=lambda: embedding_index.stats()["count"] if embedding_index is not None else 0
+)
+metrics.registry.gauge(
+    "jobs", "Background classification jobs by state",
+    ("state",),
+    function=lambda: {(state,): count for state, count in job_store.counts().items()}
+)
+overload_rejections = metrics.registry.counter(
+    "overload_rejections_total", "Requests rejected with 503 because all inference slots were taken"
+)
+stream_connections = metrics.registry.gauge(
+    "stream_connections", "Open /ws/predict connections"
+)
+stream_frames = metrics.registry.counter(
+    "stream_frames_total", "Frames received on /ws/predict by outcome (predicted, skipped, dropped, failed)", ("outcome",)
+)
+
 def validate_file_extension(filename: str) -> bool:
     """Check if file has allowed extension"""
     if not filename:
@@ -29,6 +115,160 @@ def validate_file_size(content: bytes) -> bool:
     size_mb = len(content) / (1024 * 1024)
     return size_mb <= MAX_FILE_SIZE_MB
 
+def decode_and_preprocess(content: bytes, out=None):
+    """Decode uploaded bytes and build the model input tensor (blocking)"""
+    return loader.get_predictor().preprocess_bytes(content, out)
+
+async def cached_prediction(key: str, model_version: str) -> Optional[dict]:
+    """Cached prediction for a key, counted as a cache-served prediction"""
+    cached = await prediction_cache.get_async(key)
+    if cached is not None:
+        metrics.predictions.inc(model_version=model_version, source="cache")
+    return cached
+
+def resolve_tta(tta: Optional[str]) -> Optional[str]:
+    """
+    Validate a ?tta= mode; None or "none" means no test-time augmentation
+    
+    Raises:
+        HTTPException: 400 for an unknown mode
+    """
+    if tta is None or tta.lower() in ("", "none"):
+        return None
+    mode = tta.lower()
+    if mode not in TTA_MODES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown TTA mode '{tta}'. Supported: {', '.join(TTA_MODES)}"
+        )
+    return mode
+
+def cache_version(model, tta: Optional[str]) -> str:
+    """Version string the prediction cache is keyed on; TTA results are cached apart"""
+    return f"{model.cache_version}+tta:{tta}" if tta else model.cache_version
+
+def response_format(accept: Optional[str], probabilities: bool = False) -> str:
+    """
+    Response media type for an Accept header (see encoding.py)
+    
+    Args:
+        accept: The request's Accept header
+        probabilities: Whether the endpoint can answer in the packed
+            probabilities format
+    
+    Raises:
+        HTTPException: 406 if none of the accepted formats is available
+    """
+    try:
+        return encoding.negotiate(accept, probabilities)
+    except encoding.NotAcceptableError as e:
+        raise HTTPException(status_code=status.HTTP_406_NOT_ACCEPTABLE, detail=str(e))
+
+def render_response(content, model=None, media_type: str = encoding.JSON_MEDIA_TYPE,
+                    predictions: list = None) -> Response:
+    """
+    Serialise a response body in the negotiated format, timing it as the serialize stage
+    
+    Args:
+        content: Response document (JSON and MessagePack)
+        model: Model version that answered, reported in X-Model-Version
+        media_type: Result of response_format()
+        predictions: The prediction dicts in content, for the probabilities format
+    """
+    headers = {"Vary": "Accept"}
+    if model is not None:
+        headers["X-Model-Version"] = model.version
+    with metrics.stage_timer("serialize"):
+        body = encoding.encode(content, media_type, predictions)
+    return Response(content=body, media_type=media_type, headers=headers)
+
+def require_model():
+    """
+    Return the predictor, or fail fast while the model is loading
+    
+    Raises:
+        HTTPException: 503 with Retry-After if the model is not ready
+    """
+    try:
+        return loader.get_predictor()
+    except ModelNotReadyError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": str(OVERLOAD_RETRY_AFTER_SECONDS)}
+        )
+
+def resolve_model(version: Optional[str] = None):
+    """
+    Resolve the model version a request will use (default: the active one)
+    
+    The returned LoadedModel is held for the whole request, so activating
+    or unloading another version meanwhile does not affect it.
+    
+    Raises:
+        HTTPException: 503 while loading, 404 for a version that is not loaded
+    """
+    predictor = require_model()
+    try:
+        return predictor.get_loaded(version)
+    except ModelVersionError as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(e)
+        )
+
+async def read_image_upload(file: UploadFile) -> bytes:
+    """
+    Validate an uploaded image file and read its bytes
+    
+    Raises:
+        HTTPException: 400 for a missing, empty or non-image file, 413 if too large
+    """
+    # Validate file was provided
+    if not file:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="No file provided"
+        )
+    
+    # Validate filename
+    if not file.filename:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid filename"
+        )
+    
+    # Validate file extension
+    if not validate_file_extension(file.filename):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid file format. Allowed formats: {', '.join(ALLOWED_EXTENSIONS)}"
+        )
+    
+    # Check the spooled size and image header, then read the file once
+    try:
+        with metrics.stage_timer("upload_read"):
+            content = await read_upload(file, MAX_FILE_BYTES)
+    except UploadRejectedError as e:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE if e.too_large else status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        logger.error(f"Error reading file: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Failed to read uploaded file"
+        )
+    
+    # Validate file is not empty
+    if len(content) == 0:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Uploaded file is empty"
+        )
+    return content
+
 @router.get("/")
 async def root():
     """Health check endpoint"""
@@ -40,136 +280,1146 @@ async def root():
 
 @router.get("/health")
 async def health_check():
-    """Detailed health check"""
+    """Detailed health check (always 200 while the process is up)"""
+    model_status = loader.status()
     return {
-        "status": "healthy",
-        "model_loaded": True,
+        "status": "healthy" if model_status["state"] == "ready" else model_status["state"],
+        "model_loaded": loader.is_ready(),
+        "model": model_status,
         "api_version": "1.0.0"
     }
 
+@router.get("/ready")
+async def readiness_check():
+    """Readiness probe: 200 once the model is loaded and warmed up, 503 before"""
+    model_status = loader.status()
+    if not loader.is_ready():
+        return JSONResponse(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, content=model_status)
+    return model_status
+
+@router.get("/stats")
+async def stats():
+    """Runtime statistics for tuning the serving pipeline"""
+    return {
+        "batching": batcher.stats(),
+        "executor": inference_executor.stats(),
+        "cache": prediction_cache.stats(),
+        "cascade": loader.get_predictor().cascade.stats() if loader.is_ready() else None,
+        "jobs": job_runner.stats(),
+        "runtime": runtime.settings(),
+        "memory": memory_usage()
+    }
+
+@router.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus metrics in the text exposition format"""
+    return Response(content=metrics.registry.render(), media_type=metrics.MetricsRegistry.CONTENT_TYPE)
+
+class ModelLoadRequest(BaseModel):
+    """Body of POST /models/load"""
+    path: str
+    version: Optional[str] = None
+    backend: Optional[str] = None
+    activate: bool = True
+
+def require_admin(token: Optional[str]):
+    """
+    Check the admin token for model management endpoints
+
+    Without a configured MODEL_ADMIN_TOKEN the endpoints are disabled, since
+    they load files from disk and change the serving model.
+
+    Raises:
+        HTTPException: 403 if no token is configured, or it is missing or wrong
+    """
+    if not MODEL_ADMIN_TOKEN:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Model management is disabled; set MODEL_ADMIN_TOKEN to enable it"
+        )
+    if not hmac.compare_digest(token or "", MODEL_ADMIN_TOKEN):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Invalid or missing X-Admin-Token"
+        )
+    # A per-process registry change would only reach the worker that got the call
+    if API_WORKERS > 1 and not registry_state.enabled:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="With several workers, set MODEL_REGISTRY_DB_PATH so model changes reach all of them"
+        )
+
+async def update_shared_registry(predictor, operation: str, *args):
+    """
+    Record a registry change in the shared state, then apply it to this worker
+
+    Other workers pick it up within MODEL_REGISTRY_SYNC_SECONDS.
+
+    Raises:
+        ModelVersionError: If the change is invalid for the shared state
+    """
+    sync = predictor.registry_sync
+    update = getattr(registry_state, operation)
+    state = await asyncio.to_thread(update, *args, sync.seed())
+    await asyncio.to_thread(sync.apply, None, state)
+
+def resolve_model_path(path: str) -> str:
+    """
+    Resolve a model file relative to MODEL_DIR, refusing anything outside it
+
+    Raises:
+        HTTPException: 400 for paths outside MODEL_DIR, 404 for missing files
+    """
+    model_dir = Path(MODEL_DIR).resolve()
+    resolved = (model_dir / path).resolve()
+    if not resolved.is_relative_to(model_dir):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Model path must be inside the model directory"
+        )
+    if not resolved.is_file():
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Model file not found: {path}"
+        )
+    return str(resolved)
+
+@router.get("/models")
+async def list_models():
+    """Loaded model versions with memory and load timings, the last swap and load jobs"""
+    predictor = require_model()
+    models = predictor.registry.status()
+    if registry_state.enabled:
+        models["shared_state_revision"] = predictor.registry_sync.revision
+    return models
+
+@router.post("/models/load", status_code=status.HTTP_202_ACCEPTED)
+async def load_model_version(request: ModelLoadRequest, x_admin_token: Optional[str] = Header(None)):
+    """
+    Load a model version in the background
+
+    The model is built and warmed up off the serving path, then (if
+    ``activate``) swapped in for new requests; requests already running
+    finish on the version they started with. Poll GET /models for the job.
+    """
+    require_admin(x_admin_token)
+    predictor = require_model()
+    path, backend = predictor.model_source(resolve_model_path(request.path), request.backend)
+    try:
+        if not registry_state.enabled:
+            return predictor.registry.load_in_background(
+                path, backend, version=request.version, activate=request.activate
+            )
+        # Every worker loads it from the shared state, under the same name
+        version = request.version or await asyncio.to_thread(predictor.default_version, path, backend)
+        await update_shared_registry(predictor, "load", version, path, backend, request.activate)
+        job = predictor.registry.status()["jobs"].get(version)
+        if job is None:
+            # Already loaded from this file
+            return {"path": path, "version": version, "activate": request.activate, "state": "ready", "job": version}
+        return dict(job, job=version)
+    except ModelVersionError as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e)
+        )
+
+@router.post("/models/{version}/activate")
+async def activate_model_version(version: str, x_admin_token: Optional[str] = Header(None)):
+    """Make a loaded version serve requests that don't pin one"""
+    require_admin(x_admin_token)
+    predictor = require_model()
+    try:
+        if not registry_state.enabled:
+            return predictor.registry.activate(version)
+        await update_shared_registry(predictor, "activate", version)
+        registry = predictor.registry
+        if registry.active_version() == version:
+            return registry.status()["last_swap"]
+        # Still loading here; the swap happens once it is warm
+        return {"from": registry.active_version(), "to": version, "pending": True}
+    except ModelVersionError as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(e)
+        )
+
+@router.delete("/models/{version}")
+async def unload_model_version(version: str, x_admin_token: Optional[str] = Header(None)):
+    """Unload an inactive version; requests still using it finish first"""
+    require_admin(x_admin_token)
+    predictor = require_model()
+    registry = predictor.registry
+    known = registry.versions()
+    if registry_state.enabled:
+        _, state = await asyncio.to_thread(registry_state.read)
+        known = state["models"] if state is not None else known
+    if version not in known:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Model version '{version}' is not loaded"
+        )
+    try:
+        if registry_state.enabled:
+            await update_shared_registry(predictor, "unload", version)
+        else:
+            registry.unload(version)
+    except ModelVersionError as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e)
+        )
+    return {"unloaded": version, "active": registry.active_version()}
+
 @router.post("/predict")
-async def predict(file: UploadFile = File(...)):
+async def predict(file: UploadFile = File(...), version: Optional[str] = None, tta: Optional[str] = None,
+                  accept: Optional[str] = Header(None)):
     """
     Predict garbage classification from uploaded image
     
     Args:
         file: Uploaded image file
+        version: Optional model version to pin (default: the active one)
+        tta: Optional test-time augmentation mode (flip, five_crop,
+            ten_crop or multi_scale); probabilities are averaged over the views
+        accept: JSON (default), MessagePack or packed probabilities (see encoding.py)
         
     Returns:
-        JSON with class and confidence
+        Class and confidence in the negotiated format
         
     Raises:
         HTTPException: Various error conditions
     """
+    media_type = response_format(accept, probabilities=True)
     try:
-        # Validate file was provided
-        if not file:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="No file provided"
-            )
+        content = await read_image_upload(file)
+        tta = resolve_tta(tta)
         
-        # Validate filename
-        if not file.filename:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Invalid filename"
-            )
+        # Fail fast while the model is still loading
+        model = resolve_model(version)
+        
+        # Serve repeated uploads from the cache without decoding
+        key = await cache_key(content, cache_version(model, tta))
+        cached = await cached_prediction(key, model.version)
+        if cached is not None:
+            logger.info(f"Cache hit: {file.filename} -> {cached['class']}")
+            return render_response(cached, model, media_type, [cached])
+        
+        # Reserve an in-flight slot; reject straight away when saturated
+        try:
+            with inference_executor.slot():
+                # Decode and preprocess off the event loop
+                try:
+                    tensor = await inference_executor.run(decode_and_preprocess, content)
+                except ImageDecodeError as e:
+                    raise HTTPException(
+                        status_code=status.HTTP_400_BAD_REQUEST,
+                        detail=str(e)
+                    )
+                except Exception as e:
+                    logger.error(f"Error processing image: {e}")
+                    raise HTTPException(
+                        status_code=status.HTTP_400_BAD_REQUEST,
+                        detail="Invalid or corrupted image file"
+                    )
+                
+                # Perform prediction (batched with concurrent requests)
+                try:
+                    result = await batcher.submit(tensor, model, tta)
+                    await prediction_cache.put_async(key, result)
+                    logger.info(f"Successfully predicted: {file.filename} -> {result['class']}")
+                    return render_response(result, model, media_type, [result])
+                    
+                except ValueError as e:
+                    # Model not loaded or validation error
+                    logger.error(f"Prediction validation error: {e}")
+                    raise HTTPException(
+                        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                        detail=str(e)
+                    )
+                except RuntimeError as e:
+                    # Prediction runtime error
+                    logger.error(f"Prediction runtime error: {e}")
+                    raise HTTPException(
+                        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                        detail="Model prediction failed"
+                    )
+                except Exception as e:
+                    # Unexpected error
+                    logger.error(f"Unexpected prediction error: {e}")
+                    raise HTTPException(
+                        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                        detail="An unexpected error occurred during prediction"
+                    )
         
-        # Validate file extension
-        if not validate_file_extension(file.filename):
+        except ServerOverloadedError as e:
+            overload_rejections.inc()
+            logger.warning(f"Rejecting {file.filename}: {e}")
             raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Invalid file format. Allowed formats: {', '.join(ALLOWED_EXTENSIONS)}"
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail=str(e),
+                headers={"Retry-After": str(OVERLOAD_RETRY_AFTER_SECONDS)}
             )
-        
-        # Read file content
+    
+    except HTTPException:
+        # Re-raise HTTP exceptions
+        raise
+    except Exception as e:
+        # Catch-all for any other unexpected errors
+        logger.error(f"Unexpected error in predict endpoint: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="An unexpected error occurred"
+        )
+
+def _validate_batch_item(filename: str, content) -> Optional[str]:
+    """
+    Return an error message for an invalid batch item, or None if it is valid
+
+    ``content`` is the file's bytes, None for an archive member over the
+    size limit, or the UploadRejectedError raised while reading it.
+    """
+    if not filename or not validate_file_extension(filename):
+        return f"Invalid file format. Allowed formats: {', '.join(ALLOWED_EXTENSIONS)}"
+    if isinstance(content, UploadRejectedError):
+        return str(content)
+    if content is None or not validate_file_size(content):
+        return f"File too large. Maximum size: {MAX_FILE_SIZE_MB}MB"
+    if len(content) == 0:
+        return "Uploaded file is empty"
+    if sniff_image_format(content[:SNIFF_BYTES]) is None:
+        return "File content is not a supported image (jpeg, png, gif or bmp)"
+    return None
+
+async def _decode_chunk(predictor, items: list) -> tuple:
+    """
+    Decode and preprocess a chunk of (index, filename, content) items in parallel
+    
+    Each image is written straight into its row of one preallocated batch
+    buffer. Returns the buffer and, per item, None or the decode exception.
+    """
+    buffer = predictor.new_batch_buffer(len(items))
+    outcomes = await asyncio.gather(
+        *(inference_executor.run(decode_and_preprocess, content, row) for (_, _, content), row in zip(items, buffer)),
+        return_exceptions=True
+    )
+    return buffer, [outcome if isinstance(outcome, Exception) else None for outcome in outcomes]
+
+async def read_batch_uploads(files: Optional[List[UploadFile]], archive: Optional[UploadFile]) -> list:
+    """
+    Read (filename, content) pairs from uploaded files and an optional archive
+    
+    The uploaded files and the files extracted from the archive may hold at
+    most MAX_BATCH_REQUEST_MB together; a larger batch is rejected here,
+    before any image is decoded or a job is queued.
+
+    Raises:
+        HTTPException: For an invalid or oversized archive, or too many or no files
+    """
+    # Gather (filename, content) pairs from the uploaded files and archive;
+    # oversized files and non-images are reported without being read
+    uploads = []
+    read_started = time.perf_counter()
+    for upload in files or []:
+        if not validate_file_extension(upload.filename):
+            uploads.append((upload.filename, b""))
+            continue
         try:
-            content = await file.read()
+            uploads.append((upload.filename, await read_upload(upload, MAX_FILE_BYTES)))
+        except UploadRejectedError as e:
+            uploads.append((upload.filename, e))
         except Exception as e:
-            logger.error(f"Error reading file: {e}")
+            logger.error(f"Error reading file {upload.filename}: {e}")
+            uploads.append((upload.filename, b""))
+    if files:
+        metrics.observe_stage("upload_read", time.perf_counter() - read_started)
+    
+    if archive is not None and archive.filename:
+        if archive.filename.rsplit('.', 1)[-1].lower() not in ARCHIVE_EXTENSIONS:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Failed to read uploaded file"
+                detail="Invalid archive format. Supported formats: zip, tar, tar.gz"
             )
-        
-        # Validate file size
-        if not validate_file_size(content):
+        if archive.size is not None and archive.size > MAX_ARCHIVE_SIZE_MB * 1024 * 1024:
             raise HTTPException(
                 status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-                detail=f"File too large. Maximum size: {MAX_FILE_SIZE_MB}MB"
+                detail=f"Archive too large. Maximum size: {MAX_ARCHIVE_SIZE_MB}MB"
             )
-        
-        # Validate file is not empty
-        if len(content) == 0:
+        try:
+            # Members are extracted straight from the spooled upload; the
+            # archive itself is never read into memory
+            archive.file.seek(0)
+            read_bytes = sum(len(content) for _, content in uploads if isinstance(content, bytes))
+            with metrics.stage_timer("upload_read"):
+                uploads.extend(await inference_executor.run(
+                    read_archive, archive.file, MAX_BATCH_FILES, MAX_FILE_BYTES,
+                    MAX_BATCH_REQUEST_MB * 1024 * 1024 - read_bytes
+                ))
+        except ArchiveTooLargeError:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"Archive contents too large. Maximum per batch: {MAX_BATCH_REQUEST_MB}MB of files"
+            )
+        except ArchiveError as e:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Uploaded file is empty"
+                detail=str(e)
             )
+    
+    if not uploads:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="No files provided"
+        )
+    if len(uploads) > MAX_BATCH_FILES:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Too many files. Maximum per batch: {MAX_BATCH_FILES}"
+        )
+    return uploads
+
+def split_batch_items(uploads: list) -> tuple:
+    """
+    One result dict per upload (with ``error`` for invalid items) and the
+    valid (index, filename, content) items
+    """
+    results = [{"filename": filename} for filename, _ in uploads]
+    valid = []
+    for index, (filename, content) in enumerate(uploads):
+        error = _validate_batch_item(filename, content)
+        if error:
+            results[index]["error"] = error
+        else:
+            valid.append((index, filename, content))
+    return results, valid
+
+@router.post("/predict/batch")
+async def predict_batch_endpoint(
+    files: Optional[List[UploadFile]] = File(None),
+    archive: Optional[UploadFile] = File(None),
+    version: Optional[str] = None,
+    tta: Optional[str] = None,
+    accept: Optional[str] = Header(None)
+):
+    """
+    Predict garbage classification for many images in one request
+    
+    Args:
+        files: Uploaded image files
+        archive: Optional zip/tar archive of images
+        version: Optional model version to pin (default: the active one)
+        tta: Optional test-time augmentation mode (see /predict)
         
-        # Try to open and validate image
-        try:
-            image = Image.open(io.BytesIO(content))
-            
-            # Validate image can be converted to RGB
-            if image.mode not in ['RGB', 'RGBA', 'L']:
+    Returns:
+        JSON with one result per image, in upload order (files first, then
+        archive members). Invalid items carry an ``error`` instead of
+        failing the whole batch.
+        
+    Raises:
+        HTTPException: If the request itself is invalid or the server is saturated
+    """
+    media_type = response_format(accept, probabilities=True)
+    tta = resolve_tta(tta)
+    uploads = await read_batch_uploads(files, archive)
+    results, valid = split_batch_items(uploads)
+    
+    # One model version for the whole batch, even if another is activated meanwhile
+    model = resolve_model(version) if valid else None
+    predictor = loader.get_predictor() if valid else None
+    
+    # Answer previously seen images from the cache
+    keys = {}
+    misses = []
+    hashed = await asyncio.gather(*(cache_key(c, cache_version(model, tta)) for _, _, c in valid))
+    for (index, filename, content), key in zip(valid, hashed):
+        cached = await cached_prediction(key, model.version)
+        if cached is not None:
+            results[index].update(cached)
+        else:
+            keys[index] = key
+            misses.append((index, filename, content))
+    valid = misses
+    
+    try:
+        with inference_executor.slot():
+            # Decode chunk i+1 while chunk i runs through the model, so at
+            # most two chunks of tensors are held in memory at once
+            chunks = [valid[i:i + BATCH_MAX_SIZE] for i in range(0, len(valid), BATCH_MAX_SIZE)]
+            pending = asyncio.ensure_future(_decode_chunk(predictor, chunks[0])) if chunks else None
+            try:
+                for position, chunk in enumerate(chunks):
+                    buffer, errors = await pending
+                    if position + 1 < len(chunks):
+                        pending = asyncio.ensure_future(_decode_chunk(predictor, chunks[position + 1]))
+                
+                    ready = []
+                    for row, ((index, filename, _), error) in enumerate(zip(chunk, errors)):
+                        if isinstance(error, ImageDecodeError):
+                            results[index]["error"] = str(error)
+                        elif error is not None:
+                            logger.error(f"Error processing image {filename}: {error}")
+                            results[index]["error"] = "Invalid or corrupted image file"
+                        else:
+                            ready.append((index, row))
+                    if not ready:
+                        continue
+                
+                    # Predict straight from the buffer unless rows have to be dropped
+                    batch = buffer if len(ready) == len(chunk) else buffer[[row for _, row in ready]]
+                    try:
+                        predictions = await inference_executor.run(predictor.predict_batch, batch, model, tta)
+                    except ValueError as e:
+                        # Model not loaded: nothing in the batch can succeed
+                        logger.error(f"Batch prediction validation error: {e}")
+                        raise HTTPException(
+                            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                            detail=str(e)
+                        )
+                    except Exception as e:
+                        logger.error(f"Batch prediction error: {e}")
+                        for index, _ in ready:
+                            results[index]["error"] = "Model prediction failed"
+                        continue
+                
+                    await asyncio.gather(*(
+                        prediction_cache.put_async(keys[index], prediction)
+                        for (index, _), prediction in zip(ready, predictions)
+                    ))
+                    for (index, _), prediction in zip(ready, predictions):
+                        results[index].update(prediction)
+            finally:
+                # Don't leave a look-ahead decode running if we bailed out early
+                if pending is not None and not pending.done():
+                    pending.cancel()
+    
+    except ServerOverloadedError as e:
+        overload_rejections.inc()
+        logger.warning(f"Rejecting batch of {len(uploads)} files: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": str(OVERLOAD_RETRY_AFTER_SECONDS)}
+        )
+    
+    failed = sum(1 for result in results if "error" in result)
+    logger.info(f"Batch prediction: {len(results) - failed}/{len(results)} succeeded")
+    return render_response({
+        "total": len(results),
+        "succeeded": len(results) - failed,
+        "failed": failed,
+        "results": results
+    }, model, media_type, results)
+
+# Decimals kept for embedding values in JSON responses
+EMBEDDING_DECIMALS = 6
+
+def format_embedding(embedding) -> list:
+    """Embedding as a JSON list, rounded to keep responses compact"""
+    # Round in float64: float32 values would print with spurious digits
+    return embedding.astype("float64").round(EMBEDDING_DECIMALS).tolist()
+
+async def embed_upload(content: bytes, model) -> tuple:
+    """
+    Prediction and embedding for one uploaded image
+    
+    Raises:
+        HTTPException: 400 for unreadable images, 501 if the backend has no
+            embeddings, 503 when saturated, 500 on prediction errors
+    """
+    predictor = loader.get_predictor()
+    try:
+        with inference_executor.slot():
+            try:
+                tensor = await inference_executor.run(decode_and_preprocess, content)
+            except ImageDecodeError as e:
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
-                    detail=f"Unsupported image mode: {image.mode}"
+                    detail=str(e)
                 )
-            
-            # Convert to RGB
-            image = image.convert("RGB")
-            
-        except UnidentifiedImageError:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Cannot identify image file. File may be corrupted."
-            )
-        except Exception as e:
-            logger.error(f"Error processing image: {e}")
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Invalid or corrupted image file"
+            except Exception as e:
+                logger.error(f"Error processing image: {e}")
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Invalid or corrupted image file"
+                )
+            predictions, embeddings = await inference_executor.run(
+                predictor.predict_and_embed, tensor.unsqueeze(0), model
             )
+            return predictions[0], embeddings[0]
+    except ServerOverloadedError as e:
+        overload_rejections.inc()
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": str(OVERLOAD_RETRY_AFTER_SECONDS)}
+        )
+    except ValueError as e:
+        # e.g. the onnx backend, which only exposes logits
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail=str(e)
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Embedding error: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Model prediction failed"
+        )
+
+@router.post("/detect")
+async def detect(
+    file: UploadFile = File(...),
+    version: Optional[str] = None,
+    min_confidence: float = DETECT_MIN_CONFIDENCE,
+    max_detections: int = DETECT_MAX_DETECTIONS,
+    accept: Optional[str] = Header(None)
+):
+    """
+    Locate and classify the individual items in an image
+    
+    The backbone runs once on the image (at DETECT_IMAGE_SIZE); windows of
+    its feature map are classified together and overlapping ones merged,
+    so more items do not mean more forward passes.
+    
+    Args:
+        file: Uploaded image file
+        version: Optional model version to pin (default: the active one)
+        min_confidence: Smallest class probability for a region to be reported
+        max_detections: Most regions to report (1-100)
         
-        # Perform prediction
-        try:
-            result = predict_image(image)
-            logger.info(f"Successfully predicted: {file.filename} -> {result['class']}")
-            return result
-            
-        except ValueError as e:
-            # Model not loaded or validation error
-            logger.error(f"Prediction validation error: {e}")
-            raise HTTPException(
-                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-                detail=str(e)
-            )
-        except RuntimeError as e:
-            # Prediction runtime error
-            logger.error(f"Prediction runtime error: {e}")
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Model prediction failed"
-            )
-        except Exception as e:
-            # Unexpected error
-            logger.error(f"Unexpected prediction error: {e}")
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="An unexpected error occurred during prediction"
-            )
+    Returns:
+        JSON with the image size, the whole-image prediction under ``image``
+        and ``detections``: one prediction per item with its pixel ``box``
+        [x0, y0, x1, y1], most confident first
+        
+    Raises:
+        HTTPException: Various error conditions
+    """
+    media_type = response_format(accept)
+    if not 0.0 <= min_confidence <= 1.0 or not 1 <= max_detections <= 100:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="min_confidence must be between 0 and 1 and max_detections between 1 and 100"
+        )
+    content = await read_image_upload(file)
+    model = resolve_model(version)
+    predictor = loader.get_predictor()
     
+    key = await cache_key(content, f"{model.cache_version}+detect:{min_confidence:g}:{max_detections}")
+    cached = await cached_prediction(key, model.version)
+    if cached is not None:
+        return render_response(cached, model, media_type)
+    
+    try:
+        with inference_executor.slot():
+            try:
+                tensor, size = await inference_executor.run(predictor.preprocess_for_detection, content)
+            except ImageDecodeError as e:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=str(e)
+                )
+            except Exception as e:
+                logger.error(f"Error processing image: {e}")
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Invalid or corrupted image file"
+                )
+            results = await inference_executor.run(
+                predictor.detect_batch, tensor.unsqueeze(0), [size], model, min_confidence, max_detections
+            )
+    except ServerOverloadedError as e:
+        overload_rejections.inc()
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": str(OVERLOAD_RETRY_AFTER_SECONDS)}
+        )
+    except ValueError as e:
+        # e.g. the onnx backend, which only exposes logits
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail=str(e)
+        )
     except HTTPException:
-        # Re-raise HTTP exceptions
         raise
     except Exception as e:
-        # Catch-all for any other unexpected errors
-        logger.error(f"Unexpected error in predict endpoint: {e}")
+        logger.error(f"Detection error: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="An unexpected error occurred"
+            detail="Model prediction failed"
+        )
+    
+    await prediction_cache.put_async(key, results[0])
+    logger.info(f"Detected {results[0]['count']} items in {file.filename}")
+    return render_response(results[0], model, media_type)
+
+@router.post("/embed")
+async def embed(file: UploadFile = File(...), version: Optional[str] = None,
+                accept: Optional[str] = Header(None)):
+    """
+    Image embedding: the L2-normalised 2048-d ResNet50 features before the
+    classifier head, plus the prediction from the same forward pass
+    """
+    media_type = response_format(accept)
+    content = await read_image_upload(file)
+    model = resolve_model(version)
+    prediction, embedding = await embed_upload(content, model)
+    return render_response({
+        **prediction,
+        "dim": len(embedding),
+        "embedding": format_embedding(embedding)
+    }, model, media_type)
+
+@router.post("/embed/batch")
+async def embed_batch_endpoint(
+    files: Optional[List[UploadFile]] = File(None),
+    archive: Optional[UploadFile] = File(None),
+    version: Optional[str] = None,
+    accept: Optional[str] = Header(None)
+):
+    """
+    Embeddings and predictions for many images (files and/or an archive),
+    one result per image in upload order; invalid items carry an ``error``
+    """
+    media_type = response_format(accept)
+    uploads = await read_batch_uploads(files, archive)
+    results, valid = split_batch_items(uploads)
+    model = resolve_model(version) if valid else None
+    predictor = loader.get_predictor() if valid else None
+    
+    try:
+        with inference_executor.slot():
+            for start in range(0, len(valid), BATCH_MAX_SIZE):
+                chunk = valid[start:start + BATCH_MAX_SIZE]
+                buffer, errors = await _decode_chunk(predictor, chunk)
+                ready = []
+                for row, ((index, filename, _), error) in enumerate(zip(chunk, errors)):
+                    if isinstance(error, ImageDecodeError):
+                        results[index]["error"] = str(error)
+                    elif error is not None:
+                        logger.error(f"Error processing image {filename}: {error}")
+                        results[index]["error"] = "Invalid or corrupted image file"
+                    else:
+                        ready.append((index, row))
+                if not ready:
+                    continue
+                
+                batch = buffer if len(ready) == len(chunk) else buffer[[row for _, row in ready]]
+                try:
+                    predictions, embeddings = await inference_executor.run(predictor.predict_and_embed, batch, model)
+                except ValueError as e:
+                    raise HTTPException(
+                        status_code=status.HTTP_501_NOT_IMPLEMENTED,
+                        detail=str(e)
+                    )
+                except Exception as e:
+                    logger.error(f"Batch embedding error: {e}")
+                    for index, _ in ready:
+                        results[index]["error"] = "Model prediction failed"
+                    continue
+                
+                for (index, _), prediction, embedding in zip(ready, predictions, embeddings):
+                    results[index].update(prediction, dim=len(embedding), embedding=format_embedding(embedding))
+    
+    except ServerOverloadedError as e:
+        overload_rejections.inc()
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": str(OVERLOAD_RETRY_AFTER_SECONDS)}
+        )
+    
+    failed = sum(1 for result in results if "error" in result)
+    return render_response({
+        "total": len(results),
+        "succeeded": len(results) - failed,
+        "failed": failed,
+        "results": results
+    }, model, media_type)
+
+def require_index():
+    """
+    Return the embedding index and the loaded model version it was built with
+    
+    Raises:
+        HTTPException: 404 if no index is configured, 409 if its model version is not loaded
+    """
+    if embedding_index is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No embedding index configured. Set EMBEDDING_INDEX_DIR."
+        )
+    try:
+        embedding_index.refresh()
+    except VectorIndexError as e:
+        logger.error(f"Embedding index unavailable: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Embedding index unavailable"
+        )
+    
+    # Embeddings of different checkpoints are not comparable
+    predictor = require_model()
+    try:
+        model = predictor.get_loaded(embedding_index.model_version)
+    except ModelVersionError:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"The index was built with model version {embedding_index.model_version}, "
+                   f"which is not loaded. Load it (POST /models/load) or rebuild the index."
+        )
+    return embedding_index, model
+
+@router.get("/index")
+async def index_stats():
+    """Size, model version and IVF state of the embedding index"""
+    if embedding_index is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No embedding index configured. Set EMBEDDING_INDEX_DIR."
+        )
+    return await inference_executor.run(embedding_index.stats)
+
+@router.post("/search")
+async def search(
+    file: UploadFile = File(...),
+    k: int = EMBEDDING_SEARCH_K,
+    threshold: float = EMBEDDING_DUPLICATE_THRESHOLD,
+    exact: bool = False,
+    accept: Optional[str] = Header(None)
+):
+    """
+    Most similar images in the embedding index, with near-duplicate detection
+    
+    Returns the query's prediction, the ``k`` nearest indexed images by
+    cosine similarity (``score``) with their stored metadata, and
+    ``duplicates``: those scoring at least ``threshold``. ``exact`` scans
+    every vector instead of the nearest IVF partitions.
+    """
+    media_type = response_format(accept)
+    content = await read_image_upload(file)
+    if not 1 <= k <= 1000:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="k must be between 1 and 1000"
+        )
+    index, model = require_index()
+    prediction, embedding = await embed_upload(content, model)
+    
+    with metrics.stage_timer("search"):
+        neighbours = (await inference_executor.run(index.search, embedding, k, None, exact))[0]
+        entries = await inference_executor.run(index.metadata, [row for row, _ in neighbours])
+    matches = [
+        {**entry, "id": row, "score": round(score, 4)}
+        for (row, score), entry in zip(neighbours, entries)
+    ]
+    duplicates = [match for match in matches if match["score"] >= threshold]
+    return render_response({
+        "prediction": prediction,
+        "neighbors": matches,
+        "duplicates": duplicates,
+        "is_duplicate": bool(duplicates),
+        "index_size": index.count
+    }, model, media_type)
+
+def require_jobs():
+    """
+    Raises:
+        HTTPException: 404 if the job queue is disabled
+    """
+    if not job_store.enabled:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job queue disabled. Set JOBS_DB_PATH."
+        )
+
+async def get_job(job_id: str) -> dict:
+    """
+    Raises:
+        HTTPException: 404 for an unknown (or expired) job
+    """
+    try:
+        return await asyncio.to_thread(job_store.get, job_id)
+    except JobNotFoundError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Job {job_id} not found"
+        )
+
+@router.post("/jobs", status_code=status.HTTP_202_ACCEPTED)
+async def submit_job(
+    files: Optional[List[UploadFile]] = File(None),
+    archive: Optional[UploadFile] = File(None),
+    version: Optional[str] = None,
+    tta: Optional[str] = None
+):
+    """
+    Queue images for classification in the background
+    
+    Takes the same uploads as /predict/batch but answers as soon as they are
+    stored, with the job id to poll (GET /jobs/{job_id}) or subscribe to
+    (WebSocket /ws/jobs/{job_id}). Jobs are accepted while the model is
+    still loading and survive restarts.
+    
+    Args:
+        files: Uploaded image files
+        archive: Optional zip/tar archive of images
+        version: Optional model version to pin (default: the one active when the job starts)
+        tta: Optional test-time augmentation mode (see /predict)
+        
+    Returns:
+        JSON with the job state (202, with a Location header)
+        
+    Raises:
+        HTTPException: If the request is invalid, or 503 if the queue is full
+    """
+    require_jobs()
+    tta = resolve_tta(tta)
+    if version is not None and loader.is_ready():
+        # Catch an unknown version now rather than when the job starts
+        resolve_model(version)
+    uploads = await read_batch_uploads(files, archive)
+    results, valid = split_batch_items(uploads)
+    
+    contents = {index: content for index, _, content in valid}
+    items = [
+        (result["filename"], contents.get(index), result if "error" in result else None)
+        for index, result in enumerate(results)
+    ]
+    try:
+        job = await asyncio.to_thread(job_store.create, items, version, tta)
+    except JobQueueFullError as e:
+        logger.warning(f"Rejecting job of {len(items)} files: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": str(JOB_QUEUE_FULL_RETRY_AFTER_SECONDS)}
         )
+    job_runner.notify()
+    
+    logger.info(f"Job {job['job_id']} queued: {len(items)} images ({len(items) - len(valid)} rejected)")
+    return JSONResponse(
+        status_code=status.HTTP_202_ACCEPTED,
+        content=job,
+        headers={"Location": f"/jobs/{job['job_id']}"}
+    )
+
+@router.get("/jobs")
+async def list_jobs(limit: int = 50):
+    """Most recent jobs (without results) and the number of jobs per state"""
+    require_jobs()
+    return {
+        "jobs": await asyncio.to_thread(job_store.recent, max(1, min(limit, 500))),
+        "states": await asyncio.to_thread(job_store.counts)
+    }
+
+@router.get("/jobs/{job_id}")
+async def job_status(job_id: str, offset: int = 0, limit: int = 100,
+                     accept: Optional[str] = Header(None)):
+    """
+    Progress of a job and the results stored so far
+    
+    Args:
+        job_id: Id returned by POST /jobs
+        offset: First image position to return results from
+        limit: Maximum results in this response (up to 1000)
+        
+    Returns:
+        JSON with the job state and progress, ``results`` (each with its
+        upload ``index``; images still queued are left out) and
+        ``next_offset`` to continue from
+    """
+    media_type = response_format(accept)
+    require_jobs()
+    job = await get_job(job_id)
+    results = await asyncio.to_thread(job_store.results, job_id, max(0, offset), max(1, min(limit, 1000)))
+    job["results"] = results
+    job["next_offset"] = results[-1]["index"] + 1 if results else max(0, offset)
+    return render_response(job, media_type=media_type)
+
+@router.delete("/jobs/{job_id}")
+async def delete_job(job_id: str):
+    """Cancel a job if it is still running and delete it with its results"""
+    require_jobs()
+    try:
+        return await asyncio.to_thread(job_store.delete, job_id)
+    except JobNotFoundError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Job {job_id} not found"
+        )
+
+@router.websocket("/ws/jobs/{job_id}")
+async def job_progress_stream(websocket: WebSocket, job_id: str):
+    """
+    Push a job's progress and new results until it finishes
+    
+    Sends ``{"type": "progress", ...job state..., "results": [...]}`` each
+    time more images are done, with only the results not sent before (in
+    the order they finished; ``index`` is the upload position), then
+    closes once the job has succeeded or failed. Sends ``{"type": "error"}``
+    and closes if the job does not exist or is deleted.
+    """
+    await websocket.accept()
+    if not job_store.enabled:
+        await websocket.send_json({"type": "error", "detail": "Job queue disabled"})
+        await websocket.close(code=1008)
+        return
+    
+    sent = 0
+    completed = None
+    try:
+        while True:
+            try:
+                job = await asyncio.to_thread(job_store.get, job_id)
+            except JobNotFoundError:
+                await websocket.send_json({"type": "error", "detail": f"Job {job_id} not found"})
+                await websocket.close(code=1008)
+                return
+            
+            if job["completed"] != completed or job["state"] in FINISHED_STATES:
+                completed = job["completed"]
+                results = await asyncio.to_thread(job_store.updates, job_id, sent)
+                sent += len(results)
+                await websocket.send_json({"type": "progress", **job, "results": results})
+            if job["state"] in FINISHED_STATES:
+                await websocket.close()
+                return
+            await asyncio.sleep(JOB_POLL_SECONDS / 2)
+    except WebSocketDisconnect:
+        logger.debug(f"Job {job_id} subscriber disconnected")
 
+async def _classify_frame(content: bytes, version: Optional[str] = None) -> dict:
+    """Classify one streamed frame; errors are returned as messages, not raised"""
+    try:
+        model = loader.get_predictor().get_loaded(version)
+    except ModelNotReadyError as e:
+        return {"type": "error", "detail": str(e), "retry_after": OVERLOAD_RETRY_AFTER_SECONDS}
+    except ModelVersionError as e:
+        return {"type": "error", "detail": str(e)}
+    
+    try:
+        with inference_executor.slot():
+            tensor = await inference_executor.run(decode_and_preprocess, content)
+            result = await batcher.submit(tensor, model)
+    except ServerOverloadedError as e:
+        overload_rejections.inc()
+        return {"type": "error", "detail": str(e), "retry_after": OVERLOAD_RETRY_AFTER_SECONDS}
+    except ImageDecodeError as e:
+        return {"type": "error", "detail": str(e)}
+    except Exception as e:
+        logger.error(f"Stream prediction error: {e}")
+        return {"type": "error", "detail": "Model prediction failed"}
+    
+    return {"type": "prediction", **result, "model_version": model.version}
+
+async def _stream_reply(stream: StreamClassifier, content: bytes, version: Optional[str] = None) -> tuple:
+    """Reply message and metrics outcome for one streamed frame"""
+    if len(content) == 0:
+        return {"type": "error", "detail": "Empty frame"}, "failed"
+    if not validate_file_size(content):
+        return {"type": "error", "detail": f"Frame too large. Maximum size: {MAX_FILE_SIZE_MB}MB"}, "failed"
+    try:
+        signature = await inference_executor.run(frame_signature, content)
+    except ImageDecodeError as e:
+        return {"type": "error", "detail": str(e)}, "failed"
+    
+    if not stream.should_infer(signature):
+        return stream.reuse(), "skipped"
+    reply = await _classify_frame(content, version)
+    if reply["type"] != "prediction":
+        return reply, "failed"
+    return stream.update(reply, signature), "predicted"
 
+@router.websocket("/ws/predict")
+async def predict_stream(websocket: WebSocket):
+    """
+    Classify a continuous stream of camera frames
+    
+    The client sends each frame as one binary message (JPEG/PNG bytes,
+    ideally downscaled). Frames that arrive while the previous one is still
+    being classified replace each other, so only the newest is processed
+    (latest-wins). Every processed frame is answered with a JSON message:
+    ``{"type": "prediction", "frame", "class", "confidence", "all_predictions",
+    "latency_ms", "dropped"}`` or ``{"type": "error", "frame", "detail"}``
+    (plus ``retry_after`` while the model loads or the server is saturated).
+    ``frame`` counts frames received on this connection, ``dropped`` is the
+    total skipped so far.
+    
+    Frames that barely differ from the last classified one reuse its
+    prediction (``"skipped": true``), and labels are smoothed over recent
+    predictions (``raw_class`` is the unsmoothed label). Query parameters
+    override the defaults: ``smoothing`` (ema, majority, none) and
+    ``change_threshold`` (0 classifies every frame). ``version`` pins a
+    model version; otherwise each frame uses the version active when it is
+    classified (``model_version`` in the reply). ``format=msgpack`` sends
+    each reply as a binary MessagePack message instead of JSON text.
+    """
+    await websocket.accept()
+    try:
+        params = websocket.query_params
+        reply_format = params.get("format", "json")
+        if reply_format not in ("json", "msgpack"):
+            raise ValueError(f"Unknown format '{reply_format}'. Use json or msgpack")
+        if reply_format == "msgpack" and encoding.msgpack is None:
+            raise ValueError("format=msgpack needs the msgpack package on the server")
+        binary_replies = reply_format == "msgpack"
+        stream = StreamClassifier(
+            change_threshold=float(params.get("change_threshold", STREAM_CHANGE_THRESHOLD)),
+            smoother=PredictionSmoother(mode=params.get("smoothing", STREAM_SMOOTHING))
+        )
+    except ValueError as e:
+        await websocket.send_json({"type": "error", "detail": str(e)})
+        await websocket.close(code=1008)
+        return
+    
+    frames = LatestFrame()
+    stream_connections.inc()
+    
+    async def receive_frames():
+        try:
+            while True:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    break
+                if message.get("bytes") is not None:
+                    frames.put(message["bytes"])
+        except Exception as e:
+            logger.debug(f"Stream receive ended: {e}")
+        finally:
+            frames.close()
+    
+    receiver = asyncio.create_task(receive_frames())
+    reported_drops = 0
+    try:
+        while True:
+            frame = await frames.get()
+            if frame is None:
+                break
+            sequence, content, received_at = frame
+            
+            reply, outcome = await _stream_reply(stream, content, websocket.query_params.get("version"))
+            stream_frames.inc(outcome=outcome)
+            stream_frames.inc(frames.dropped - reported_drops, outcome="dropped")
+            reported_drops = frames.dropped
+            
+            reply.update({
+                "frame": sequence,
+                "latency_ms": round((time.perf_counter() - received_at) * 1000, 1),
+                "dropped": frames.dropped
+            })
+            if binary_replies:
+                await websocket.send_bytes(encoding.encode_msgpack(reply))
+            else:
+                await websocket.send_text(encoding.encode_json(reply).decode())
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        logger.error(f"Stream error: {e}")
+    finally:
+        receiver.cancel()
+        stream_connections.dec()
+        logger.info(f"Stream closed: {frames.received} frames received, {frames.dropped} dropped, {stream.stats()}")
@@ -0,0 +1,251 @@
+"""
+Content-hash prediction cache with LRU eviction
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from . import metrics
+from .executor import inference_executor
+from .config import CACHE_ENABLED, CACHE_MAX_ENTRIES, CACHE_TTL_SECONDS, CACHE_DISK_DIR
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+# Expired files in the disk tier are swept once every this many writes
+DISK_PRUNE_INTERVAL = 1000
+
+# Uploads larger than this are hashed on the executor instead of the event loop
+INLINE_HASH_BYTES = 256 * 1024
+
+class PredictionCache:
+    """
+    Two-tier cache of prediction results keyed by upload content
+
+    The in-process tier is a bounded LRU with a TTL. The optional disk tier
+    stores one small JSON file per key under ``disk_dir``; it is shared by
+    every worker process pointing at the same directory, and a disk hit is
+    promoted into the local LRU.
+
+    Coroutines use get_async() and put_async(), which run disk-tier file I/O
+    in a worker thread so a slow disk never stalls the event loop. Expired
+    files are swept by a background thread.
+    """
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, ttl_seconds: int = CACHE_TTL_SECONDS,
+                 disk_dir: str = CACHE_DISK_DIR, enabled: bool = CACHE_ENABLED):
+        self.enabled = enabled
+        self.max_entries = max(1, int(max_entries))
+        self.ttl = ttl_seconds
+        self.disk_dir = disk_dir or None
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_writes = 0
+        self._pruning = False
+
+        self._counters = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "stores": 0,
+        }
+
+        if self.enabled and self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            logger.info(f"Prediction cache disk tier: {self.disk_dir}")
+
+    @staticmethod
+    def key(content: bytes, model_version: str) -> str:
+        """Cache key for uploaded bytes under a given model version"""
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(model_version.encode())
+        digest.update(b"\0")
+        digest.update(content)
+        return digest.hexdigest()
+
+    def get(self, key: str):
+        """Return the cached result for key, or None on a miss"""
+        if not self.enabled:
+            return None
+        now = time.time()
+        result = self._memory_get(key, now)
+        if result is not None:
+            return result
+        return self._disk_hit(key, self._disk_get(key, now), now)
+
+    async def get_async(self, key: str):
+        """get() for coroutines; a disk-tier lookup runs in a worker thread"""
+        if not self.enabled:
+            return None
+        now = time.time()
+        result = self._memory_get(key, now)
+        if result is not None:
+            return result
+        disk_result = await asyncio.to_thread(self._disk_get, key, now) if self.disk_dir else None
+        return self._disk_hit(key, disk_result, now)
+
+    def put(self, key: str, result: dict):
+        """Store a prediction result in both tiers"""
+        if not self.enabled:
+            return
+        self._store(key, result)
+        self._disk_put(key, result)
+
+    async def put_async(self, key: str, result: dict):
+        """put() for coroutines; the disk-tier write runs in a worker thread"""
+        if not self.enabled:
+            return
+        self._store(key, result)
+        if self.disk_dir:
+            await asyncio.to_thread(self._disk_put, key, result)
+
+    def _memory_get(self, key: str, now: float):
+        """Result from the LRU, or None (expired entries are dropped)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, result = entry
+            if expires_at > now:
+                self._entries.move_to_end(key)
+                self._counters["memory_hits"] += 1
+                return result
+            del self._entries[key]
+            self._counters["expirations"] += 1
+            return None
+
+    def _disk_hit(self, key: str, result, now: float):
+        """Count a disk-tier lookup and promote a hit into the LRU"""
+        with self._lock:
+            if result is None:
+                self._counters["misses"] += 1
+                return None
+            self._counters["disk_hits"] += 1
+            self._memory_put(key, result, now)
+        return result
+
+    def _store(self, key: str, result: dict):
+        with self._lock:
+            self._memory_put(key, result, time.time())
+            self._counters["stores"] += 1
+
+    def _memory_put(self, key: str, result: dict, now: float):
+        """Insert into the LRU, evicting the least recently used entries (lock held)"""
+        self._entries[key] = (now + self.ttl, result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._counters["evictions"] += 1
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key[:2], key + ".json")
+
+    def _disk_get(self, key: str, now: float):
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            if os.path.getmtime(path) + self.ttl <= now:
+                os.remove(path)
+                with self._lock:
+                    self._counters["expirations"] += 1
+                return None
+            with open(path, encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable cache entry {path}: {e}")
+            return None
+
+    def _disk_put(self, key: str, result: dict):
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write to a private temp file and rename so readers never see partial JSON
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(result, f)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.warning(f"Failed to write cache entry {path}: {e}")
+            return
+
+        with self._lock:
+            self._disk_writes += 1
+            prune = self._disk_writes % DISK_PRUNE_INTERVAL == 0 and not self._pruning
+            if prune:
+                self._pruning = True
+        if prune:
+            # Walking the whole directory can take seconds; don't hold up the writer
+            threading.Thread(target=self._prune_disk, name="cache-prune", daemon=True).start()
+
+    def _prune_disk(self):
+        """Delete expired files from the disk tier"""
+        try:
+            self._sweep_disk()
+        finally:
+            with self._lock:
+                self._pruning = False
+
+    def _sweep_disk(self):
+        cutoff = time.time() - self.ttl
+        removed = 0
+        for dirpath, _, filenames in os.walk(self.disk_dir):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                try:
+                    if os.path.getmtime(path) <= cutoff:
+                        os.remove(path)
+                        removed += 1
+                except OSError:
+                    continue
+        if removed:
+            with self._lock:
+                self._counters["expirations"] += removed
+            logger.info(f"Pruned {removed} expired prediction cache files")
+
+    def clear(self):
+        """Drop all in-process entries"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """Hit/miss/eviction counters and current size"""
+        with self._lock:
+            counters = dict(self._counters)
+            entries = len(self._entries)
+        lookups = counters["memory_hits"] + counters["disk_hits"] + counters["misses"]
+        hits = counters["memory_hits"] + counters["disk_hits"]
+        return {
+            "enabled": self.enabled,
+            "disk_tier": self.disk_dir is not None,
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            **counters,
+        }
+
+# Shared cache used by the API routes
+prediction_cache = PredictionCache()
+
+async def cache_key(content: bytes, model_version: str) -> str:
+    """Prediction cache key for uploaded bytes under a model version"""
+    started = time.perf_counter()
+    if len(content) < INLINE_HASH_BYTES:
+        key = prediction_cache.key(content, model_version)
+    else:
+        key = await inference_executor.run(prediction_cache.key, content, model_version)
+    metrics.observe_stage("hash", time.perf_counter() - started)
+    return key
@@ -11,11 +11,152 @@ BASE_DIR = Path(__file__).resolve().parent.parent.parent
 MODEL_PATH = os.path.join(BASE_DIR, "backend", "apps", "model", "renset50_model.pth")
 NUM_CLASSES = 10
 DEVICE = "cuda"  # Will fallback to CPU if CUDA not available
+# Memory-map the checkpoint so all workers on a host share one read-only copy of the weights
+MODEL_MMAP = os.getenv("MODEL_MMAP", "1") == "1"
+
+# Inference backend: eager (FP32), torchscript, compile, int8_dynamic (fc head),
+# int8_static (convolutions calibrated on QUANT_CALIBRATION_DIR) or onnx
+# (ONNX Runtime CPU, see backend/tools/export_onnx.py). INT8 and onnx are CPU-only.
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "eager")
+ONNX_MODEL_PATH = os.getenv("ONNX_MODEL_PATH", os.path.splitext(MODEL_PATH)[0] + ".onnx")
+ONNX_INTRA_OP_THREADS = int(os.getenv("ONNX_INTRA_OP_THREADS", "0"))
+QUANT_CALIBRATION_DIR = os.getenv("QUANT_CALIBRATION_DIR", os.path.join(BASE_DIR, "test images"))
+QUANT_CALIBRATION_IMAGES = int(os.getenv("QUANT_CALIBRATION_IMAGES", "64"))
+
+# Model Registry Configuration
+# Several versions can be loaded per worker; unpinned requests use the active one.
+# Runtime loads (POST /models/load) are limited to files under MODEL_DIR. The
+# load/activate/unload endpoints require MODEL_ADMIN_TOKEN in the X-Admin-Token
+# header and answer 403 while it is unset.
+MODEL_DIR = os.getenv("MODEL_DIR", os.path.dirname(MODEL_PATH))
+MODEL_REGISTRY_MAX_LOADED = int(os.getenv("MODEL_REGISTRY_MAX_LOADED", "2"))
+# Extra versions loaded (inactive) after startup, e.g. "v2=renset50_v2.pth,v3=other.onnx"
+MODEL_REGISTRY_PRELOAD = [
+    tuple(entry.split("=", 1)) for entry in os.getenv("MODEL_REGISTRY_PRELOAD", "").split(",") if "=" in entry
+]
+MODEL_ADMIN_TOKEN = os.getenv("MODEL_ADMIN_TOKEN", "")
+# SQLite file through which load/activate/unload reach every worker on the host
+# (see registry_state.py); each worker polls it every MODEL_REGISTRY_SYNC_SECONDS.
+# Empty = per-process registry, and management is refused with WEB_CONCURRENCY > 1.
+MODEL_REGISTRY_DB_PATH = os.getenv("MODEL_REGISTRY_DB_PATH", "")
+MODEL_REGISTRY_SYNC_SECONDS = float(os.getenv("MODEL_REGISTRY_SYNC_SECONDS", "2"))
+
+# Cascade Configuration
+# Small student model (see backend/tools/distill_student.py) that classifies
+# every image first; only images it is less than CASCADE_THRESHOLD confident
+# about are passed to the full model. Empty path = off.
+CASCADE_MODEL_PATH = os.getenv("CASCADE_MODEL_PATH", "")
+CASCADE_THRESHOLD = float(os.getenv("CASCADE_THRESHOLD", "0.9"))
 
 # Image Configuration
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'bmp'}
 MAX_FILE_SIZE_MB = 10
+ARCHIVE_EXTENSIONS = {'zip', 'tar', 'tgz', 'gz'}
+MAX_ARCHIVE_SIZE_MB = int(os.getenv("MAX_ARCHIVE_SIZE_MB", "200"))
+MAX_BATCH_FILES = int(os.getenv("MAX_BATCH_FILES", "500"))
+# Largest /predict/batch or /embed/batch request body (files and archive together);
+# bodies over a route's limit are rejected with 413 as they arrive
+MAX_BATCH_REQUEST_MB = int(os.getenv("MAX_BATCH_REQUEST_MB", str(max(MAX_ARCHIVE_SIZE_MB, 200) + 1)))
 IMAGE_SIZE = (256, 256)
+# "fast": JPEG draft-mode decode plus fused to-tensor/normalise;
+# "torchvision": the original Resize/ToTensor/Normalize pipeline
+PREPROCESS_ENGINE = os.getenv("PREPROCESS_ENGINE", "fast")
+
+# Batching Configuration
+# Concurrent /predict requests are grouped into one forward pass of up to
+# BATCH_MAX_SIZE images, waiting at most BATCH_MAX_WAIT_MS for the batch to fill
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "16"))
+BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", "5"))
+
+# Test-time augmentation (opt-in per request with ?tta=<mode>, see tta.py)
+# Largest number of augmented views run in one forward pass
+TTA_MAX_VIEWS_PER_FORWARD = int(os.getenv("TTA_MAX_VIEWS_PER_FORWARD", "64"))
+
+# Job Queue Configuration
+# Asynchronous jobs (POST /jobs) are kept in a local SQLite database, so queued
+# and partly finished jobs survive restarts; JOB_WORKERS tasks per API process
+# drain it. A job whose worker stops renewing its lease for JOB_LEASE_SECONDS
+# is picked up again. Empty path (the default) = jobs disabled.
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH", "")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "1"))
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+# Queued jobs beyond this are rejected with 503
+JOB_MAX_QUEUED = int(os.getenv("JOB_MAX_QUEUED", "1000"))
+# Submissions are also rejected once the images waiting in the queue hold this much
+JOB_MAX_QUEUED_MB = int(os.getenv("JOB_MAX_QUEUED_MB", "2048"))
+# Finished jobs and their results are deleted after this long
+JOB_RETENTION_HOURS = float(os.getenv("JOB_RETENTION_HOURS", "24"))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "1"))
+
+# Detection Configuration (POST /detect)
+# Images are resized to DETECT_IMAGE_SIZE, so the backbone's feature map has
+# one cell per 32 pixels to place regions on (16x16 at 512)
+DETECT_IMAGE_SIZE = (int(os.getenv("DETECT_IMAGE_SIZE", "512")),) * 2
+# Regions are kept when the model is at least this sure of one class
+DETECT_MIN_CONFIDENCE = float(os.getenv("DETECT_MIN_CONFIDENCE", "0.7"))
+DETECT_MAX_DETECTIONS = int(os.getenv("DETECT_MAX_DETECTIONS", "10"))
+# Overlap (IoU) above which the less confident of two regions is dropped
+DETECT_NMS_IOU = float(os.getenv("DETECT_NMS_IOU", "0.3"))
+
+# Startup Configuration
+# Dummy batch sizes run after loading so first requests don't pay lazy-init costs
+WARMUP_BATCH_SIZES = [
+    int(size) for size in os.getenv("WARMUP_BATCH_SIZES", f"1,{BATCH_MAX_SIZE}").split(",") if size.strip()
+]
+
+# Concurrency Configuration
+# Threads for decoding, preprocessing and inference. Each forward pass already
+# uses TORCH_THREADS intra-op threads, so keep this small: two lets one image
+# decode while another batch runs through the model
+INFERENCE_THREADS = max(1, int(os.getenv("INFERENCE_THREADS", "2")))
+# Requests allowed in decode/inference at once; beyond this /predict answers 503 immediately
+MAX_IN_FLIGHT_REQUESTS = int(os.getenv("MAX_IN_FLIGHT_REQUESTS", "64"))
+OVERLOAD_RETRY_AFTER_SECONDS = 1
+
+# CPU Runtime Configuration (see runtime.py; backend.tools.autotune writes tuned values)
+# API worker processes sharing this machine's cores (uvicorn reads the same variable)
+API_WORKERS = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+# Intra-op threads per worker (0 = one per physical core of the worker's share)
+TORCH_THREADS = int(os.getenv("TORCH_THREADS", "0"))
+# Inter-op threads per worker; the model is one sequential graph, so 1 is enough
+TORCH_INTEROP_THREADS = int(os.getenv("TORCH_INTEROP_THREADS", "1"))
+# Pin each worker to its own share of the cores: "auto" (only with several workers), "on" or "off"
+CPU_AFFINITY = os.getenv("CPU_AFFINITY", "auto")
+# Run convolutions in channels-last (NHWC) memory format. Converting the model
+# copies its conv weights into each worker, undoing MODEL_MMAP's sharing, so
+# it is off by default while MODEL_MMAP is on
+CHANNELS_LAST = os.getenv("CHANNELS_LAST", "0" if MODEL_MMAP else "1") == "1"
+
+# Prediction Cache Configuration
+# Results are keyed by a hash of the uploaded bytes and the model version
+CACHE_ENABLED = os.getenv("PREDICTION_CACHE", "1") == "1"
+CACHE_MAX_ENTRIES = int(os.getenv("PREDICTION_CACHE_MAX_ENTRIES", "4096"))
+CACHE_TTL_SECONDS = int(os.getenv("PREDICTION_CACHE_TTL_SECONDS", "3600"))
+# Shared on-disk tier so all uvicorn workers benefit (empty = memory only)
+CACHE_DISK_DIR = os.getenv("PREDICTION_CACHE_DIR", "")
+
+# Stream Configuration (live camera / WebSocket)
+# Frames whose 32x32 greyscale thumbnail differs from the last classified frame
+# by less than STREAM_CHANGE_THRESHOLD grey levels (mean absolute difference)
+# reuse the previous prediction; 0 classifies every frame. At most
+# STREAM_MAX_SKIP_FRAMES frames in a row are skipped.
+STREAM_CHANGE_THRESHOLD = float(os.getenv("STREAM_CHANGE_THRESHOLD", "3.0"))
+STREAM_MAX_SKIP_FRAMES = int(os.getenv("STREAM_MAX_SKIP_FRAMES", "30"))
+# Label smoothing over recent predictions: "ema", "majority" or "none"
+STREAM_SMOOTHING = os.getenv("STREAM_SMOOTHING", "ema")
+STREAM_EMA_ALPHA = float(os.getenv("STREAM_EMA_ALPHA", "0.5"))
+STREAM_MAJORITY_WINDOW = int(os.getenv("STREAM_MAJORITY_WINDOW", "5"))
+
+# Embedding Index Configuration
+# Directory of the float16 vector index searched by /search (empty = disabled);
+# build it with: python -m backend.tools.bulk_classify --index <dir> ...
+EMBEDDING_INDEX_DIR = os.getenv("EMBEDDING_INDEX_DIR", "")
+EMBEDDING_SEARCH_K = int(os.getenv("EMBEDDING_SEARCH_K", "10"))
+# Cosine similarity at or above which two images count as near-duplicates
+EMBEDDING_DUPLICATE_THRESHOLD = float(os.getenv("EMBEDDING_DUPLICATE_THRESHOLD", "0.95"))
+# IVF partitions scanned per query once the index is trained (more = better recall, slower)
+EMBEDDING_IVF_PROBES = int(os.getenv("EMBEDDING_IVF_PROBES", "8"))
 
 # Model Classes
 CLASSES = [
@@ -0,0 +1,173 @@
+"""
+Response encodings negotiated from the Accept header
+
+- application/json (default): serialised with orjson when it is installed
+  (several times faster than json.dumps for prediction documents),
+  otherwise with the standard library without whitespace.
+- application/msgpack: the same document as MessagePack (optional
+  ``msgpack`` package). Floats stay float64, so rounded values such as
+  0.85 decode exactly as they do from JSON.
+- application/vnd.garbage.probabilities: only the class probabilities,
+  packed for high-rate clients. All integers are little-endian::
+
+      header   uint8 format version (1), uint8 number of classes C,
+               uint16 number of records N
+      record   uint8 index of the top class (255 = image failed),
+               C x float16 probabilities in CLASSES order (NaN if failed)
+
+  A single prediction is 25 bytes instead of ~230 bytes of JSON. Records
+  follow the upload order; filenames, error messages and extra fields are
+  left out, and the model version is in the X-Model-Version header.
+"""
+import json
+import logging
+import struct
+from typing import Optional
+
+import numpy as np
+
+from .config import CLASSES
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+JSON_MEDIA_TYPE = "application/json"
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+PROBABILITIES_MEDIA_TYPE = "application/vnd.garbage.probabilities"
+
+# Other names clients send for the same formats
+MEDIA_TYPE_ALIASES = {"application/x-msgpack": MSGPACK_MEDIA_TYPE}
+
+PROBABILITIES_FORMAT_VERSION = 1
+FAILED_CLASS_INDEX = 255
+PROBABILITIES_HEADER = struct.Struct("<BBH")
+PROBABILITIES_RECORD = np.dtype([("class", "u1"), ("probabilities", "<f2", (len(CLASSES),))])
+CLASS_INDEX = {name: index for index, name in enumerate(CLASSES)}
+
+class NotAcceptableError(ValueError):
+    """Raised when none of the formats the client accepts can be produced"""
+
+def available_media_types(probabilities: bool = False) -> list:
+    """Formats this server can produce, in order of preference"""
+    media_types = [JSON_MEDIA_TYPE]
+    if msgpack is not None:
+        media_types.append(MSGPACK_MEDIA_TYPE)
+    if probabilities:
+        media_types.append(PROBABILITIES_MEDIA_TYPE)
+    return media_types
+
+def _parse_accept(accept: str) -> list:
+    """(media type, q) pairs from an Accept header, most preferred first"""
+    ranges = []
+    for position, part in enumerate(accept.split(",")):
+        media_type, *params = [item.strip() for item in part.split(";")]
+        if not media_type:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        ranges.append((media_type.lower(), quality, position))
+    # Highest q first; the client's order breaks ties
+    ranges.sort(key=lambda item: (-item[1], item[2]))
+    return [(media_type, quality) for media_type, quality, _ in ranges]
+
+def negotiate(accept: Optional[str], probabilities: bool = False) -> str:
+    """
+    Pick the response format for an Accept header
+
+    Args:
+        accept: Accept header value (missing or empty means JSON)
+        probabilities: Whether the endpoint offers the packed probabilities format
+
+    Raises:
+        NotAcceptableError: If the client accepts none of the available formats
+    """
+    offered = available_media_types(probabilities)
+    if not accept:
+        return JSON_MEDIA_TYPE
+    for media_type, quality in _parse_accept(accept):
+        if quality <= 0:
+            continue
+        media_type = MEDIA_TYPE_ALIASES.get(media_type, media_type)
+        if media_type in ("*/*", "application/*"):
+            return JSON_MEDIA_TYPE
+        if media_type in offered:
+            return media_type
+    raise NotAcceptableError(f"Cannot produce {accept}. Available: {', '.join(offered)}")
+
+def encode_json(content) -> bytes:
+    """Compact JSON body"""
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+def encode_msgpack(content) -> bytes:
+    """MessagePack body"""
+    return msgpack.packb(content)
+
+def encode_probabilities(predictions: list) -> bytes:
+    """
+    Pack prediction dicts (with ``all_predictions``) into the probabilities format
+
+    Predictions without ``all_predictions`` (failed images) are written as
+    failed records.
+    """
+    failed = [float("nan")] * len(CLASSES)
+    records = np.empty(len(predictions), dtype=PROBABILITIES_RECORD)
+    # Fill each column in one assignment; per-record assignment is several times slower
+    records["class"] = [
+        CLASS_INDEX[prediction["class"]] if "all_predictions" in prediction else FAILED_CLASS_INDEX
+        for prediction in predictions
+    ]
+    records["probabilities"] = [
+        [prediction["all_predictions"][name] for name in CLASSES] if "all_predictions" in prediction else failed
+        for prediction in predictions
+    ]
+    return PROBABILITIES_HEADER.pack(PROBABILITIES_FORMAT_VERSION, len(CLASSES), len(predictions)) + records.tobytes()
+
+def decode_probabilities(body: bytes) -> tuple:
+    """
+    Inverse of encode_probabilities, for clients and tools
+
+    Returns:
+        tuple: ((N,) uint8 class indices, (N, C) float32 probabilities)
+
+    Raises:
+        ValueError: If the body is not a supported probabilities message
+    """
+    version, classes, count = PROBABILITIES_HEADER.unpack_from(body)
+    if version != PROBABILITIES_FORMAT_VERSION:
+        raise ValueError(f"Unsupported probabilities format version {version}")
+    record = np.dtype([("class", "u1"), ("probabilities", "<f2", (classes,))])
+    records = np.frombuffer(body, dtype=record, count=count, offset=PROBABILITIES_HEADER.size)
+    return records["class"].copy(), records["probabilities"].astype(np.float32)
+
+def encode(content, media_type: str, predictions: list = None) -> bytes:
+    """
+    Encode a response body in a negotiated format
+
+    Args:
+        content: Document for the JSON and MessagePack formats
+        media_type: Result of negotiate()
+        predictions: Prediction dicts for the probabilities format
+    """
+    if media_type == PROBABILITIES_MEDIA_TYPE:
+        return encode_probabilities(predictions)
+    if media_type == MSGPACK_MEDIA_TYPE:
+        return encode_msgpack(content)
+    return encode_json(content)
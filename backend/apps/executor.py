@@ -0,0 +1,88 @@
+"""
+Bounded executor for blocking image decoding and inference work
+"""
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from .config import INFERENCE_THREADS, MAX_IN_FLIGHT_REQUESTS
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+class ServerOverloadedError(Exception):
+    """Raised when the in-flight request limit has been reached"""
+
+class InferenceExecutor:
+    """
+    Thread pool that keeps CPU-heavy work off the asyncio event loop
+
+    PIL decoding and the PyTorch forward pass both release the GIL, so a
+    small thread pool is enough to keep the event loop (and the health
+    endpoints) responsive. Admission is bounded: once ``max_in_flight``
+    requests hold a slot, new requests are rejected immediately instead of
+    queueing without limit.
+    """
+
+    def __init__(self, max_workers: int = INFERENCE_THREADS, max_in_flight: int = MAX_IN_FLIGHT_REQUESTS):
+        # Not torch's intra-op thread count: every pool thread running a
+        # forward pass starts that many threads, so N threads would mean N x N
+        self.max_workers = max(1, int(max_workers))
+        self.max_in_flight = max(1, int(max_in_flight))
+
+        self._pool = None
+        self._in_flight = 0
+        self._peak_in_flight = 0
+        self._rejected = 0
+
+    @contextmanager
+    def slot(self):
+        """
+        Reserve an in-flight slot for the duration of a request
+
+        Only used from the event loop thread, so a plain counter is safe.
+
+        Raises:
+            ServerOverloadedError: If all slots are taken
+        """
+        if self._in_flight >= self.max_in_flight:
+            self._rejected += 1
+            raise ServerOverloadedError(
+                f"Server busy: {self._in_flight} requests in flight (limit {self.max_in_flight})"
+            )
+        self._in_flight += 1
+        self._peak_in_flight = max(self._peak_in_flight, self._in_flight)
+        try:
+            yield
+        finally:
+            self._in_flight -= 1
+
+    async def run(self, func, *args):
+        """Run a blocking callable on the pool and await its result"""
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="inference")
+            logger.info(
+                f"Inference executor started (threads={self.max_workers}, "
+                f"max_in_flight={self.max_in_flight})"
+            )
+        return await asyncio.get_running_loop().run_in_executor(self._pool, func, *args)
+
+    def shutdown(self):
+        """Stop the thread pool; it is recreated on the next run()"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+
+    def stats(self) -> dict:
+        """Current admission and pool statistics"""
+        return {
+            "threads": self.max_workers,
+            "in_flight": self._in_flight,
+            "peak_in_flight": self._peak_in_flight,
+            "max_in_flight": self.max_in_flight,
+            "rejected": self._rejected,
+        }
+
+# Shared executor used by the API routes and the batcher
+inference_executor = InferenceExecutor()
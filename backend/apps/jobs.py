@@ -0,0 +1,584 @@
+"""
+Asynchronous classification jobs backed by a local SQLite queue
+
+POST /jobs stores the uploaded images in a SQLite database and answers
+straight away with a job id; worker tasks in every API process drain the
+queue in the background, BATCH_MAX_SIZE images per forward pass, and store
+each chunk's results as soon as it is done. Clients poll GET /jobs/{id} (or
+subscribe on /ws/jobs/{id}) for progress and the results so far.
+
+A running job holds a lease that its worker renews after every chunk. If
+the process dies, the lease runs out and another worker (or the restarted
+process) picks the job up again, skipping the images that already have a
+result. A job that keeps killing its worker is failed after
+JOB_MAX_ATTEMPTS claims.
+
+Each chunk takes an in-flight slot on the inference executor like a
+/predict request, so background jobs back off instead of starving
+interactive traffic when the server is saturated.
+"""
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Optional
+
+from . import metrics
+from .cache import prediction_cache, cache_key
+from .executor import inference_executor, ServerOverloadedError
+from .model import loader
+from ..utils.image_utils import ImageDecodeError
+from .config import (
+    JOBS_DB_PATH, JOB_WORKERS, JOB_LEASE_SECONDS, JOB_MAX_ATTEMPTS, JOB_MAX_QUEUED,
+    JOB_MAX_QUEUED_MB, JOB_RETENTION_HOURS, JOB_POLL_SECONDS, BATCH_MAX_SIZE
+)
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+JOB_STATES = ("queued", "running", "succeeded", "failed")
+FINISHED_STATES = ("succeeded", "failed")
+
+# Seconds between retention sweeps of finished jobs
+PRUNE_INTERVAL_SECONDS = 300
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    state TEXT NOT NULL,
+    version TEXT,
+    model_version TEXT,
+    tta TEXT,
+    total INTEGER NOT NULL,
+    completed INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    lease_until REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_by_state ON jobs (state, created_at);
+CREATE TABLE IF NOT EXISTS job_items (
+    job_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    filename TEXT,
+    content BLOB,
+    result TEXT,
+    sequence INTEGER,
+    PRIMARY KEY (job_id, position)
+);
+"""
+
+class JobQueueFullError(Exception):
+    """Raised when JOB_MAX_QUEUED jobs or JOB_MAX_QUEUED_MB of images are already waiting"""
+
+class JobNotFoundError(KeyError):
+    """Raised for an unknown (or pruned) job id"""
+
+class JobStore:
+    """
+    Jobs and their images in one SQLite database
+
+    Safe to share between threads and between processes: one connection
+    per store, serialised by a lock, with WAL journaling so readers do not
+    block the worker writing results. Jobs are claimed in an IMMEDIATE
+    transaction, so two processes never run the same job at once. Image
+    bytes are dropped as soon as their result is stored.
+    """
+
+    def __init__(self, path: str = JOBS_DB_PATH, lease_seconds: float = JOB_LEASE_SECONDS,
+                 max_attempts: int = JOB_MAX_ATTEMPTS, max_queued: int = JOB_MAX_QUEUED,
+                 max_queued_bytes: int = JOB_MAX_QUEUED_MB * 1024 * 1024):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max(1, int(max_attempts))
+        self.max_queued = max_queued
+        self.max_queued_bytes = max_queued_bytes
+        self._conn = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            self._conn = conn
+            logger.info(f"Job queue database: {self.path}")
+        return self._conn
+
+    @contextmanager
+    def _write(self):
+        """Connection inside an IMMEDIATE transaction, committed on success"""
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    # -- submission and queries -------------------------------------------
+
+    def create(self, items: list, version: Optional[str] = None, tta: Optional[str] = None) -> dict:
+        """
+        Queue a job
+
+        Args:
+            items: (filename, content, result) per image, in order; items
+                rejected up front have no content and an error result
+            version: Model version to pin (default: the one active when the job starts)
+            tta: Optional test-time augmentation mode
+
+        Returns:
+            dict: The job, as returned by get()
+
+        Raises:
+            JobQueueFullError: If max_queued jobs are already waiting, or the
+                images of unfinished jobs and this one exceed max_queued_bytes
+        """
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        rejected = [position for position, (_, _, result) in enumerate(items) if result is not None]
+        sequences = {position: sequence for sequence, position in enumerate(rejected)}
+        completed = len(rejected)
+        failed = sum(1 for _, _, result in items if result is not None and "error" in result)
+        state = "queued" if completed < len(items) else "succeeded"
+        size = sum(len(content) for _, content, result in items if result is None)
+        with self._write() as conn:
+            queued = conn.execute("SELECT COUNT(*) FROM jobs WHERE state = 'queued'").fetchone()[0]
+            if queued >= self.max_queued:
+                raise JobQueueFullError(f"Job queue full: {queued} jobs waiting (limit {self.max_queued})")
+            # Image bytes are dropped once their result is stored, so this is
+            # what is still waiting to be classified
+            waiting = conn.execute(
+                "SELECT COALESCE(SUM(LENGTH(content)), 0) FROM job_items WHERE content IS NOT NULL"
+            ).fetchone()[0]
+            if waiting + size > self.max_queued_bytes:
+                raise JobQueueFullError(
+                    f"Job queue full: {waiting // (1024 * 1024)}MB of images waiting "
+                    f"(limit {self.max_queued_bytes // (1024 * 1024)}MB)"
+                )
+            conn.execute(
+                "INSERT INTO jobs (id, state, version, tta, total, completed, failed, created_at, finished_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, state, version, tta, len(items), completed, failed, now,
+                 now if state == "succeeded" else None)
+            )
+            conn.executemany(
+                "INSERT INTO job_items (job_id, position, filename, content, result, sequence) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (job_id, position, filename, None if result is not None else content,
+                     None if result is None else json.dumps(result), sequences.get(position))
+                    for position, (filename, content, result) in enumerate(items)
+                ]
+            )
+        return self.get(job_id)
+
+    @staticmethod
+    def _describe(row) -> dict:
+        return {
+            "job_id": row["id"],
+            "state": row["state"],
+            "version": row["version"],
+            "model_version": row["model_version"],
+            "tta": row["tta"],
+            "total": row["total"],
+            "completed": row["completed"],
+            "failed": row["failed"],
+            "progress": round(row["completed"] / row["total"], 4) if row["total"] else 1.0,
+            "error": row["error"],
+            "created_at": row["created_at"],
+            "started_at": row["started_at"],
+            "finished_at": row["finished_at"],
+        }
+
+    def get(self, job_id: str) -> dict:
+        """
+        Job state and progress
+
+        Raises:
+            JobNotFoundError: For an unknown job id
+        """
+        with self._lock:
+            row = self._connection().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            raise JobNotFoundError(job_id)
+        return self._describe(row)
+
+    def results(self, job_id: str, offset: int = 0, limit: int = 100) -> list:
+        """Results stored so far for positions >= offset, in order, at most limit"""
+        with self._lock:
+            rows = self._connection().execute(
+                "SELECT position, filename, result FROM job_items "
+                "WHERE job_id = ? AND position >= ? AND result IS NOT NULL ORDER BY position LIMIT ?",
+                (job_id, offset, limit)
+            ).fetchall()
+        return [dict(json.loads(row["result"]), index=row["position"]) for row in rows]
+
+    def updates(self, job_id: str, since: int = 0) -> list:
+        """
+        Results in the order they were stored, skipping the first since
+
+        A job's n-th stored result has sequence n - 1, so a subscriber that
+        has seen k results asks for updates(job_id, k).
+        """
+        with self._lock:
+            rows = self._connection().execute(
+                "SELECT position, result FROM job_items "
+                "WHERE job_id = ? AND sequence >= ? ORDER BY sequence",
+                (job_id, since)
+            ).fetchall()
+        return [dict(json.loads(row["result"]), index=row["position"]) for row in rows]
+
+    def recent(self, limit: int = 50) -> list:
+        """Most recent jobs first"""
+        with self._lock:
+            rows = self._connection().execute(
+                "SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [self._describe(row) for row in rows]
+
+    def counts(self) -> dict:
+        """Number of jobs per state"""
+        if not self.enabled:
+            return {}
+        with self._lock:
+            rows = self._connection().execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall()
+        counts = dict.fromkeys(JOB_STATES, 0)
+        counts.update({state: count for state, count in rows})
+        return counts
+
+    def delete(self, job_id: str) -> dict:
+        """
+        Cancel a job (if unfinished) and delete it with its results
+
+        A worker running it notices at its next chunk and stops.
+
+        Raises:
+            JobNotFoundError: For an unknown job id
+        """
+        job = self.get(job_id)
+        with self._write() as conn:
+            conn.execute("DELETE FROM job_items WHERE job_id = ?", (job_id,))
+            conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+        if job["state"] not in FINISHED_STATES:
+            job["state"] = "cancelled"
+        return job
+
+    # -- worker side ---------------------------------------------------------
+
+    def claim(self) -> Optional[dict]:
+        """
+        Take the oldest queued job, or a running one whose lease ran out
+
+        Returns:
+            dict: The claimed job, or None if there is nothing to do
+        """
+        now = time.time()
+        with self._write() as conn:
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE state = 'queued' OR (state = 'running' AND lease_until < ?) "
+                "ORDER BY created_at LIMIT 1", (now,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row["attempts"] >= self.max_attempts:
+                # Every earlier claim died without finishing the job
+                conn.execute(
+                    "UPDATE jobs SET state = 'failed', error = ?, finished_at = ? WHERE id = ?",
+                    (f"Abandoned after {row['attempts']} attempts", now, row["id"])
+                )
+                conn.execute("DELETE FROM job_items WHERE job_id = ? AND result IS NULL", (row["id"],))
+                logger.error(f"Job {row['id']} failed after {row['attempts']} attempts")
+                return None
+            conn.execute(
+                "UPDATE jobs SET state = 'running', attempts = attempts + 1, lease_until = ?, "
+                "started_at = COALESCE(started_at, ?) WHERE id = ?",
+                (now + self.lease_seconds, now, row["id"])
+            )
+        if row["state"] == "running":
+            logger.warning(f"Resuming job {row['id']} after its lease expired")
+        return self.get(row["id"])
+
+    def pending(self, job_id: str, limit: int) -> list:
+        """Up to limit (position, filename, content) items without a result"""
+        with self._lock:
+            rows = self._connection().execute(
+                "SELECT position, filename, content FROM job_items "
+                "WHERE job_id = ? AND result IS NULL ORDER BY position LIMIT ?",
+                (job_id, limit)
+            ).fetchall()
+        return [(row["position"], row["filename"], row["content"]) for row in rows]
+
+    def save_results(self, job_id: str, results: list, model_version: str) -> bool:
+        """
+        Store (position, result) pairs and renew the job's lease
+
+        Returns:
+            bool: False if the job was deleted meanwhile (the worker should stop)
+        """
+        now = time.time()
+        with self._write() as conn:
+            row = conn.execute("SELECT completed FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return False
+            conn.executemany(
+                "UPDATE job_items SET result = ?, content = NULL, sequence = ? WHERE job_id = ? AND position = ?",
+                [
+                    (json.dumps(result), row["completed"] + offset, job_id, position)
+                    for offset, (position, result) in enumerate(results)
+                ]
+            )
+            failed = sum(1 for _, result in results if "error" in result)
+            conn.execute(
+                "UPDATE jobs SET completed = completed + ?, failed = failed + ?, model_version = ?, "
+                "lease_until = ? WHERE id = ?",
+                (len(results), failed, model_version, now + self.lease_seconds, job_id)
+            )
+        return True
+
+    def renew(self, job_id: str):
+        """Extend a running job's lease while its worker is waiting"""
+        with self._write() as conn:
+            conn.execute(
+                "UPDATE jobs SET lease_until = ? WHERE id = ? AND state = 'running'",
+                (time.time() + self.lease_seconds, job_id)
+            )
+
+    def release(self, job_id: str):
+        """Put a running job back in the queue without counting the attempt"""
+        with self._write() as conn:
+            conn.execute(
+                "UPDATE jobs SET state = 'queued', attempts = MAX(attempts - 1, 0), lease_until = NULL "
+                "WHERE id = ? AND state = 'running'", (job_id,)
+            )
+
+    def finish(self, job_id: str, error: Optional[str] = None):
+        """Mark a job succeeded, or failed with error (dropping its unprocessed images)"""
+        with self._write() as conn:
+            conn.execute(
+                "UPDATE jobs SET state = ?, error = ?, finished_at = ?, lease_until = NULL WHERE id = ?",
+                ("failed" if error else "succeeded", error, time.time(), job_id)
+            )
+            if error:
+                conn.execute("DELETE FROM job_items WHERE job_id = ? AND result IS NULL", (job_id,))
+
+    def prune(self, retention_seconds: float) -> int:
+        """Delete finished jobs older than retention_seconds; returns how many"""
+        cutoff = time.time() - retention_seconds
+        placeholders = ", ".join("?" for _ in FINISHED_STATES)
+        with self._write() as conn:
+            ids = [row[0] for row in conn.execute(
+                f"SELECT id FROM jobs WHERE state IN ({placeholders}) AND finished_at < ?",
+                (*FINISHED_STATES, cutoff)
+            )]
+            conn.executemany("DELETE FROM job_items WHERE job_id = ?", [(job_id,) for job_id in ids])
+            conn.executemany("DELETE FROM jobs WHERE id = ?", [(job_id,) for job_id in ids])
+        if ids:
+            logger.info(f"Pruned {len(ids)} finished jobs older than {retention_seconds / 3600:g}h")
+        return len(ids)
+
+class JobRunner:
+    """
+    Worker tasks that drain the job queue in this process
+
+    Workers wait for the model to be ready, then claim one job at a time
+    and run it chunk by chunk through the inference executor, like
+    /predict/batch. A chunk that finds every in-flight slot taken waits
+    poll_seconds (keeping the job's lease) and tries again. Between jobs
+    they sleep until a job is submitted to this process or poll_seconds
+    pass (jobs submitted to other processes, expired leases).
+    """
+
+    def __init__(self, store: JobStore, workers: int = JOB_WORKERS, poll_seconds: float = JOB_POLL_SECONDS,
+                 retention_hours: float = JOB_RETENTION_HOURS, chunk_size: int = BATCH_MAX_SIZE):
+        self.store = store
+        self.workers = max(0, int(workers))
+        self.poll_seconds = poll_seconds
+        self.retention_seconds = retention_hours * 3600
+        self.chunk_size = max(1, int(chunk_size))
+        self._tasks = []
+        self._wakeup = None
+        self._last_prune = 0.0
+        self._jobs_run = 0
+        self._images = 0
+
+    async def start(self):
+        """Start the worker tasks if jobs are enabled and they are not running"""
+        if not self.store.enabled or self.workers == 0 or self._tasks:
+            return
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._run(n)) for n in range(self.workers)]
+        logger.info(f"Job runner started ({self.workers} workers, database {self.store.path})")
+
+    async def stop(self):
+        """Cancel the workers, returning the jobs they were running to the queue"""
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+        await asyncio.to_thread(self.store.close)
+
+    def notify(self):
+        """Wake idle workers after a job was submitted"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _idle(self):
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), self.poll_seconds)
+        except asyncio.TimeoutError:
+            pass
+        self._wakeup.clear()
+
+    async def _run(self, worker: int):
+        while True:
+            try:
+                if not loader.is_ready():
+                    await self._idle()
+                    continue
+                if time.time() - self._last_prune > PRUNE_INTERVAL_SECONDS:
+                    self._last_prune = time.time()
+                    await asyncio.to_thread(self.store.prune, self.retention_seconds)
+                job = await asyncio.to_thread(self.store.claim)
+                if job is None:
+                    await self._idle()
+                    continue
+                try:
+                    await self._process(job)
+                except asyncio.CancelledError:
+                    # Shutting down: hand the job straight back instead of
+                    # leaving it until its lease expires. stop() closes the
+                    # store only after this task has finished.
+                    await asyncio.to_thread(self.store.release, job["job_id"])
+                    logger.info(f"Job {job['job_id']} returned to the queue")
+                    raise
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Job worker {worker} error: {e}")
+                await asyncio.sleep(self.poll_seconds)
+
+    async def _process(self, job: dict):
+        """Run one claimed job to completion (or until it is deleted)"""
+        job_id = job["job_id"]
+        started = time.perf_counter()
+        try:
+            predictor = loader.get_predictor()
+            model = predictor.get_loaded(job["version"])
+        except Exception as e:
+            logger.error(f"Job {job_id} cannot start: {e}")
+            await asyncio.to_thread(self.store.finish, job_id, str(e))
+            return
+
+        logger.info(f"Job {job_id}: {job['total'] - job['completed']} images on model {model.version}")
+        version_key = f"{model.cache_version}+tta:{job['tta']}" if job["tta"] else model.cache_version
+        while True:
+            items = await asyncio.to_thread(self.store.pending, job_id, self.chunk_size)
+            if not items:
+                break
+            try:
+                with inference_executor.slot():
+                    results = await self._run_chunk(predictor, model, job["tta"], version_key, items)
+            except ServerOverloadedError:
+                await asyncio.to_thread(self.store.renew, job_id)
+                await asyncio.sleep(self.poll_seconds)
+                continue
+            if not await asyncio.to_thread(self.store.save_results, job_id, results, model.version):
+                logger.info(f"Job {job_id} was deleted, stopping")
+                return
+            self._images += len(results)
+
+        await asyncio.to_thread(self.store.finish, job_id)
+        self._jobs_run += 1
+        loader.mark_first_prediction()
+        logger.info(f"Job {job_id} finished in {time.perf_counter() - started:.2f}s")
+
+    async def _run_chunk(self, predictor, model, tta, version_key: str, items: list) -> list:
+        """(position, result) for a chunk of (position, filename, content) items"""
+        results = []
+        misses = []
+        keys = await asyncio.gather(*(cache_key(content, version_key) for _, _, content in items))
+        for (position, filename, content), key in zip(items, keys):
+            cached = await prediction_cache.get_async(key)
+            if cached is not None:
+                metrics.predictions.inc(model_version=model.version, source="cache")
+                results.append((position, {"filename": filename, **cached}))
+            else:
+                misses.append((position, filename, content, key))
+        if not misses:
+            return results
+
+        buffer = predictor.new_batch_buffer(len(misses))
+        outcomes = await asyncio.gather(
+            *(inference_executor.run(predictor.preprocess_bytes, content, row)
+              for (_, _, content, _), row in zip(misses, buffer)),
+            return_exceptions=True
+        )
+        ready = []
+        for row, ((position, filename, _, key), outcome) in enumerate(zip(misses, outcomes)):
+            if isinstance(outcome, ImageDecodeError):
+                results.append((position, {"filename": filename, "error": str(outcome)}))
+            elif isinstance(outcome, Exception):
+                logger.error(f"Error processing image {filename}: {outcome}")
+                results.append((position, {"filename": filename, "error": "Invalid or corrupted image file"}))
+            else:
+                ready.append((position, filename, key, row))
+        if ready:
+            batch = buffer if len(ready) == len(misses) else buffer[[row for *_, row in ready]]
+            try:
+                predictions = await inference_executor.run(predictor.predict_batch, batch, model, tta)
+            except Exception as e:
+                logger.error(f"Job chunk prediction failed: {e}")
+                predictions = [None] * len(ready)
+            for (position, filename, key, _), prediction in zip(ready, predictions):
+                if prediction is None:
+                    results.append((position, {"filename": filename, "error": "Model prediction failed"}))
+                    continue
+                results.append((position, {"filename": filename, **prediction}))
+            await asyncio.gather(*(
+                prediction_cache.put_async(key, prediction)
+                for (_, _, key, _), prediction in zip(ready, predictions) if prediction is not None
+            ))
+        return results
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.store.enabled,
+            "workers": len(self._tasks),
+            "jobs_run": self._jobs_run,
+            "images": self._images,
+            "states": self.store.counts(),
+        }
+
+# Shared job queue used by the API routes
+job_store = JobStore()
+job_runner = JobRunner(job_store)
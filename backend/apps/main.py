@@ -5,7 +5,13 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 import logging
 
-from backend.api.routes import router
+from backend.api.routes import router, UPLOAD_BODY_LIMITS
+from backend.apps.model import loader
+from backend.apps.model.batcher import batcher
+from backend.apps.jobs import job_runner
+from backend.apps.executor import inference_executor
+from backend.apps.metrics import MetricsMiddleware
+from backend.apps.uploads import BodySizeLimitMiddleware
 from backend.apps.config import CORS_ORIGINS
 
 # Setup logging
@@ -33,6 +39,9 @@ app = FastAPI(
 #         content={"detail": "Internal server error"}
 #    )
 
+# Reject oversized upload bodies as they arrive, before they are parsed
+app.add_middleware(BodySizeLimitMiddleware, limits=UPLOAD_BODY_LIMITS)
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -42,6 +51,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Record request counts and latency per route (scrapes of /metrics excluded)
+app.add_middleware(MetricsMiddleware, exclude_paths=("/metrics",))
+
 # Include API router
 app.include_router(router)
 
@@ -53,11 +65,19 @@ async def startup_event():
     logger.info("=" * 60)
     logger.info("API Documentation: http://localhost:8000/docs")
     logger.info("=" * 60)
+    # Load and warm up the model in the background; /ready reports when done
+    loader.start_background_load()
+    await batcher.start()
+    # Drain queued classification jobs (including ones left from before a restart)
+    await job_runner.start()
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Run on application shutdown"""
     logger.info("Shutting down Garbage Classification API...")
+    await job_runner.stop()
+    await batcher.stop()
+    inference_executor.shutdown()
 
 # Run instructions
 """
@@ -67,7 +87,8 @@ To run this application:
    uvicorn backend.apps.main:app --reload --port 8000
 
 2. Production mode:
-   uvicorn backend.apps.main:app --host 0.0.0.0 --port 8000 --workers 4
+   WEB_CONCURRENCY=4 uvicorn backend.apps.main:app --host 0.0.0.0 --port 8000
+   (WEB_CONCURRENCY also sizes each worker's CPU share, see runtime.py)
 
 3. With FastAPI CLI:
    fastapi dev backend/apps/main.py
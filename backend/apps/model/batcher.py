@@ -0,0 +1,220 @@
+"""
+Dynamic micro-batching scheduler for model inference
+"""
+import asyncio
+import logging
+import time
+from collections import Counter, deque
+
+from . import loader
+from .. import metrics
+from ..executor import inference_executor
+from ..config import BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+# Number of recent queue-wait samples kept for percentile reporting
+WAIT_SAMPLE_SIZE = 2048
+
+class MicroBatcher:
+    """
+    Collects concurrent prediction requests into batches
+
+    Requests are queued as preprocessed image tensors. A single worker task
+    takes the first queued request, keeps collecting until either
+    ``max_batch_size`` requests are available or ``max_wait_ms`` has passed,
+    then runs one forward pass for the whole batch and resolves every
+    waiting request with its own result.
+
+    Each request carries the model version it resolved when it started, so
+    a batch collected across a model swap (or with pinned versions) is run
+    as one forward pass per version. Requests with a test-time augmentation
+    mode are likewise grouped per mode.
+    """
+
+    def __init__(self, max_batch_size: int = BATCH_MAX_SIZE, max_wait_ms: float = BATCH_MAX_WAIT_MS):
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+
+        self._queue = None
+        self._worker = None
+
+        # Stats
+        self._batch_sizes = Counter()
+        self._waits = deque(maxlen=WAIT_SAMPLE_SIZE)
+        self._total_requests = 0
+        self._total_batches = 0
+        self._total_wait = 0.0
+        self._max_wait_seen = 0.0
+
+    async def start(self):
+        """Start the batching worker if it is not already running"""
+        if self._worker is not None and not self._worker.done():
+            return
+        self._queue = asyncio.Queue()
+        self._worker = asyncio.create_task(self._run())
+        logger.info(
+            f"Micro-batcher started (max_batch_size={self.max_batch_size}, "
+            f"max_wait_ms={self.max_wait * 1000:g})"
+        )
+
+    async def stop(self):
+        """Stop the worker and fail any requests still waiting in the queue"""
+        if self._worker is None:
+            return
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+
+        while not self._queue.empty():
+            _, _, _, future, _ = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError("Batcher stopped before prediction"))
+        logger.info("Micro-batcher stopped")
+
+    async def submit(self, tensor, model=None, tta: str = None) -> dict:
+        """
+        Queue one preprocessed image and wait for its prediction
+
+        Args:
+            tensor: Image tensor of shape (3, H, W) from preprocess_image
+            model: LoadedModel to use (default: the version active now)
+            tta: Optional test-time augmentation mode (see tta.py)
+
+        Returns:
+            dict: Prediction results with class and confidence
+
+        Raises:
+            ValueError: If model not loaded or input invalid
+            RuntimeError: If prediction fails
+        """
+        await self.start()
+        if model is None:
+            model = loader.get_predictor().get_loaded()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((tensor, model, tta, future, time.perf_counter()))
+        return await future
+
+    async def _collect(self, batch: list):
+        """
+        Wait for the first request, then fill the batch until size or time limit
+
+        Requests are appended to the caller's list as they are taken off the
+        queue, so the caller can still fail them if collection is cancelled.
+        """
+        batch.append(await self._queue.get())
+        deadline = time.perf_counter() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            # Take whatever is already queued without waiting
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+
+    async def _run(self):
+        """Worker loop: collect a batch, run it, fan results back out"""
+        while True:
+            batch = []
+            try:
+                await self._collect(batch)
+            except asyncio.CancelledError:
+                for _, _, _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(RuntimeError("Batcher stopped before prediction"))
+                raise
+
+            # Drop requests whose caller has already gone away
+            batch = [item for item in batch if not item[3].cancelled()]
+            if not batch:
+                continue
+
+            self._record(batch)
+            groups = {}
+            for item in batch:
+                groups.setdefault((id(item[1]), item[2]), []).append(item)
+
+            try:
+                for items in groups.values():
+                    await self._predict(items[0][1], items, items[0][2])
+            except asyncio.CancelledError:
+                for _, _, _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(RuntimeError("Batcher stopped during prediction"))
+                raise
+            loader.mark_first_prediction()
+
+    async def _predict(self, model, items: list, tta: str = None):
+        """Run one model version (and TTA mode) on its share of a batch and resolve the futures"""
+        tensors = [item[0] for item in items]
+        futures = [item[3] for item in items]
+        try:
+            # Run the forward pass off the event loop
+            predict_tensors = loader.get_predictor().predict_tensors
+            results = await inference_executor.run(predict_tensors, tensors, self.max_batch_size, model, tta)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Batch of {len(items)} failed: {e}")
+            for future in futures:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for future, result in zip(futures, results):
+            if not future.done():
+                future.set_result(result)
+
+    def _record(self, batch: list):
+        """Update batch-size and queue-wait statistics"""
+        now = time.perf_counter()
+        self._batch_sizes[len(batch)] += 1
+        self._total_batches += 1
+        self._total_requests += len(batch)
+        for _, _, _, _, enqueued_at in batch:
+            wait = now - enqueued_at
+            metrics.observe_stage("queue_wait", wait)
+            self._waits.append(wait)
+            self._total_wait += wait
+            self._max_wait_seen = max(self._max_wait_seen, wait)
+
+    def stats(self) -> dict:
+        """Batch-size histogram and queue-wait times (milliseconds)"""
+        waits = sorted(self._waits)
+
+        def percentile(p):
+            if not waits:
+                return 0.0
+            index = min(len(waits) - 1, int(round(p / 100 * (len(waits) - 1))))
+            return round(waits[index] * 1000, 3)
+
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "total_requests": self._total_requests,
+            "total_batches": self._total_batches,
+            "avg_batch_size": round(self._total_requests / self._total_batches, 3) if self._total_batches else 0.0,
+            "batch_size_histogram": {str(size): count for size, count in sorted(self._batch_sizes.items())},
+            "queue_wait_ms": {
+                "avg": round(self._total_wait / self._total_requests * 1000, 3) if self._total_requests else 0.0,
+                "p50": percentile(50),
+                "p95": percentile(95),
+                "p99": percentile(99),
+                "max": round(self._max_wait_seen * 1000, 3),
+            },
+        }
+
+# Shared batcher used by the API routes
+batcher = MicroBatcher()
@@ -0,0 +1,203 @@
+"""
+Early-exit cascade: a small student model answers confident images first
+
+The student (MobileNetV3 or ResNet18, distilled from GarbageModel with
+backend/tools/distill_student.py) classifies every image of a batch. Only
+the images whose top probability is below the threshold are sent on to the
+full model, so easy images cost a fraction of a ResNet50 forward pass.
+"""
+import logging
+import threading
+import time
+
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+import torchvision.models as models
+
+from ..config import CLASSES, IMAGE_SIZE
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+STUDENT_ARCHITECTURES = ("mobilenet_v3_small", "mobilenet_v3_large", "resnet18")
+
+class StudentModel(nn.Module):
+    """
+    Small classifier with the same inputs and classes as GarbageModel
+
+    With input_size set, the (N, 3, H, W) batch built for the full model is
+    resized down before the student sees it, so preprocessing is shared.
+    """
+
+    def __init__(self, arch: str = "mobilenet_v3_large", num_classes: int = len(CLASSES),
+                 input_size: int = None, pretrained: bool = False):
+        super().__init__()
+        if arch not in STUDENT_ARCHITECTURES:
+            raise ValueError(f"Unknown student architecture '{arch}'. Supported: {', '.join(STUDENT_ARCHITECTURES)}")
+        self.arch = arch
+        self.input_size = input_size
+
+        # Pretrained ImageNet weights are only useful as a starting point for distillation
+        self.net = getattr(models, arch)(weights="DEFAULT" if pretrained else None)
+        if arch == "resnet18":
+            self.net.fc = nn.Linear(self.net.fc.in_features, num_classes)
+        else:
+            self.net.classifier[-1] = nn.Linear(self.net.classifier[-1].in_features, num_classes)
+
+    def forward(self, x):
+        if self.input_size and x.shape[-2:] != (self.input_size, self.input_size):
+            x = F.interpolate(x, size=(self.input_size, self.input_size),
+                              mode="bilinear", align_corners=False, antialias=True)
+        return self.net(x)
+
+def save_student(student: StudentModel, path: str, teacher_version: str, **info):
+    """
+    Save a student with what is needed to rebuild and match it
+
+    Args:
+        student: Trained student
+        path: Output file
+        teacher_version: Checkpoint hash of the model it was distilled from
+        **info: Extra JSON-compatible details (training settings, accuracy)
+    """
+    torch.save({
+        "arch": student.arch,
+        "input_size": student.input_size,
+        "classes": list(CLASSES),
+        "teacher_version": teacher_version,
+        "info": info,
+        "state_dict": student.state_dict(),
+    }, path)
+
+def load_student(path: str, device: torch.device) -> StudentModel:
+    """
+    Load a student saved by save_student(), in eval mode on device
+
+    The returned model carries ``teacher_version`` and ``info`` attributes.
+
+    Raises:
+        ValueError: If the student was trained for different classes
+    """
+    checkpoint = torch.load(path, map_location=device, weights_only=True)
+    if checkpoint["classes"] != list(CLASSES):
+        raise ValueError(f"Student {path} was trained for classes {checkpoint['classes']}, not {CLASSES}")
+
+    student = StudentModel(checkpoint["arch"], len(CLASSES), checkpoint["input_size"])
+    student.load_state_dict(checkpoint["state_dict"])
+    student.teacher_version = checkpoint["teacher_version"]
+    student.info = checkpoint.get("info", {})
+    student.to(device)
+    student.eval()
+    return student
+
+def cascade_probabilities(student: nn.Module, net, batch: torch.Tensor, threshold: float) -> tuple:
+    """
+    Class probabilities from the student, replaced by the full model's for
+    the images the student is less than threshold confident about
+
+    Args:
+        student: Small first-stage model
+        net: Full model
+        batch: (N, 3, H, W) input on the models' device
+        threshold: Minimum student confidence to answer without the full model
+
+    Returns:
+        tuple: ((N, C) probabilities on the CPU, (N,) bool tensor of escalated rows)
+    """
+    with torch.no_grad():
+        probabilities = torch.softmax(student(batch), dim=1)
+        escalated = probabilities.max(dim=1).values < threshold
+        rows = escalated.nonzero().flatten()
+        if rows.numel():
+            probabilities[rows] = torch.softmax(net(batch[rows]), dim=1).to(probabilities)
+    return probabilities.cpu(), escalated.cpu()
+
+class Cascade:
+    """
+    Student model in front of the full model
+
+    The student is distilled from one checkpoint, so it is only used in
+    front of model versions built from that checkpoint (compared by
+    content hash via ``fingerprint(path)``). Other versions, e.g. one
+    hot-swapped in after retraining, are served by the full model alone
+    until a matching student is deployed.
+    """
+
+    def __init__(self, path: str, threshold: float, device: torch.device, fingerprint):
+        self.path = path
+        self.threshold = threshold
+        self.device = device
+        self._fingerprint = fingerprint
+        self._student = None
+        self._failed = False
+        self._matches = {}
+        self._lock = threading.Lock()
+        self._images = 0
+        self._escalated = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path) and not self._failed
+
+    def load(self):
+        """Load and warm up the student (once); returns it, or None if disabled"""
+        if self._student is not None or not self.enabled:
+            return self._student
+        with self._lock:
+            if self._student is None and not self._failed:
+                try:
+                    started = time.perf_counter()
+                    student = load_student(self.path, self.device)
+                    with torch.no_grad():
+                        student(torch.zeros(1, 3, *IMAGE_SIZE, device=self.device))
+                    self._student = student
+                    logger.info(
+                        f"Cascade student {student.arch} loaded from {self.path} in "
+                        f"{time.perf_counter() - started:.2f}s (threshold {self.threshold}, "
+                        f"teacher {student.teacher_version})"
+                    )
+                except Exception as e:
+                    self._failed = True
+                    logger.error(f"Cascade disabled, cannot load student {self.path}: {e}")
+        return self._student
+
+    def applies_to(self, model) -> bool:
+        """Whether the student was distilled from this LoadedModel's checkpoint"""
+        student = self.load()
+        if student is None:
+            return False
+        match = self._matches.get(model.path)
+        if match is None:
+            try:
+                match = self._fingerprint(model.path) == student.teacher_version
+            except OSError:
+                match = False
+            if not match:
+                logger.warning(
+                    f"Cascade student was distilled from {student.teacher_version}; "
+                    f"not used for model version {model.version}"
+                )
+            self._matches[model.path] = match
+        return match
+
+    def run(self, net, batch: torch.Tensor) -> tuple:
+        """cascade_probabilities() with the loaded student, counting escalations"""
+        probabilities, escalated = cascade_probabilities(self._student, net, batch, self.threshold)
+        with self._lock:
+            self._images += len(escalated)
+            self._escalated += int(escalated.sum())
+        return probabilities, escalated
+
+    def stats(self) -> dict:
+        student = self._student
+        return {
+            "enabled": self.enabled,
+            "path": self.path or None,
+            "arch": student.arch if student is not None else None,
+            "teacher_version": student.teacher_version if student is not None else None,
+            "threshold": self.threshold,
+            "images": self._images,
+            "escalated": self._escalated,
+            "escalation_rate": round(self._escalated / self._images, 4) if self._images else None,
+        }
@@ -0,0 +1,184 @@
+"""
+Multi-item detection from one backbone pass per image
+
+GarbageModel classifies the average of ResNet50's last feature map. The
+same head applied to the average over a window of that map classifies the
+image region the window covers, so the backbone runs once per image and
+every region after that costs one small matrix product: windows of several
+sizes and aspect ratios are pooled at once with avg_pool2d, the head runs
+on all of them as one batch, and overlapping confident windows are reduced
+with non-maximum suppression.
+
+Sliding windows over one item all see that item, so on their own they
+report it many times. Windows that agree with a confident whole-image
+prediction add nothing to it and are reported as one region, boxed by
+their union. Windows of another class are thinned by non-maximum
+suppression and containment, and the ones left that touch are merged the
+same way. A consequence is that touching items of the same class come back
+as one region.
+
+There is no background class: a region is kept when the model is at least
+min_confidence sure of one class, so empty regions of a cluttered bin can
+still come back as low-confidence "trash". Use a high threshold.
+"""
+import logging
+
+import torch
+import torch.nn.functional as F
+from torchvision.ops import nms
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+# Window sides as fractions of the feature map, and window aspect ratios (width / height)
+WINDOW_SCALES = (0.25, 0.4, 0.6)
+WINDOW_ASPECTS = (1.0, 2.0, 0.5)
+
+# A window overlapping a more confident window of the same class by this much
+# (intersection over the smaller of the two areas) adds nothing to it
+CONTAINMENT_THRESHOLD = 0.5
+
+def window_shapes(height: int, width: int, scales=WINDOW_SCALES, aspects=WINDOW_ASPECTS) -> list:
+    """Distinct (rows, cols) window shapes in feature-map cells"""
+    shapes = []
+    for scale in scales:
+        for aspect in aspects:
+            rows = max(1, min(height, round(height * scale / aspect ** 0.5)))
+            cols = max(1, min(width, round(width * scale * aspect ** 0.5)))
+            if (rows, cols) not in shapes:
+                shapes.append((rows, cols))
+    return shapes
+
+def region_logits(head, feature_map: torch.Tensor, shapes: list) -> tuple:
+    """
+    Class logits for every window of every shape, sliding with half-window strides
+
+    Args:
+        head: The classifier applied to pooled 2048-d features
+        feature_map: (N, C, H, W) backbone output
+        shapes: (rows, cols) window sizes in cells
+
+    Returns:
+        tuple: ((R, 4) boxes as [x0, y0, x1, y1] fractions of the image,
+        (N, R, classes) logits)
+    """
+    n, channels, height, width = feature_map.shape
+    boxes, pooled = [], []
+    for rows, cols in shapes:
+        stride = (max(1, rows // 2), max(1, cols // 2))
+        # ceil_mode adds a final window flush with the bottom/right edge
+        windows = F.avg_pool2d(feature_map, (rows, cols), stride, ceil_mode=True)
+        out_rows, out_cols = windows.shape[-2:]
+        y0 = torch.arange(out_rows, dtype=torch.float32) * stride[0]
+        x0 = torch.arange(out_cols, dtype=torch.float32) * stride[1]
+        y0, x0 = torch.meshgrid(y0, x0, indexing="ij")
+        boxes.append(torch.stack([
+            x0 / width, y0 / height, (x0 + cols).clamp(max=width) / width, (y0 + rows).clamp(max=height) / height
+        ], dim=-1).reshape(-1, 4))
+        pooled.append(windows.flatten(2))
+    features = torch.cat(pooled, dim=2).transpose(1, 2)
+    logits = head(features.reshape(-1, channels)).reshape(n, features.size(1), -1)
+    return torch.cat(boxes), logits
+
+def select_regions(boxes: torch.Tensor, probabilities: torch.Tensor, image_probabilities: torch.Tensor,
+                   min_confidence: float, max_detections: int, iou_threshold: float) -> list:
+    """
+    Confident, non-overlapping regions of one image
+
+    When the whole image is confidently one class, the windows of that
+    class become a single region with the image's probabilities. The other
+    confident windows are suppressed by IoU across classes (one object gets
+    one label), and a window is dropped when it contains, or lies inside, a
+    more confident window of the same class. The windows left of one class
+    that overlap or touch are parts of one item, reported once with the
+    union of their boxes and the probabilities of the most confident of
+    them.
+
+    Returns:
+        list: (box, probabilities) pairs, most confident first
+    """
+    scores, labels = probabilities.max(dim=1)
+    confident = scores >= min_confidence
+    whole_image = []
+    image_score, image_label = image_probabilities.max(dim=0)
+    if image_score >= min_confidence:
+        agree = confident & (labels == image_label)
+        if agree.any():
+            whole_image.append((float(image_score), _union(boxes[agree]), image_probabilities))
+            confident &= ~agree
+
+    items = []
+    candidates = confident.nonzero().flatten()
+    if candidates.numel() > 0:
+        areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+        kept = []
+        for i in candidates[nms(boxes[candidates], scores[candidates], iou_threshold)].tolist():
+            if not any(labels[i] == labels[j] and _intersection(boxes[i], boxes[j])
+                       >= CONTAINMENT_THRESHOLD * min(areas[i], areas[j]) for j in kept):
+                kept.append(i)
+        kept = torch.tensor(kept)
+        for label in labels[kept].unique().tolist():
+            for group in _touching_groups(boxes, kept[labels[kept] == label]):
+                best = group[scores[group].argmax()]
+                items.append((float(scores[best]), _union(boxes[group]), probabilities[best]))
+
+    regions = sorted(whole_image + items, key=lambda region: -region[0])
+    return [(box, region_probabilities) for _, box, region_probabilities in regions[:max_detections]]
+
+def _union(boxes: torch.Tensor) -> torch.Tensor:
+    """Smallest box covering all (K, 4) boxes"""
+    return torch.cat([boxes[:, :2].min(dim=0).values, boxes[:, 2:].max(dim=0).values])
+
+def _intersection(a: torch.Tensor, b: torch.Tensor) -> float:
+    width = min(a[2], b[2]) - max(a[0], b[0])
+    height = min(a[3], b[3]) - max(a[1], b[1])
+    return float(max(width, 0) * max(height, 0))
+
+def _touching_groups(boxes: torch.Tensor, indices: torch.Tensor) -> list:
+    """Split window indices into groups of boxes that overlap or touch, directly or through others"""
+    selected = boxes[indices]
+    top_left = torch.max(selected[:, None, :2], selected[None, :, :2])
+    bottom_right = torch.min(selected[:, None, 2:], selected[None, :, 2:])
+    linked = (bottom_right >= top_left).all(dim=2)
+
+    groups, unvisited = [], set(range(len(indices)))
+    while unvisited:
+        stack = [unvisited.pop()]
+        group = list(stack)
+        while stack:
+            neighbours = set(linked[stack.pop()].nonzero().flatten().tolist()) & unvisited
+            unvisited -= neighbours
+            stack.extend(neighbours)
+            group.extend(neighbours)
+        groups.append(indices[sorted(group)])
+    return groups
+
+def detect_regions(net, batch: torch.Tensor, min_confidence: float, max_detections: int,
+                   iou_threshold: float) -> list:
+    """
+    Image-level probabilities and detected regions for a batch
+
+    Args:
+        net: GarbageModel (its backbone runs once per image)
+        batch: (N, 3, H, W) preprocessed images on the model's device
+        min_confidence: Smallest top-class probability for a region to be kept
+        max_detections: Most regions returned per image
+        iou_threshold: Overlap above which the less confident region is dropped
+
+    Returns:
+        list: Per image, ((classes,) image probabilities, list of (box, probabilities))
+        with boxes as [x0, y0, x1, y1] fractions of the image, on the CPU
+    """
+    with torch.no_grad():
+        feature_map = net.forward_feature_map(batch)
+        head = net.model.fc
+        image_probabilities = torch.softmax(head(feature_map.mean(dim=(2, 3))), dim=1).cpu()
+        shapes = window_shapes(*feature_map.shape[-2:])
+        boxes, logits = region_logits(head, feature_map, shapes)
+        probabilities = torch.softmax(logits, dim=2).cpu()
+    return [
+        (image_probabilities[i], select_regions(
+            boxes, probabilities[i], image_probabilities[i], min_confidence, max_detections, iou_threshold
+        ))
+        for i in range(batch.size(0))
+    ]
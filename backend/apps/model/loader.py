@@ -0,0 +1,126 @@
+"""
+Background model loading, warm-up and readiness tracking
+
+This module deliberately avoids importing torch: the API imports it at
+startup, starts loading in a background thread and can answer /health
+straight away while torch, torchvision and the checkpoint are loaded.
+"""
+import logging
+import os
+import threading
+import time
+
+from ..config import MODEL_DIR, MODEL_REGISTRY_PRELOAD
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+# Approximate process start: this module is imported early by the API
+PROCESS_STARTED = time.time()
+
+class ModelNotReadyError(ValueError):
+    """Raised when a prediction is requested before the model is ready"""
+
+_predictor = None
+_thread = None
+_lock = threading.Lock()
+_ready = threading.Event()
+_state = {
+    "state": "not_loaded",
+    "error": None,
+    "import_seconds": None,
+    "load_seconds": None,
+    "warmup_seconds": None,
+    "ready_after_seconds": None,
+    "first_prediction_after_seconds": None,
+}
+
+def start_background_load():
+    """Start loading the model in a background thread (no-op if already started)"""
+    global _thread
+    with _lock:
+        if _thread is not None:
+            return
+        _state["state"] = "loading"
+        _thread = threading.Thread(target=_load, name="model-loader", daemon=True)
+        _thread.start()
+
+def _load():
+    """Import the predictor, load weights and warm up, recording each stage"""
+    global _predictor
+    try:
+        started = time.perf_counter()
+        from . import predictor
+        imported = time.perf_counter()
+        model = predictor.get_loaded()
+        # Load the cascade student (if configured) before reporting ready
+        predictor.cascade.load()
+
+        _state.update({
+            "import_seconds": round(imported - started, 3),
+            "load_seconds": model.load_seconds,
+            "warmup_seconds": model.warmup_seconds,
+            "ready_after_seconds": round(time.time() - PROCESS_STARTED, 3),
+        })
+        _predictor = predictor
+        _state["state"] = "ready"
+        logger.info(
+            f"Model ready {_state['ready_after_seconds']}s after start "
+            f"(imports {_state['import_seconds']}s, load {_state['load_seconds']}s, "
+            f"warm-up {_state['warmup_seconds']}s)"
+        )
+        _preload(predictor)
+        # Follow load/activate/unload calls made on any worker
+        predictor.registry_sync.start()
+    except Exception as e:
+        _state["state"] = "failed"
+        _state["error"] = str(e)
+        logger.critical(f"Failed to load model at startup: {e}")
+    finally:
+        _ready.set()
+
+def _preload(predictor):
+    """Load MODEL_REGISTRY_PRELOAD versions in the background, inactive"""
+    for version, path in MODEL_REGISTRY_PRELOAD:
+        try:
+            source = predictor.model_source(os.path.join(MODEL_DIR, path.strip()))
+            predictor.registry.load_in_background(*source, version=version.strip(), activate=False)
+        except Exception as e:
+            logger.error(f"Cannot preload model version {version}: {e}")
+
+def wait_until_ready(timeout: float = None) -> bool:
+    """Block until loading finished (successfully or not); True if ready"""
+    _ready.wait(timeout)
+    return _predictor is not None
+
+def is_ready() -> bool:
+    return _predictor is not None
+
+def get_predictor():
+    """
+    Return the predictor module once the model is ready
+
+    Raises:
+        ModelNotReadyError: While loading, or if loading failed
+    """
+    if _predictor is not None:
+        return _predictor
+    if _state["state"] == "failed":
+        raise ModelNotReadyError(f"Model not loaded: {_state['error']}")
+    if _state["state"] == "not_loaded":
+        start_background_load()
+    raise ModelNotReadyError("Model is still loading. Please retry shortly.")
+
+def model_version() -> str:
+    """Version label of the active model ("unloaded" until ready)"""
+    return _predictor.registry.active_version() if _predictor is not None else "unloaded"
+
+def mark_first_prediction():
+    """Record and log the cold-start-to-first-prediction time (once)"""
+    if _state["first_prediction_after_seconds"] is None:
+        _state["first_prediction_after_seconds"] = round(time.time() - PROCESS_STARTED, 3)
+        logger.info(f"First prediction served {_state['first_prediction_after_seconds']}s after start")
+
+def status() -> dict:
+    """Readiness state and startup timings"""
+    return {**_state, "model_version": model_version()}
@@ -1,3 +1,4 @@
+import torch
 import torch.nn as nn
 import torchvision.models as models
 
@@ -21,3 +22,13 @@ class GarbageModel(nn.Module):
 
     def forward(self, x):
         return self.model(x)
+
+    def forward_feature_map(self, x):
+        """Unpooled (N, 2048, H/32, W/32) output of the last backbone stage"""
+        m = self.model
+        x = m.maxpool(m.relu(m.bn1(m.conv1(x))))
+        return m.layer4(m.layer3(m.layer2(m.layer1(x))))
+
+    def forward_features(self, x):
+        """Pooled 2048-d backbone features, the input of the fc head"""
+        return torch.flatten(self.model.avgpool(self.forward_feature_map(x)), 1)
@@ -0,0 +1,53 @@
+"""
+ONNX Runtime serving backend
+"""
+import logging
+import os
+
+import numpy as np
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+INPUT_NAME = "input"
+OUTPUT_NAME = "logits"
+
+class OnnxModel:
+    """
+    Drop-in replacement for the PyTorch model backed by an ONNX Runtime session
+
+    Called with a (N, 3, H, W) batch and returns (N, num_classes) logits,
+    like GarbageModel. Torch tensors are accepted and returned so the rest
+    of the predictor is unchanged; NumPy arrays are passed straight through.
+    """
+
+    def __init__(self, path: str, intra_op_threads: int = 0):
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise ValueError("onnxruntime is not installed. Run: pip install onnxruntime")
+
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"ONNX model not found at: {path}. Export it with backend.tools.export_onnx")
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_threads > 0:
+            options.intra_op_num_threads = intra_op_threads
+
+        self.path = path
+        self.session = ort.InferenceSession(path, sess_options=options, providers=["CPUExecutionProvider"])
+        logger.info(f"ONNX Runtime session ready: {path} (providers={self.session.get_providers()})")
+
+    def run(self, batch: np.ndarray) -> np.ndarray:
+        """Run a float32 NCHW batch and return logits"""
+        return self.session.run([OUTPUT_NAME], {INPUT_NAME: np.ascontiguousarray(batch, dtype=np.float32)})[0]
+
+    def __call__(self, batch):
+        if isinstance(batch, np.ndarray):
+            return self.run(batch)
+        import torch
+        return torch.from_numpy(self.run(batch.detach().cpu().numpy()))
+
+    def eval(self):
+        return self
@@ -0,0 +1,149 @@
+"""
+Inference backends: TorchScript, torch.compile and post-training INT8 quantization
+"""
+import logging
+import os
+from pathlib import Path
+
+import torch
+import torch.nn as nn
+from PIL import Image
+
+from ..config import IMAGE_SIZE, ALLOWED_EXTENSIONS, ONNX_MODEL_PATH, ONNX_INTRA_OP_THREADS
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+SUPPORTED_BACKENDS = ("eager", "torchscript", "compile", "int8_dynamic", "int8_static", "onnx")
+
+# Backends that only run on the CPU
+CPU_ONLY_BACKENDS = ("int8_dynamic", "int8_static", "onnx")
+
+# Backends built from a channels-last FP32 model when CHANNELS_LAST is on
+# (TorchScript's optimize_for_inference and static INT8 pick their own layouts)
+CHANNELS_LAST_BACKENDS = ("eager", "compile", "int8_dynamic")
+
+def example_input(batch_size: int = 1) -> torch.Tensor:
+    """Random input batch with the shape the model is served at"""
+    return torch.randn(batch_size, 3, *IMAGE_SIZE)
+
+def iter_image_paths(folder: str, limit: int = None):
+    """Yield image paths under folder in sorted order, up to limit"""
+    count = 0
+    for dirpath, dirnames, filenames in os.walk(folder):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if name.rsplit('.', 1)[-1].lower() not in ALLOWED_EXTENSIONS:
+                continue
+            yield os.path.join(dirpath, name)
+            count += 1
+            if limit is not None and count >= limit:
+                return
+
+def load_calibration_batches(folder: str, transform, batch_size: int = 8, limit: int = 64) -> list:
+    """Preprocess up to limit images from folder into batches for calibration"""
+    tensors = []
+    for path in iter_image_paths(folder, limit):
+        try:
+            with Image.open(path) as image:
+                tensors.append(transform(image.convert("RGB")))
+        except Exception as e:
+            logger.warning(f"Skipping calibration image {path}: {e}")
+    return [torch.stack(tensors[i:i + batch_size]) for i in range(0, len(tensors), batch_size)]
+
+def to_torchscript(model: nn.Module) -> nn.Module:
+    """Trace, freeze and optimise the model for inference"""
+    with torch.no_grad():
+        traced = torch.jit.trace(model, example_input().to(next(model.parameters()).device))
+    frozen = torch.jit.freeze(traced)
+    return torch.jit.optimize_for_inference(frozen)
+
+def to_compiled(model: nn.Module) -> nn.Module:
+    """Wrap the model with torch.compile (compiled lazily on the first forward)"""
+    return torch.compile(model, dynamic=True)
+
+def quantize_dynamic_head(model: nn.Module) -> nn.Module:
+    """INT8 dynamic quantization of the Linear layers (the fc head)"""
+    return torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+
+def quantize_static(model: nn.Module, calibration_batches: list) -> nn.Module:
+    """
+    INT8 static quantization of the convolutions, calibrated on sample images
+
+    Uses FX graph mode so the residual additions in ResNet50 are handled
+    without changing model.py. The fc head keeps dynamic quantization, which
+    is more accurate for the small Linear layers.
+
+    Raises:
+        ValueError: If no calibration images are available
+    """
+    from torch.ao.quantization import QConfigMapping, get_default_qconfig
+    from torch.ao.quantization.quantize_fx import prepare_fx, convert_fx
+
+    if not calibration_batches:
+        raise ValueError("Static quantization needs calibration images (QUANT_CALIBRATION_DIR)")
+
+    # Static INT8 for the backbone; the fc head stays FP32 here and is
+    # dynamically quantized afterwards
+    engine = torch.backends.quantized.engine
+    qconfig_mapping = (
+        QConfigMapping()
+        .set_global(get_default_qconfig(engine))
+        .set_module_name("model.fc", None)
+    )
+    prepared = prepare_fx(model, qconfig_mapping, example_inputs=(example_input(),))
+    with torch.no_grad():
+        for batch in calibration_batches:
+            prepared(batch)
+    return quantize_dynamic_head(convert_fx(prepared))
+
+def build_inference_model(model: nn.Module, backend: str, device: torch.device,
+                          transform=None, calibration_dir: str = None,
+                          calibration_images: int = 64, onnx_path: str = ONNX_MODEL_PATH,
+                          onnx_threads: int = ONNX_INTRA_OP_THREADS) -> nn.Module:
+    """
+    Convert an eval-mode FP32 model into the configured inference backend
+
+    Args:
+        model: Loaded GarbageModel in eval mode on device
+        backend: One of SUPPORTED_BACKENDS ("onnx" loads onnx_path
+            instead of converting model, which may then be None)
+        device: Device the model runs on
+        transform: Preprocessing transform (needed for int8_static calibration)
+        calibration_dir: Folder of sample images for int8_static
+        calibration_images: Maximum number of calibration images
+        onnx_path: Exported model for the onnx backend
+        onnx_threads: ONNX Runtime intra-op threads (0 = its default)
+
+    Returns:
+        nn.Module: Model ready for inference
+
+    Raises:
+        ValueError: If the backend is unknown or cannot be built
+    """
+    if backend not in SUPPORTED_BACKENDS:
+        raise ValueError(f"Unknown inference backend '{backend}'. Supported: {', '.join(SUPPORTED_BACKENDS)}")
+
+    if backend == "onnx":
+        # ONNX Runtime runs on the CPU whatever device the PyTorch model uses
+        from .onnx_runtime import OnnxModel
+        return OnnxModel(onnx_path, onnx_threads)
+
+    if backend in CPU_ONLY_BACKENDS and device.type != "cpu":
+        logger.warning(f"Backend '{backend}' is CPU-only; using eager mode on {device}")
+        return model
+
+    if backend == "eager":
+        return model
+    if backend == "torchscript":
+        return to_torchscript(model)
+    if backend == "compile":
+        return to_compiled(model)
+    if backend == "int8_dynamic":
+        return quantize_dynamic_head(model)
+
+    if not calibration_dir or not Path(calibration_dir).is_dir():
+        raise ValueError(f"Calibration folder not found: {calibration_dir}")
+    batches = load_calibration_batches(calibration_dir, transform, limit=calibration_images)
+    logger.info(f"Calibrating static quantization on {sum(len(b) for b in batches)} images from {calibration_dir}")
+    return quantize_static(model, batches)
@@ -1,14 +1,35 @@
 """
 Image prediction module with error handling
 """
+import numpy as np
 import torch
 from torchvision import transforms
 from PIL import Image
+import hashlib
 import logging
+import threading
+import time
 from pathlib import Path
 
 from .model import GarbageModel
-from ..config import MODEL_PATH, CLASSES, DEVICE, IMAGE_SIZE
+from .cascade import Cascade
+from .detect import detect_regions
+from .tta import tta_probabilities
+from .optimize import build_inference_model, CHANNELS_LAST_BACKENDS
+from .onnx_runtime import OnnxModel
+from .preprocess import FastTransform, NORMALIZE_MEAN, NORMALIZE_STD
+from .registry import ModelRegistry, LoadedModel
+from .registry_state import RegistrySync, registry_state
+from .. import metrics, runtime
+from ..config import (
+    MODEL_PATH, CLASSES, DEVICE, IMAGE_SIZE, BATCH_MAX_SIZE,
+    INFERENCE_BACKEND, QUANT_CALIBRATION_DIR, QUANT_CALIBRATION_IMAGES,
+    ONNX_MODEL_PATH, ONNX_INTRA_OP_THREADS, MODEL_MMAP, WARMUP_BATCH_SIZES,
+    PREPROCESS_ENGINE, MODEL_REGISTRY_MAX_LOADED, CASCADE_MODEL_PATH, CASCADE_THRESHOLD,
+    TTA_MAX_VIEWS_PER_FORWARD, DETECT_IMAGE_SIZE, DETECT_MIN_CONFIDENCE, DETECT_MAX_DETECTIONS, DETECT_NMS_IOU
+)
+from ...utils.image_utils import decode_image
+from ...utils.memory_utils import memory_usage
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
@@ -22,29 +43,132 @@ except Exception as e:
     logger.warning(f"Error setting device: {e}. Falling back to CPU.")
     device = torch.device("cpu")
 
-# Initialize model
-model = None
+# Size torch's thread pools (and pin this worker to its cores) before any
+# forward pass starts them
+cpu_runtime = runtime.configure()
+use_channels_last = cpu_runtime["channels_last"]
 
-def load_model():
-    """Load the trained model with error handling"""
-    global model
+# Image transformation pipeline
+transform = transforms.Compose([
+    transforms.Resize(IMAGE_SIZE),
+    transforms.ToTensor(),
+    transforms.Normalize(mean=list(NORMALIZE_MEAN), std=list(NORMALIZE_STD))
+])
+
+# Faster equivalent used for serving (see preprocess.py)
+fast_transform = FastTransform(IMAGE_SIZE)
+
+# Larger input for detection, so objects span several feature-map cells
+detect_transform = FastTransform(DETECT_IMAGE_SIZE)
+
+if PREPROCESS_ENGINE not in ("fast", "torchvision"):
+    logger.warning(f"Unknown PREPROCESS_ENGINE '{PREPROCESS_ENGINE}', using 'fast'")
+use_fast_preprocess = PREPROCESS_ENGINE != "torchvision"
+
+# Loaded model versions (the default checkpoint is loaded on first use or
+# by the API's background loader; more can be loaded at runtime)
+_load_lock = threading.Lock()
+
+def checkpoint_version(path: str) -> str:
+    """Short content hash of a checkpoint file, used to label and key predictions"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:12]
+
+def build_fp32_model(path: str = MODEL_PATH, mmap: bool = MODEL_MMAP) -> torch.nn.Module:
+    """
+    Build the FP32 GarbageModel from a checkpoint, in eval mode on device
+    
+    With mmap on a CPU device the parameters are taken straight from a
+    read-only memory map of the checkpoint instead of being copied into
+    freshly allocated tensors. The OS page cache then holds one copy of the
+    weights that every worker process maps, so extra uvicorn workers do not
+    each add ~100MB of private memory.
+    """
+    # Build the architecture on the meta device: no memory is allocated and
+    # no random initialisation runs, since every tensor comes from the checkpoint
+    with torch.device("meta"):
+        net = GarbageModel(num_classes=len(CLASSES))
+    use_mmap = mmap and device.type == "cpu"
+    
+    # Load state dict with weights_only=True for security
+    state_dict = torch.load(path, map_location=device, weights_only=True, mmap=use_mmap)
+    net.load_state_dict(state_dict, assign=True)
+    
+    net.to(device)
+    net.eval()
+    return net
+
+def model_input(net, batch: torch.Tensor) -> torch.Tensor:
+    """Move a batch to the device in the memory format the model runs in"""
+    if use_channels_last and not isinstance(net, OnnxModel):
+        return batch.to(device, memory_format=torch.channels_last)
+    return batch.to(device)
+
+def model_source(path: str = None, backend: str = None) -> tuple:
+    """
+    Resolve the (path, backend) to load
+    
+    Defaults to the configured checkpoint and INFERENCE_BACKEND (the ONNX
+    file when that backend is "onnx"). A .onnx path implies the onnx
+    backend; a checkpoint is never served by it.
+    """
+    backend = backend or INFERENCE_BACKEND
+    if path is None:
+        path = ONNX_MODEL_PATH if backend == "onnx" and device.type == "cpu" else MODEL_PATH
+    if str(path).endswith(".onnx"):
+        return str(path), "onnx"
+    return str(path), "eager" if backend == "onnx" else backend
+
+def default_version(path: str, backend: str) -> str:
+    """Version label build_model() gives a file served by a backend"""
+    version = checkpoint_version(path)
+    return version if backend == "eager" else f"{version}-{backend}"
+
+def build_model(path: str, backend: str) -> tuple:
+    """
+    Build a model for serving
+    
+    Args:
+        path: Checkpoint, or ONNX file for the onnx backend
+        backend: eager, torchscript, compile, int8_dynamic, int8_static or onnx
     
+    Returns:
+        tuple: (model, version label)
+    """
     try:
-        if not Path(MODEL_PATH).exists():
-            raise FileNotFoundError(f"Model file not found at: {MODEL_PATH}")
+        if backend == "onnx":
+            # Serve through ONNX Runtime; the PyTorch model is never built
+            logger.info(f"Loading ONNX model from: {path}")
+            threads = ONNX_INTRA_OP_THREADS or cpu_runtime["threads"]
+            net = build_inference_model(None, backend, device, onnx_path=path, onnx_threads=threads)
+            return net, default_version(path, backend)
         
-        logger.info(f"Loading model from: {MODEL_PATH}")
-        model = GarbageModel(num_classes=len(CLASSES))
+        if not Path(path).exists():
+            raise FileNotFoundError(f"Model file not found at: {path}")
         
-        # Load state dict with weights_only=True for security
-        state_dict = torch.load(MODEL_PATH, map_location=device, weights_only=True)
-        model.load_state_dict(state_dict)
+        logger.info(f"Loading model from: {path}")
+        net = build_fp32_model(path)
+        if use_channels_last and backend in CHANNELS_LAST_BACKENDS:
+            # NHWC convolutions are faster on CPU (oneDNN) and with cuDNN;
+            # this copies the conv weights, so they are no longer shared via mmap
+            net = net.to(memory_format=torch.channels_last)
         
-        model.to(device)
-        model.eval()
+        # Swap in the configured inference backend (TorchScript, INT8, ...)
+        if backend != "eager":
+            logger.info(f"Building '{backend}' inference backend")
+            net = build_inference_model(
+                net, backend, device,
+                transform=transform,
+                calibration_dir=QUANT_CALIBRATION_DIR,
+                calibration_images=QUANT_CALIBRATION_IMAGES
+            )
+        version = default_version(path, backend)
         
-        logger.info("Model loaded successfully!")
-        return True
+        logger.info(f"Model loaded successfully! (version {version}, memory {memory_usage()})")
+        return net, version
         
     except FileNotFoundError as e:
         logger.error(f"Model file not found: {e}")
@@ -53,19 +177,368 @@ def load_model():
         logger.error(f"Error loading model: {e}")
         raise
 
-# Load model at startup
-try:
-    load_model()
-except Exception as e:
-    logger.critical(f"Failed to load model at startup: {e}")
-    # Model will be None, errors will be caught in predict_image
+def weights_mb(net) -> float:
+    """Size of a model's weights in MB (the file size for ONNX models)"""
+    if isinstance(net, OnnxModel):
+        return Path(net.path).stat().st_size / (1024 * 1024)
+    tensors = [value for value in net.state_dict().values() if isinstance(value, torch.Tensor)]
+    return sum(t.numel() * t.element_size() for t in tensors) / (1024 * 1024)
 
-# Image transformation pipeline
-transform = transforms.Compose([
-    transforms.Resize(IMAGE_SIZE),
-    transforms.ToTensor(),
-    transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
-])
+def warm_up(batch_sizes=WARMUP_BATCH_SIZES, net=None) -> float:
+    """
+    Run dummy batches so the first real requests don't pay for lazy
+    initialisation (allocator growth, kernel selection, compilation,
+    faulting in memory-mapped weights)
+    
+    Args:
+        batch_sizes: Batch sizes to run
+        net: Model to warm up (default: the active one)
+    
+    Returns:
+        float: Total warm-up time in seconds
+    """
+    started = time.perf_counter()
+    net = net if net is not None else get_model()
+    for size in batch_sizes:
+        batch_started = time.perf_counter()
+        # Forward pass only, so warm-up batches don't show up in the metrics
+        with torch.no_grad():
+            torch.softmax(net(model_input(net, torch.zeros(size, 3, *IMAGE_SIZE))), dim=1).cpu()
+        logger.info(f"Warm-up batch of {size}: {time.perf_counter() - batch_started:.3f}s")
+    return time.perf_counter() - started
+
+registry = ModelRegistry(
+    builder=build_model,
+    warmer=lambda net: warm_up(WARMUP_BATCH_SIZES, net),
+    sizer=weights_mb,
+    max_loaded=MODEL_REGISTRY_MAX_LOADED
+)
+
+# Applies load/activate/unload calls recorded by other workers (when
+# MODEL_REGISTRY_DB_PATH is set)
+registry_sync = RegistrySync(registry, registry_state)
+
+# Optional early-exit student in front of the full model (see cascade.py)
+cascade = Cascade(CASCADE_MODEL_PATH, CASCADE_THRESHOLD, device, fingerprint=checkpoint_version)
+
+def load_model(path: str = None, version: str = None, backend: str = None, activate: bool = True) -> LoadedModel:
+    """
+    Build, warm up and register a model version (blocking)
+    
+    With no arguments this loads the configured default model.
+    """
+    return registry.load(*model_source(path, backend), version=version, activate=activate)
+
+def get_loaded(version: str = None) -> LoadedModel:
+    """
+    Return a loaded model version (default: the active one)
+    
+    The default model is loaded on first use: the API loads it in the
+    background at startup (see loader.py), command-line tools simply get it
+    loaded on their first prediction.
+    
+    Raises:
+        ModelVersionError: If a requested version is not loaded
+        ValueError: If the default model cannot be loaded
+    """
+    if version is None and registry.active is None:
+        with _load_lock:
+            if registry.active is None:
+                try:
+                    load_model()
+                except Exception as e:
+                    raise ValueError(f"Model not loaded: {e}")
+    return registry.get(version)
+
+def get_model(version: str = None):
+    """Return the network of a loaded model version (default: the active one)"""
+    return get_loaded(version).net
+
+def preprocess_image(image: Image.Image, out: torch.Tensor = None) -> torch.Tensor:
+    """
+    Validate an image and turn it into a normalised model input tensor
+    
+    Args:
+        image: PIL Image object
+        out: Optional (3, H, W) float32 tensor to write into, e.g. a row of
+            a batch buffer from new_batch_buffer()
+        
+    Returns:
+        torch.Tensor: Image tensor of shape (3, H, W) on the CPU
+        
+    Raises:
+        ValueError: If image invalid
+    """
+    # Validate image
+    if not isinstance(image, Image.Image):
+        raise ValueError("Invalid image format. Expected PIL Image.")
+    
+    if use_fast_preprocess:
+        return fast_transform(image, out)
+    
+    # Convert to RGB if needed
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    
+    tensor = transform(image)
+    return out.copy_(tensor) if out is not None else tensor
+
+def preprocess_bytes(content: bytes, out: torch.Tensor = None) -> torch.Tensor:
+    """
+    Decode uploaded image bytes and build the model input tensor
+    
+    With the fast engine, JPEGs are decoded at reduced size.
+    
+    Raises:
+        ImageDecodeError: If the bytes are not a readable image
+    """
+    draft_size = fast_transform.draft_size if use_fast_preprocess else None
+    with metrics.stage_timer("decode"):
+        image = decode_image(content, draft_size=draft_size)
+    with metrics.stage_timer("transform"):
+        return preprocess_image(image, out)
+
+def new_batch_buffer(batch_size: int) -> torch.Tensor:
+    """Preallocated (N, 3, H, W) input buffer for preprocess_image(out=...)"""
+    return fast_transform.new_buffer(batch_size)
+
+def _format_predictions(probabilities: torch.Tensor) -> list:
+    """
+    Build the response dicts for an (N, classes) tensor of probabilities
+    
+    Rounding and the conversion to Python floats happen once for the whole
+    batch in NumPy; an .item() call per class costs more than the rest of
+    the response.
+    """
+    # Validate the rows against the class list
+    if probabilities.dim() != 2 or probabilities.size(1) != len(CLASSES):
+        raise ValueError(f"Expected (N, {len(CLASSES)}) probabilities, got {tuple(probabilities.shape)}")
+    values = probabilities.cpu().numpy().astype(np.float64)
+    class_ids = values.argmax(axis=1).tolist()
+    
+    return [
+        {
+            "class": CLASSES[class_id],
+            "confidence": row[class_id],
+            "all_predictions": dict(zip(CLASSES, row))
+        }
+        for class_id, row in zip(class_ids, values.round(4).tolist())
+    ]
+
+def predict_batch(batch: torch.Tensor, model: LoadedModel = None, tta: str = None) -> list:
+    """
+    Predict garbage classes for a batch of preprocessed images
+    
+    Args:
+        batch: Tensor of shape (N, 3, H, W) built from preprocess_image outputs
+        model: Model version to use (default: the active one). Callers that
+            resolve it up front keep using it even if another version is
+            activated meanwhile.
+        tta: Optional test-time augmentation mode (see tta.py); the views of
+            every image are run through the full model in batched forward
+            passes and their probabilities averaged
+        
+    Returns:
+        list: One prediction dict per image, in input order
+        
+    Raises:
+        ValueError: If model not loaded or batch invalid
+        RuntimeError: If prediction fails
+    """
+    try:
+        # Load the model on first use
+        model = model if model is not None else get_loaded()
+        
+        if batch.dim() != 4 or batch.size(0) == 0:
+            raise ValueError(f"Invalid batch shape: {tuple(batch.shape)}")
+        
+        # Predict, letting the cascade student answer confident images if
+        # configured (TTA always uses the full model)
+        escalated = batch.size(0)
+        with metrics.stage_timer("inference"), torch.no_grad():
+            if tta:
+                probabilities = tta_probabilities(model.net, model_input(model.net, batch), tta, TTA_MAX_VIEWS_PER_FORWARD)
+            elif cascade.applies_to(model):
+                probabilities, escalated_rows = cascade.run(model.net, model_input(model.net, batch))
+                escalated = int(escalated_rows.sum())
+            else:
+                outputs = model.net(model_input(model.net, batch))
+                probabilities = torch.softmax(outputs, dim=1).cpu()
+        metrics.batch_size.observe(batch.size(0), model_version=model.version)
+        if escalated:
+            metrics.predictions.inc(escalated, model_version=model.version, source="model")
+        if escalated < batch.size(0):
+            metrics.predictions.inc(batch.size(0) - escalated, model_version=model.version, source="cascade")
+        
+        results = _format_predictions(probabilities)
+        if tta:
+            for result in results:
+                result["tta"] = tta
+        return results
+        
+    except ValueError as e:
+        logger.error(f"Validation error: {e}")
+        raise
+    except Exception as e:
+        logger.error(f"Batch prediction error: {e}")
+        raise RuntimeError(f"Failed to predict batch: {str(e)}")
+
+def feature_network(model: LoadedModel):
+    """
+    Network whose forward_features() gives the embeddings for a model version
+    
+    Eager, compiled and int8_dynamic models are GarbageModels (with an FP32
+    backbone) and are used directly. For TorchScript and int8_static the
+    FP32 model is built from the same checkpoint on first use; with mmap it
+    shares the checkpoint's pages, so it adds little private memory.
+    
+    Raises:
+        ValueError: For ONNX models, which only expose the logits
+    """
+    net = getattr(model.net, "_orig_mod", model.net)
+    if isinstance(net, GarbageModel):
+        return net
+    if isinstance(net, OnnxModel):
+        raise ValueError("Embeddings are not available with the onnx backend")
+    if model.feature_net is None:
+        with _load_lock:
+            if model.feature_net is None:
+                logger.info(f"Building FP32 feature network for model version {model.version}")
+                model.feature_net = build_fp32_model(model.path)
+    return model.feature_net
+
+def _normalize_embeddings(features: torch.Tensor) -> np.ndarray:
+    """L2-normalised float32 rows, so cosine similarity is a dot product"""
+    return torch.nn.functional.normalize(features.float(), dim=1).cpu().numpy()
+
+def embed_batch(batch: torch.Tensor, model: LoadedModel = None) -> np.ndarray:
+    """
+    Embeddings (pooled backbone features) for a batch of preprocessed images
+    
+    Args:
+        batch: Tensor of shape (N, 3, H, W) built from preprocess_image outputs
+        model: Model version to use (default: the active one)
+    
+    Returns:
+        np.ndarray: (N, 2048) float32, L2-normalised rows
+    """
+    model = model if model is not None else get_loaded()
+    if batch.dim() != 4 or batch.size(0) == 0:
+        raise ValueError(f"Invalid batch shape: {tuple(batch.shape)}")
+    
+    net = feature_network(model)
+    with metrics.stage_timer("inference"), torch.no_grad():
+        features = net.forward_features(model_input(net, batch))
+    return _normalize_embeddings(features)
+
+def predict_and_embed(batch: torch.Tensor, model: LoadedModel = None) -> tuple:
+    """
+    Predictions and embeddings for a batch, in one forward pass when the
+    model exposes its backbone (see feature_network)
+    
+    Returns:
+        tuple: (list of prediction dicts, (N, 2048) float32 embeddings)
+    """
+    model = model if model is not None else get_loaded()
+    if batch.dim() != 4 or batch.size(0) == 0:
+        raise ValueError(f"Invalid batch shape: {tuple(batch.shape)}")
+    
+    net = feature_network(model)
+    if net is not getattr(model.net, "_orig_mod", model.net):
+        return predict_batch(batch, model), embed_batch(batch, model)
+    
+    with metrics.stage_timer("inference"), torch.no_grad():
+        features = net.forward_features(model_input(net, batch))
+        probabilities = torch.softmax(net.model.fc(features), dim=1).cpu()
+    metrics.batch_size.observe(batch.size(0), model_version=model.version)
+    metrics.predictions.inc(batch.size(0), model_version=model.version, source="model")
+    
+    return _format_predictions(probabilities), _normalize_embeddings(features)
+
+def preprocess_for_detection(content: bytes, out: torch.Tensor = None) -> tuple:
+    """
+    Decode uploaded bytes into the DETECT_IMAGE_SIZE detection input
+    
+    Returns:
+        tuple: ((3, H, W) tensor, (width, height) of the uploaded image)
+    
+    Raises:
+        ImageDecodeError: If the bytes are not a readable image
+    """
+    with metrics.stage_timer("decode"):
+        # Draft decoding shrinks JPEGs; boxes are reported in the original's pixels
+        image, size = decode_image(content, draft_size=detect_transform.draft_size, return_size=True)
+    with metrics.stage_timer("transform"):
+        return detect_transform(image, out), size
+
+def detect_batch(batch: torch.Tensor, sizes: list, model: LoadedModel = None,
+                 min_confidence: float = DETECT_MIN_CONFIDENCE, max_detections: int = DETECT_MAX_DETECTIONS,
+                 iou_threshold: float = DETECT_NMS_IOU) -> list:
+    """
+    Detect and classify the items in a batch of images (see detect.py)
+    
+    Args:
+        batch: (N, 3, H, W) tensor from preprocess_for_detection outputs
+        sizes: (width, height) of each original image, to scale boxes to
+        model: Model version to use (default: the active one)
+        min_confidence: Smallest class probability for a region to be reported
+        max_detections: Most regions per image
+        iou_threshold: Overlap above which the less confident region is dropped
+    
+    Returns:
+        list: Per image, the whole-image prediction under ``image`` and
+        ``detections``, each a prediction dict with a pixel ``box``
+        [x0, y0, x1, y1], most confident first
+    
+    Raises:
+        ValueError: If the batch is invalid, or for ONNX models (no feature map)
+    """
+    model = model if model is not None else get_loaded()
+    if batch.dim() != 4 or batch.size(0) == 0 or batch.size(0) != len(sizes):
+        raise ValueError(f"Invalid batch shape: {tuple(batch.shape)} for {len(sizes)} images")
+    
+    net = feature_network(model)
+    with metrics.stage_timer("inference"):
+        outputs = detect_regions(net, model_input(net, batch), min_confidence, max_detections, iou_threshold)
+    metrics.batch_size.observe(batch.size(0), model_version=model.version)
+    metrics.predictions.inc(batch.size(0), model_version=model.version, source="model")
+    
+    results = []
+    for (image_probabilities, regions), (width, height) in zip(outputs, sizes):
+        scale = torch.tensor([width, height, width, height], dtype=torch.float32)
+        predictions = _format_predictions(torch.stack([p for _, p in regions])) if regions else []
+        detections = [
+            {"box": [int(v) for v in (box * scale).round().tolist()], **prediction}
+            for (box, _), prediction in zip(regions, predictions)
+        ]
+        results.append({
+            "width": width,
+            "height": height,
+            "image": _format_predictions(image_probabilities.unsqueeze(0))[0],
+            "count": len(detections),
+            "detections": detections,
+        })
+    return results
+
+def predict_tensors(tensors: list, batch_size: int = BATCH_MAX_SIZE, model: LoadedModel = None,
+                    tta: str = None) -> list:
+    """
+    Predict a list of preprocessed image tensors in batches of up to batch_size
+    
+    Args:
+        tensors: List of (3, H, W) tensors from preprocess_image
+        batch_size: Maximum images per forward pass
+        model: Model version to use (default: the active one)
+        tta: Optional test-time augmentation mode (see predict_batch)
+        
+    Returns:
+        list: One prediction dict per tensor, in input order
+    """
+    batch_size = max(1, batch_size)
+    results = []
+    for start in range(0, len(tensors), batch_size):
+        results.extend(predict_batch(torch.stack(tensors[start:start + batch_size]), model, tta))
+    return results
 
 def predict_image(image: Image.Image) -> dict:
     """
@@ -82,42 +555,9 @@ def predict_image(image: Image.Image) -> dict:
         RuntimeError: If prediction fails
     """
     try:
-        # Check if model is loaded
-        if model is None:
-            raise ValueError("Model not loaded. Please check model file and restart server.")
-        
-        # Validate image
-        if not isinstance(image, Image.Image):
-            raise ValueError("Invalid image format. Expected PIL Image.")
-        
-        # Convert to RGB if needed
-        if image.mode != 'RGB':
-            image = image.convert('RGB')
-        
         # Transform and prepare image
-        img_tensor = transform(image).unsqueeze(0).to(device)
-        
-        # Predict
-        with torch.no_grad():
-            outputs = model(img_tensor)
-            probabilities = torch.softmax(outputs, dim=1)
-            confidence, class_idx = torch.max(probabilities, dim=1)
-            
-            class_id = class_idx.item()
-            conf_score = confidence.item()
-        
-        # Validate class index
-        if class_id < 0 or class_id >= len(CLASSES):
-            raise ValueError(f"Invalid class index: {class_id}")
-        
-        result = {
-            "class": CLASSES[class_id],
-            "confidence": round(conf_score, 4),
-            "all_predictions": {
-                CLASSES[i]: round(probabilities[0][i].item(), 4) 
-                for i in range(len(CLASSES))
-            }
-        }
+        img_tensor = preprocess_image(image).unsqueeze(0)
+        result = predict_batch(img_tensor)[0]
         
         logger.info(f"Prediction: {result['class']} ({result['confidence']:.2%})")
         return result
@@ -125,6 +565,8 @@ def predict_image(image: Image.Image) -> dict:
     except ValueError as e:
         logger.error(f"Validation error: {e}")
         raise
+    except RuntimeError:
+        raise
     except Exception as e:
         logger.error(f"Prediction error: {e}")
         raise RuntimeError(f"Failed to predict image: {str(e)}")
@@ -0,0 +1,91 @@
+"""
+Fast image preprocessing for model input
+"""
+import logging
+
+import numpy as np
+import torch
+from PIL import Image
+
+from ..config import IMAGE_SIZE
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+# ImageNet statistics used by the training transform
+NORMALIZE_MEAN = (0.485, 0.456, 0.406)
+NORMALIZE_STD = (0.229, 0.224, 0.225)
+
+class FastTransform:
+    """
+    Drop-in replacement for the torchvision Resize/ToTensor/Normalize pipeline
+
+    The torchvision pipeline converts the full-resolution image to RGB,
+    resizes it, then builds a float tensor and normalises it in two more
+    passes, each allocating a new buffer. This transform instead:
+
+    - asks the JPEG decoder for a reduced-size image (draft mode decodes at
+      1/2, 1/4 or 1/8 scale, never smaller than the target), so a 12MP photo
+      is never materialised at full resolution
+    - resizes with the same PIL bilinear filter torchvision uses
+    - maps uint8 pixels to normalised floats with one 256-entry lookup table
+      per channel, written straight into the output tensor (or a row of a
+      preallocated batch buffer)
+
+    The lookup table repeats torchvision's float32 arithmetic, so for the
+    same resized pixels the output is bit-identical; draft decoding itself
+    changes pixels slightly (see backend/tools/check_preprocess.py).
+    """
+
+    def __init__(self, size=IMAGE_SIZE, mean=NORMALIZE_MEAN, std=NORMALIZE_STD, draft: bool = True):
+        self.size = tuple(size)
+        self.draft = draft
+
+        # ToTensor then Normalize: ((x / 255) - mean) / std, in float32
+        levels = torch.arange(256, dtype=torch.float32).div(255).unsqueeze(0)
+        mean = torch.tensor(mean, dtype=torch.float32).unsqueeze(1)
+        std = torch.tensor(std, dtype=torch.float32).unsqueeze(1)
+        self._lut = levels.sub(mean).div(std).numpy()
+
+    @property
+    def draft_size(self):
+        """(width, height) to request from the JPEG decoder, or None"""
+        return (self.size[1], self.size[0]) if self.draft else None
+
+    def resize(self, image: Image.Image) -> Image.Image:
+        """Reduce (JPEG draft mode if still possible), convert to RGB and resize to the model input size"""
+        if self.draft and image.format == "JPEG":
+            # Only has an effect before the image data is loaded
+            image.draft("RGB", self.draft_size)
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        height, width = self.size
+        if image.size != (width, height):
+            image = image.resize((width, height), Image.BILINEAR)
+        return image
+
+    def normalize_into(self, image: Image.Image, out: torch.Tensor) -> torch.Tensor:
+        """Write a resized RGB image into a (3, H, W) float32 CPU tensor"""
+        pixels = np.asarray(image)
+        target = out.numpy()
+        for channel in range(3):
+            np.take(self._lut[channel], pixels[:, :, channel], out=target[channel])
+        return out
+
+    def new_buffer(self, batch_size: int = None) -> torch.Tensor:
+        """Uninitialised (3, H, W) tensor, or (N, 3, H, W) batch buffer"""
+        shape = (3, *self.size) if batch_size is None else (batch_size, 3, *self.size)
+        return torch.empty(shape, dtype=torch.float32)
+
+    def __call__(self, image: Image.Image, out: torch.Tensor = None) -> torch.Tensor:
+        if out is None:
+            out = self.new_buffer()
+        return self.normalize_into(self.resize(image), out)
+
+    def batch(self, images: list, out: torch.Tensor = None) -> torch.Tensor:
+        """Preprocess several images into one (N, 3, H, W) batch tensor"""
+        if out is None:
+            out = self.new_buffer(len(images))
+        for row, image in zip(out, images):
+            self(image, row)
+        return out
@@ -0,0 +1,263 @@
+"""
+Registry of loaded model versions with background loading and atomic swaps
+"""
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+
+from ...utils.memory_utils import memory_usage
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+# Finished load jobs kept for status(); older ones are forgotten
+MAX_FINISHED_JOBS = 20
+
+class ModelVersionError(ValueError):
+    """Raised for unknown model versions or invalid registry operations"""
+
+@dataclass
+class LoadedModel:
+    """One loaded, warmed-up model version"""
+    version: str
+    path: str
+    backend: str
+    net: object
+    weights_mb: float = 0.0
+    memory_delta_mb: float = 0.0
+    load_seconds: float = 0.0
+    warmup_seconds: float = 0.0
+    loaded_at: float = field(default_factory=time.time)
+    # Content hash of the weights (with the backend), as returned by the builder
+    fingerprint: str = ""
+    # FP32 network used for embeddings when ``net`` cannot expose its
+    # backbone features (built on first use, see predictor.feature_network)
+    feature_net: object = None
+
+    @property
+    def cache_version(self) -> str:
+        """
+        Version the prediction cache is keyed on
+
+        A custom name is combined with the weights' fingerprint, so reloading
+        different weights under the same name never serves the old weights'
+        cached predictions.
+        """
+        if not self.fingerprint or self.fingerprint == self.version:
+            return self.version
+        return f"{self.version}@{self.fingerprint}"
+
+    def describe(self) -> dict:
+        return {
+            "version": self.version,
+            "fingerprint": self.fingerprint,
+            "path": self.path,
+            "backend": self.backend,
+            "weights_mb": self.weights_mb,
+            "memory_delta_mb": self.memory_delta_mb,
+            "load_seconds": self.load_seconds,
+            "warmup_seconds": self.warmup_seconds,
+            "loaded_at": self.loaded_at,
+        }
+
+class ModelRegistry:
+    """
+    Holds several model versions and which one serves unpinned requests
+
+    New versions are built and warmed up before they are registered, then
+    made active by swapping a single reference under a lock. Requests
+    resolve a LoadedModel when they start and keep that object until they
+    finish, so a swap (or unloading an old version) never affects work
+    already in flight; the old model is freed once the last such request
+    completes.
+
+    The registry does not know how to build models: ``builder(path,
+    backend)`` returns ``(net, version)``, ``warmer(net)`` warms a net up
+    and returns seconds, and ``sizer(net)`` returns its weight size in MB.
+    """
+
+    def __init__(self, builder, warmer, sizer, max_loaded: int = 2):
+        self._builder = builder
+        self._warmer = warmer
+        self._sizer = sizer
+        self.max_loaded = max(1, max_loaded)
+
+        self._models = {}
+        self._active = None
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._last_swap = None
+
+    # -- lookups ---------------------------------------------------------
+
+    @property
+    def active(self):
+        """The LoadedModel serving unpinned requests, or None"""
+        return self._active
+
+    def active_version(self) -> str:
+        return self._active.version if self._active is not None else "unloaded"
+
+    def get(self, version: str = None) -> LoadedModel:
+        """
+        Resolve a version (None = active) to a LoadedModel
+
+        Raises:
+            ModelVersionError: If the version is not loaded
+        """
+        model = self._active if version is None else self._models.get(version)
+        if model is None:
+            if version is None:
+                raise ModelVersionError("No model is active")
+            raise ModelVersionError(
+                f"Model version '{version}' is not loaded. Loaded: {', '.join(self._models) or 'none'}"
+            )
+        return model
+
+    def versions(self) -> list:
+        return list(self._models)
+
+    # -- loading and swapping -------------------------------------------
+
+    def load(self, path: str, backend: str, version: str = None, activate: bool = True) -> LoadedModel:
+        """
+        Build, warm up and register a model (blocking)
+
+        Args:
+            path: Checkpoint (or ONNX) file
+            backend: Inference backend to build
+            version: Name to register under (default: derived from the file hash)
+            activate: Make it serve unpinned requests once warm
+
+        Returns:
+            LoadedModel: The registered model
+        """
+        before = memory_usage().get("private_mb", 0.0)
+        started = time.perf_counter()
+        net, default_version = self._builder(path, backend)
+        loaded = time.perf_counter()
+        warmup_seconds = self._warmer(net)
+
+        model = LoadedModel(
+            version=version or default_version,
+            path=str(path),
+            backend=backend,
+            net=net,
+            weights_mb=round(self._sizer(net), 1),
+            memory_delta_mb=round(memory_usage().get("private_mb", 0.0) - before, 1),
+            load_seconds=round(loaded - started, 3),
+            warmup_seconds=round(warmup_seconds, 3),
+            fingerprint=default_version,
+        )
+        self.register(model, activate=activate)
+        logger.info(
+            f"Model version {model.version} loaded from {path} in {model.load_seconds}s "
+            f"(warm-up {model.warmup_seconds}s, weights {model.weights_mb}MB, "
+            f"process memory +{model.memory_delta_mb}MB)"
+        )
+        return model
+
+    def register(self, model: LoadedModel, activate: bool = True):
+        """Add an already built model, evicting the oldest inactive ones over max_loaded"""
+        with self._lock:
+            self._models[model.version] = model
+            # Reloading the active version under the same name replaces it
+            replaces_active = self._active is not None and self._active.version == model.version
+            if activate or replaces_active or self._active is None:
+                self._swap(model)
+            while len(self._models) > self.max_loaded:
+                oldest = min(
+                    (m for m in self._models.values() if m is not self._active),
+                    key=lambda m: m.loaded_at
+                )
+                del self._models[oldest.version]
+                self._retire_jobs(oldest.version, "evicted")
+                logger.info(f"Evicted model version {oldest.version} (max_loaded={self.max_loaded})")
+
+    def activate(self, version: str) -> dict:
+        """Make a loaded version serve unpinned requests; returns swap details"""
+        with self._lock:
+            model = self._models.get(version)
+            if model is None:
+                raise ModelVersionError(f"Model version '{version}' is not loaded")
+            return self._swap(model)
+
+    def _swap(self, model: LoadedModel) -> dict:
+        started = time.perf_counter()
+        previous, self._active = self._active, model
+        self._last_swap = {
+            "from": previous.version if previous is not None else None,
+            "to": model.version,
+            "swap_ms": round((time.perf_counter() - started) * 1000, 4),
+            "at": time.time(),
+        }
+        if previous is not model:
+            logger.info(f"Active model: {self._last_swap['from']} -> {model.version}")
+        return self._last_swap
+
+    def unload(self, version: str):
+        """Drop an inactive version; requests still using it finish normally"""
+        with self._lock:
+            if version not in self._models:
+                raise ModelVersionError(f"Model version '{version}' is not loaded")
+            if self._models[version] is self._active:
+                raise ModelVersionError("Cannot unload the active model version; activate another first")
+            del self._models[version]
+            self._retire_jobs(version, "unloaded")
+        logger.info(f"Unloaded model version {version}")
+
+    def load_in_background(self, path: str, backend: str, version: str = None, activate: bool = True) -> dict:
+        """Start load() in a thread and return the job record (see status())"""
+        job_id = version or str(path)
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None and job["state"] == "loading":
+                raise ModelVersionError(f"Already loading {job_id}")
+            self._jobs.pop(job_id, None)
+            self._prune_jobs()
+            job = self._jobs[job_id] = {
+                "path": str(path), "version": version, "activate": activate,
+                "state": "loading", "error": None, "started_at": time.time(),
+            }
+
+        def run():
+            try:
+                model = self.load(path, backend, version=version, activate=activate)
+                with self._lock:
+                    # Another load may have evicted it already
+                    state = "ready" if self._models.get(model.version) is model else "evicted"
+                    job.update(state=state, version=model.version, finished_at=time.time())
+            except Exception as e:
+                logger.error(f"Loading model from {path} failed: {e}")
+                with self._lock:
+                    job.update(state="failed", error=str(e), finished_at=time.time())
+
+        threading.Thread(target=run, name=f"model-load-{job_id}", daemon=True).start()
+        return dict(job, job=job_id)
+
+    def _retire_jobs(self, version: str, state: str):
+        """Mark ready load jobs of a version that is no longer loaded (lock held)"""
+        for job in self._jobs.values():
+            if job["state"] == "ready" and job["version"] == version:
+                job.update(state=state, retired_at=time.time())
+
+    def _prune_jobs(self):
+        """Forget the oldest finished load jobs beyond MAX_FINISHED_JOBS (lock held)"""
+        finished = sorted(
+            (job_id for job_id, job in self._jobs.items() if job["state"] != "loading"),
+            key=lambda job_id: self._jobs[job_id]["finished_at"]
+        )
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self._jobs[job_id]
+
+    def status(self) -> dict:
+        """Loaded versions with memory and timings, the last swap and load jobs"""
+        models = list(self._models.values())
+        return {
+            "active": self.active_version(),
+            "max_loaded": self.max_loaded,
+            "models": [dict(m.describe(), active=m is self._active) for m in models],
+            "last_swap": self._last_swap,
+            "jobs": {job_id: dict(job) for job_id, job in list(self._jobs.items())},
+        }
@@ -0,0 +1,263 @@
+"""
+Model registry state shared by every API worker through a SQLite file
+
+Each uvicorn worker has its own ModelRegistry, so a load or activate call
+only reaches the worker that happened to receive it. With
+MODEL_REGISTRY_DB_PATH set, the management endpoints instead record the
+wanted state (which versions are loaded from which file, and which one is
+active) in one row of a SQLite database, and every worker polls it and
+converges its registry towards it: loading missing versions in the
+background, activating the wanted version once it is warm and unloading
+versions that were removed.
+
+Once the state has been written it is authoritative, also for workers that
+start later: they load the recorded versions and activate the recorded
+one, whatever MODEL_PATH and MODEL_REGISTRY_PRELOAD say. Delete the
+database to go back to the configured defaults.
+
+Like loader.py this module does not import torch.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from .registry import ModelRegistry, ModelVersionError
+from ..config import MODEL_REGISTRY_DB_PATH, MODEL_REGISTRY_SYNC_SECONDS, MODEL_REGISTRY_MAX_LOADED
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS registry_state (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    revision INTEGER NOT NULL,
+    state TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+class RegistryStateStore:
+    """
+    The wanted registry state in one SQLite row
+
+    The state is ``{"models": {version: {"path", "backend", "added_at"}},
+    "active": version}`` with a revision that grows with every change.
+    Changes are read-modify-write in an IMMEDIATE transaction, so
+    concurrent calls on different workers are applied one after the other.
+    """
+
+    def __init__(self, path: str = MODEL_REGISTRY_DB_PATH, max_loaded: int = MODEL_REGISTRY_MAX_LOADED):
+        self.path = path
+        self.max_loaded = max(1, max_loaded)
+        self._conn = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            self._conn = conn
+            logger.info(f"Shared model registry state: {self.path}")
+        return self._conn
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def read(self) -> tuple:
+        """(revision, state); revision 0 and None before anything was recorded"""
+        with self._lock:
+            row = self._connection().execute("SELECT revision, state FROM registry_state WHERE id = 1").fetchone()
+        if row is None:
+            return 0, None
+        return row[0], json.loads(row[1])
+
+    def update(self, change, seed: dict) -> dict:
+        """
+        Apply ``change(state)`` to the stored state and save it
+
+        Args:
+            change: Function that edits the state dict in place; it may
+                raise to abort without saving
+            seed: The caller's registry as a state (see RegistrySync.seed),
+                used as the starting point when none was recorded yet
+
+        Returns:
+            dict: The saved state
+        """
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT revision, state FROM registry_state WHERE id = 1").fetchone()
+                if row is None:
+                    revision, state = 0, seed
+                else:
+                    revision, state = row[0], json.loads(row[1])
+                change(state)
+                self._trim(state)
+                conn.execute(
+                    "INSERT OR REPLACE INTO registry_state (id, revision, state, updated_at) VALUES (1, ?, ?, ?)",
+                    (revision + 1, json.dumps(state), time.time())
+                )
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        return state
+
+    def _trim(self, state: dict):
+        """Drop the oldest inactive versions beyond max_loaded, as every registry would evict them"""
+        models = state["models"]
+        while len(models) > self.max_loaded:
+            oldest = min(
+                (version for version in models if version != state["active"]),
+                key=lambda version: models[version]["added_at"]
+            )
+            del models[oldest]
+
+    # -- changes made by the management endpoints ------------------------------
+
+    def load(self, version: str, path: str, backend: str, activate: bool, seed: dict) -> dict:
+        def change(state):
+            state["models"][version] = {"path": path, "backend": backend, "added_at": time.time()}
+            if activate or state["active"] not in state["models"]:
+                state["active"] = version
+        return self.update(change, seed)
+
+    def activate(self, version: str, seed: dict) -> dict:
+        """
+        Raises:
+            ModelVersionError: If the version is not part of the state
+        """
+        def change(state):
+            if version not in state["models"]:
+                raise ModelVersionError(f"Model version '{version}' is not loaded")
+            state["active"] = version
+        return self.update(change, seed)
+
+    def unload(self, version: str, seed: dict) -> dict:
+        """
+        Raises:
+            ModelVersionError: If the version is not part of the state or is active
+        """
+        def change(state):
+            if version not in state["models"]:
+                raise ModelVersionError(f"Model version '{version}' is not loaded")
+            if version == state["active"]:
+                raise ModelVersionError("Cannot unload the active model version; activate another first")
+            del state["models"][version]
+        return self.update(change, seed)
+
+class RegistrySync:
+    """
+    Keeps one worker's registry in line with the shared state
+
+    ``apply()`` is idempotent: versions already loaded from the same file
+    and backend are left alone, versions still loading are waited for, and
+    a version that failed to load is not retried until it is requested again.
+    """
+
+    def __init__(self, registry: ModelRegistry, store: RegistryStateStore,
+                 poll_seconds: float = MODEL_REGISTRY_SYNC_SECONDS):
+        self.registry = registry
+        self.store = store
+        self.poll_seconds = poll_seconds
+        self.revision = 0
+        self._apply_lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    def seed(self) -> dict:
+        """This worker's registry as a state, to start the shared state from"""
+        status = self.registry.status()
+        return {
+            "models": {
+                model["version"]: {"path": model["path"], "backend": model["backend"], "added_at": model["loaded_at"]}
+                for model in status["models"]
+            },
+            "active": status["active"],
+        }
+
+    def apply(self, revision: int = None, state: Optional[dict] = None):
+        """Converge the registry towards the stored state (read it if not given)"""
+        if state is None:
+            revision, state = self.store.read()
+            if state is None:
+                return
+        with self._apply_lock:
+            status = self.registry.status()
+            loaded = {model["version"]: model for model in status["models"]}
+            jobs = status["jobs"]
+
+            def current(version):
+                model = loaded.get(version)
+                entry = state["models"][version]
+                return model is not None and (model["path"], model["backend"]) == (entry["path"], entry["backend"])
+
+            for version, entry in state["models"].items():
+                job = jobs.get(version)
+                if current(version) or (job is not None and job["state"] == "loading"):
+                    continue
+                # A load of this entry already failed here; wait until it is requested again
+                if job is not None and job["state"] == "failed" and job["path"] == entry["path"] \
+                        and job["started_at"] >= entry["added_at"]:
+                    continue
+                try:
+                    self.registry.load_in_background(
+                        entry["path"], entry["backend"], version=version, activate=version == state["active"]
+                    )
+                    logger.info(f"Loading model version {version} from the shared registry state ({entry['path']})")
+                except ModelVersionError:
+                    pass
+
+            active = state["active"]
+            if active in loaded and current(active) and self.registry.active_version() != active:
+                self.registry.activate(active)
+
+            for version in loaded:
+                if version not in state["models"] and version != self.registry.active_version():
+                    try:
+                        self.registry.unload(version)
+                    except ModelVersionError:
+                        pass
+            self.revision = max(self.revision, revision or 0)
+
+    def start(self):
+        """Poll the state every poll_seconds in a daemon thread (no-op if disabled or started)"""
+        if not self.store.enabled or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="model-registry-sync", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                revision, state = self.store.read()
+                if state is not None:
+                    self.apply(revision, state)
+            except Exception as e:
+                logger.error(f"Model registry sync failed: {e}")
+            self._stop.wait(self.poll_seconds)
+
+registry_state = RegistryStateStore()
@@ -0,0 +1,111 @@
+"""
+Test-time augmentation: several views of each image in one forward pass
+
+Views are cut from the batch already preprocessed for the model (resized
+to IMAGE_SIZE and normalised), so an image is decoded and resized once
+whatever the mode. All crops of one size are resized back to IMAGE_SIZE
+in a single interpolate call and flips are a single torch.flip over the
+stacked views, so an (N, 3, H, W) batch becomes an (N * V, 3, H, W) batch
+that the model runs as one batch rather than V separate calls. The class
+probabilities of the V views are averaged per image.
+
+torch is imported inside the functions: the API routes import TTA_MODES
+to validate requests, and torch is only loaded (and its thread pools
+configured, see runtime.py) by the model loader.
+"""
+import logging
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+# Share of the side kept by the corner and centre crops
+CROP_SCALE = 0.875
+
+CROP_POSITIONS = ("center", "top_left", "top_right", "bottom_left", "bottom_right")
+
+# mode -> (crops as (scale, position), whether every crop is also flipped)
+TTA_MODES = {
+    "flip": ([(1.0, "center")], True),
+    "five_crop": ([(CROP_SCALE, position) for position in CROP_POSITIONS], False),
+    "ten_crop": ([(CROP_SCALE, position) for position in CROP_POSITIONS], True),
+    "multi_scale": ([(1.0, "center"), (CROP_SCALE, "center"), (0.75, "center")], True),
+}
+
+def view_count(mode: str) -> int:
+    """Number of views per image for a TTA mode"""
+    crops, flip = TTA_MODES[mode]
+    return len(crops) * (2 if flip else 1)
+
+def _crop(batch, scale: float, position: str):
+    """(N, 3, h, w) crop of scale times the side at position (a view, no copy)"""
+    height, width = batch.shape[-2:]
+    h, w = max(1, round(height * scale)), max(1, round(width * scale))
+    top = (height - h) // 2 if position == "center" else (0 if position.startswith("top") else height - h)
+    left = (width - w) // 2 if position == "center" else (0 if position.endswith("left") else width - w)
+    return batch[:, :, top:top + h, left:left + w]
+
+def tta_views(batch, mode: str):
+    """
+    All views of a batch for a TTA mode, view-major
+
+    Args:
+        batch: (N, 3, H, W) preprocessed images
+        mode: Key of TTA_MODES
+
+    Returns:
+        torch.Tensor: (V * N, 3, H, W); rows v * N .. v * N + N - 1 are view v
+
+    Raises:
+        ValueError: For an unknown mode
+    """
+    import torch
+    import torch.nn.functional as F
+
+    if mode not in TTA_MODES:
+        raise ValueError(f"Unknown TTA mode '{mode}'. Supported: {', '.join(TTA_MODES)}")
+    crops, flip = TTA_MODES[mode]
+    size = tuple(batch.shape[-2:])
+
+    # One resize per crop size, over every crop of that size
+    by_scale = {}
+    for scale, position in crops:
+        by_scale.setdefault(scale, []).append(position)
+    views = []
+    for scale, positions in by_scale.items():
+        stacked = torch.cat([_crop(batch, scale, position) for position in positions])
+        if stacked.shape[-2:] != size:
+            stacked = F.interpolate(stacked, size=size, mode="bilinear", align_corners=False, antialias=True)
+        views.append(stacked)
+    views = torch.cat(views) if len(views) > 1 else views[0]
+
+    if flip:
+        views = torch.cat([views, torch.flip(views, dims=[3])])
+    return views
+
+def tta_probabilities(net, batch, mode: str, max_forward: int):
+    """
+    Class probabilities averaged over the views of each image
+
+    Images are taken in chunks so one forward pass holds at most
+    max_forward views (but always every view of at least one image).
+
+    Args:
+        net: Model returning logits
+        batch: (N, 3, H, W) preprocessed images on the model's device
+        mode: Key of TTA_MODES
+        max_forward: Largest number of views per forward pass
+
+    Returns:
+        torch.Tensor: (N, C) probabilities on the CPU
+    """
+    import torch
+
+    views_per_image = view_count(mode)
+    chunk = max(1, max_forward // views_per_image)
+    results = []
+    with torch.no_grad():
+        for start in range(0, batch.size(0), chunk):
+            images = batch[start:start + chunk]
+            probabilities = torch.softmax(net(tta_views(images, mode)), dim=1)
+            results.append(probabilities.reshape(views_per_image, images.size(0), -1).mean(dim=0).cpu())
+    return torch.cat(results)
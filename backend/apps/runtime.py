@@ -0,0 +1,196 @@
+"""
+CPU thread and core-affinity settings for inference workers
+
+By default every PyTorch process starts an intra-op pool with one thread
+per core, so `uvicorn --workers 4` on an 8-core machine runs 32 OpenMP
+threads fighting over 8 cores. configure() gives each worker its own share
+instead:
+
+1. The CPUs this process may use are grouped into physical cores
+   (hyperthread siblings together) and split into API_WORKERS contiguous
+   shares.
+2. Each worker claims a share by taking an exclusive lock on a slot file;
+   the lock is released when the worker exits, so a restarted worker takes
+   over the free share. Without POSIX file locks (Windows) no share is
+   claimed and workers are not pinned, as with CPU_AFFINITY=off.
+3. The worker is pinned to its share (CPU_AFFINITY) and torch's intra-op
+   pool is sized to one thread per physical core in it (TORCH_THREADS).
+
+backend.tools.autotune measures the combinations on the current machine
+and writes the best settings as an environment file.
+"""
+import logging
+import os
+import tempfile
+from typing import Optional
+
+from .config import API_WORKERS, TORCH_THREADS, TORCH_INTEROP_THREADS, CPU_AFFINITY, CHANNELS_LAST
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+AFFINITY_MODES = ("auto", "on", "off")
+
+# Settings applied by configure(), reported by /stats
+_settings = None
+# Open slot lock file; kept for the life of the process so the lock is held
+_slot_lock = None
+
+def parse_cpu_list(text: str) -> list:
+    """CPUs in a kernel cpu list such as "0-3,8,10-11" """
+    cpus = []
+    for part in text.strip().split(","):
+        if not part:
+            continue
+        first, _, last = part.partition("-")
+        cpus.extend(range(int(first), int(last or first) + 1))
+    return cpus
+
+def available_cpus() -> list:
+    """Logical CPUs this process may run on"""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+def physical_cores(cpus: list) -> list:
+    """
+    Group logical CPUs into physical cores
+
+    Returns:
+        list: One sorted list of sibling CPUs per core, ordered by first CPU;
+        every CPU is its own core when the topology is not available
+    """
+    cores, seen = [], set()
+    for cpu in cpus:
+        if cpu in seen:
+            continue
+        try:
+            with open(f"/sys/devices/system/cpu/cpu{cpu}/topology/thread_siblings_list") as f:
+                siblings = [c for c in parse_cpu_list(f.read()) if c in cpus]
+        except (OSError, ValueError):
+            siblings = [cpu]
+        siblings = sorted(set(siblings) | {cpu})
+        seen.update(siblings)
+        cores.append(siblings)
+    return sorted(cores)
+
+def partition(cores: list, workers: int) -> list:
+    """
+    Split cores into one contiguous share per worker
+
+    With more workers than cores, workers take single cores in turn.
+    """
+    workers = max(1, workers)
+    if workers >= len(cores):
+        return [[cores[i % len(cores)]] for i in range(workers)]
+    return [cores[i * len(cores) // workers:(i + 1) * len(cores) // workers] for i in range(workers)]
+
+def claim_worker_slot(workers: int) -> Optional[int]:
+    """
+    Index of a share not used by another worker of the same server
+
+    Workers started by one uvicorn process share its pid as parent, so slot
+    files are named after it. Falls back to the pid when every slot is
+    taken or the lock files cannot be created. Returns None where file
+    locks are not available (fcntl is POSIX-only, e.g. on Windows).
+    """
+    global _slot_lock
+    if workers <= 1:
+        return 0
+    try:
+        import fcntl
+    except ImportError:
+        return None
+    directory = tempfile.gettempdir()
+    for slot in range(workers):
+        path = os.path.join(directory, f"garbage-api-{os.getppid()}-cpu-slot-{slot}.lock")
+        try:
+            handle = open(path, "w")
+        except OSError as e:
+            logger.warning(f"Cannot create CPU slot lock {path}: {e}")
+            break
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            continue
+        _slot_lock = handle
+        return slot
+    return os.getpid() % workers
+
+def pin_process(cpus: list) -> bool:
+    """Restrict every thread of this process (and threads started later) to cpus"""
+    if not hasattr(os, "sched_setaffinity"):
+        return False
+    try:
+        tasks = [int(tid) for tid in os.listdir("/proc/self/task")]
+    except OSError:
+        tasks = [0]
+    for tid in tasks:
+        try:
+            os.sched_setaffinity(tid, cpus)
+        except OSError:
+            # The thread exited since the listing
+            pass
+    return True
+
+def plan(workers: int = API_WORKERS, threads: int = TORCH_THREADS, affinity: str = CPU_AFFINITY,
+         slot: int = None) -> dict:
+    """
+    CPU share, thread counts and pinning for one worker, without applying them
+
+    Raises:
+        ValueError: For an unknown affinity mode
+    """
+    if affinity not in AFFINITY_MODES:
+        raise ValueError(f"Unknown CPU_AFFINITY '{affinity}'. Use one of: {', '.join(AFFINITY_MODES)}")
+    cores = physical_cores(available_cpus())
+    slot = claim_worker_slot(workers) if slot is None else slot
+    # Without a claimed slot, thread counts are still sized to one share,
+    # but the worker is not pinned (as with CPU_AFFINITY=off)
+    claimed = slot is not None
+    share = partition(cores, workers)[(slot or 0) % max(1, workers)]
+    return {
+        "workers": workers,
+        "slot": slot,
+        "cpus": sorted(cpu for core in share for cpu in core),
+        "physical_cores": len(share),
+        "threads": threads if threads > 0 else len(share),
+        "interop_threads": max(1, TORCH_INTEROP_THREADS),
+        "pinned": claimed and (affinity == "on" or (affinity == "auto" and workers > 1)),
+        "channels_last": CHANNELS_LAST,
+    }
+
+def configure() -> dict:
+    """
+    Apply the CPU settings to this process (once; later calls return them)
+
+    Call before the first forward pass: torch's inter-op pool can only be
+    sized before it starts.
+    """
+    global _settings
+    if _settings is not None:
+        return _settings
+    import torch
+
+    settings = plan()
+    if settings["pinned"] and not pin_process(settings["cpus"]):
+        settings["pinned"] = False
+    torch.set_num_threads(settings["threads"])
+    try:
+        torch.set_num_interop_threads(settings["interop_threads"])
+    except RuntimeError as e:
+        logger.warning(f"Inter-op threads already started, keeping {torch.get_num_interop_threads()}: {e}")
+        settings["interop_threads"] = torch.get_num_interop_threads()
+    _settings = settings
+    logger.info(
+        f"CPU runtime: worker slot {settings['slot']}/{settings['workers']}, "
+        f"cpus {settings['cpus'] if settings['pinned'] else 'unpinned'}, "
+        f"{settings['threads']} intra-op / {settings['interop_threads']} inter-op threads, "
+        f"channels_last={settings['channels_last']}"
+    )
+    return settings
+
+def settings() -> dict:
+    """Applied settings (None until the predictor has configured torch)"""
+    return _settings
@@ -0,0 +1,235 @@
+"""
+Helpers for streaming (camera) inference: latest-wins frame handoff,
+change-based frame skipping and temporal label smoothing
+
+Nothing here imports torch, so the API can use it before the model loads
+and the camera demo can pair it with any predict function.
+"""
+import asyncio
+import io
+import logging
+import time
+from collections import Counter, deque
+
+import numpy as np
+from PIL import Image, UnidentifiedImageError
+
+from .config import (
+    STREAM_CHANGE_THRESHOLD, STREAM_MAX_SKIP_FRAMES, STREAM_SMOOTHING,
+    STREAM_EMA_ALPHA, STREAM_MAJORITY_WINDOW
+)
+from ..utils.image_utils import ImageDecodeError
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+# Side of the greyscale thumbnail used to compare frames
+SIGNATURE_SIZE = 32
+SMOOTHING_MODES = ("ema", "majority", "none")
+
+class LatestFrame:
+    """
+    Single-slot mailbox between a WebSocket reader and the inference loop
+
+    put() replaces any frame that has not been taken yet, so when frames
+    arrive faster than they can be classified the stale ones are dropped
+    and the next prediction is always for the newest frame (latest-wins).
+    Latency per frame stays bounded by one inference instead of growing
+    with a queue.
+    """
+
+    def __init__(self):
+        self._frame = None
+        self._event = asyncio.Event()
+        self.closed = False
+        self.received = 0
+        self.dropped = 0
+
+    def put(self, content: bytes):
+        """Offer a new frame, dropping the previous one if still pending"""
+        self.received += 1
+        if self._frame is not None:
+            self.dropped += 1
+        self._frame = (self.received, content, time.perf_counter())
+        self._event.set()
+
+    def close(self):
+        """Wake the consumer; get() returns None from now on"""
+        self.closed = True
+        self._event.set()
+
+    async def get(self):
+        """
+        Wait for the newest frame
+
+        Returns:
+            tuple: (sequence number, frame bytes, perf_counter when received),
+            or None after close()
+        """
+        while self._frame is None and not self.closed:
+            self._event.clear()
+            await self._event.wait()
+        if self.closed:
+            return None
+        frame, self._frame = self._frame, None
+        return frame
+
+def frame_signature(frame) -> np.ndarray:
+    """
+    Tiny greyscale thumbnail of a frame, used to detect scene changes
+
+    Args:
+        frame: PIL image, or encoded image bytes. JPEG bytes are decoded in
+            draft mode at 1/8 scale, so a skipped frame costs a fraction of
+            a full decode.
+
+    Raises:
+        ImageDecodeError: If bytes cannot be decoded
+    """
+    if isinstance(frame, (bytes, bytearray)):
+        try:
+            image = Image.open(io.BytesIO(frame))
+            image.draft("L", (SIGNATURE_SIZE, SIGNATURE_SIZE))
+            image = image.convert("L")
+        except (UnidentifiedImageError, OSError, ValueError):
+            raise ImageDecodeError("Cannot identify image file. File may be corrupted.")
+    else:
+        image = frame.convert("L")
+    return np.asarray(image.resize((SIGNATURE_SIZE, SIGNATURE_SIZE), Image.BILINEAR), dtype=np.int16)
+
+class PredictionSmoother:
+    """
+    Stabilises the label of a stream of predictions
+
+    - ema: exponential moving average of the class probabilities; the
+      label is the argmax of the average
+    - majority: most common label over the last ``window`` predictions
+      (on a tie the current label is kept), with that class's latest
+      probability
+    - none: predictions pass through unchanged
+    """
+
+    def __init__(self, mode: str = STREAM_SMOOTHING, alpha: float = STREAM_EMA_ALPHA,
+                 window: int = STREAM_MAJORITY_WINDOW):
+        if mode not in SMOOTHING_MODES:
+            raise ValueError(f"Unknown smoothing mode '{mode}'. Supported: {', '.join(SMOOTHING_MODES)}")
+        self.mode = mode
+        self.alpha = min(1.0, max(0.0, alpha))
+        self._average = None
+        self._recent = deque(maxlen=max(1, window))
+        self._label = None
+
+    def reset(self):
+        self._average = None
+        self._recent.clear()
+        self._label = None
+
+    def update(self, prediction: dict) -> dict:
+        """Add a raw prediction and return the smoothed one"""
+        if self.mode == "none":
+            return prediction
+        probabilities = prediction["all_predictions"]
+
+        if self.mode == "ema":
+            if self._average is None:
+                self._average = dict(probabilities)
+            else:
+                self._average = {
+                    cls: self.alpha * probabilities[cls] + (1 - self.alpha) * self._average.get(cls, 0.0)
+                    for cls in probabilities
+                }
+            smoothed = {cls: round(value, 4) for cls, value in self._average.items()}
+            label = max(smoothed, key=smoothed.get)
+        else:
+            self._recent.append(prediction["class"])
+            counts = Counter(self._recent)
+            best = max(counts.values())
+            if counts.get(self._label) != best:
+                self._label = next(cls for cls in reversed(self._recent) if counts[cls] == best)
+            label = self._label
+            smoothed = probabilities
+
+        return {
+            **prediction,
+            "class": label,
+            "confidence": smoothed[label],
+            "all_predictions": smoothed,
+            "raw_class": prediction["class"],
+        }
+
+class StreamClassifier:
+    """
+    Per-stream wrapper that skips inference on unchanged frames and
+    smooths the labels it reports
+
+    A frame is classified only when its signature (see frame_signature)
+    differs from that of the last classified frame by at least
+    ``change_threshold`` grey levels, or after ``max_skip_frames`` skipped
+    frames. Otherwise the last smoothed prediction is reused. Comparing
+    against the last classified frame rather than the previous frame means
+    slow drift still triggers a new prediction eventually.
+
+    The caller owns inference, so this works with the API's async batcher
+    as well as a direct synchronous predict call::
+
+        if stream.should_infer(signature):
+            result = stream.update(predict(frame), signature)
+        else:
+            result = stream.reuse()
+    """
+
+    def __init__(self, change_threshold: float = STREAM_CHANGE_THRESHOLD,
+                 max_skip_frames: int = STREAM_MAX_SKIP_FRAMES, smoother: PredictionSmoother = None):
+        self.change_threshold = max(0.0, change_threshold)
+        self.max_skip_frames = max(0, max_skip_frames)
+        self.smoother = smoother if smoother is not None else PredictionSmoother()
+
+        self._signature = None
+        self._last = None
+        self._skipped_in_row = 0
+        self.inferred = 0
+        self.skipped = 0
+
+    def difference(self, signature: np.ndarray) -> float:
+        """Mean absolute grey-level difference from the last classified frame"""
+        if self._signature is None or signature.shape != self._signature.shape:
+            return float("inf")
+        return float(np.abs(signature - self._signature).mean())
+
+    def should_infer(self, signature: np.ndarray) -> bool:
+        """Whether this frame needs a new prediction"""
+        if (self._last is None or self.change_threshold == 0
+                or self._skipped_in_row >= self.max_skip_frames
+                or self.difference(signature) >= self.change_threshold):
+            return True
+        self._skipped_in_row += 1
+        return False
+
+    def update(self, prediction: dict, signature: np.ndarray) -> dict:
+        """Record a fresh prediction for the frame with this signature"""
+        self.inferred += 1
+        self._signature = signature
+        self._skipped_in_row = 0
+        self._last = self.smoother.update(prediction)
+        return {**self._last, "skipped": False}
+
+    def reuse(self) -> dict:
+        """The last prediction, for a frame that was skipped"""
+        self.skipped += 1
+        return {**self._last, "skipped": True}
+
+    def classify(self, frame, predict) -> dict:
+        """Synchronous convenience: signature, skip decision and predict(frame)"""
+        signature = frame_signature(frame)
+        if self.should_infer(signature):
+            return self.update(predict(frame), signature)
+        return self.reuse()
+
+    def stats(self) -> dict:
+        frames = self.inferred + self.skipped
+        return {
+            "frames": frames,
+            "inferred": self.inferred,
+            "skipped": self.skipped,
+            "skip_rate": round(self.skipped / frames, 3) if frames else 0.0,
+        }
@@ -0,0 +1,137 @@
+"""
+Bounded upload handling: request body limits and image header sniffing
+
+Uploads are limited at three points so the memory a request can use does
+not depend on what the client sends:
+
+1. BodySizeLimitMiddleware rejects a body whose Content-Length is over the
+   route's limit before any of it is read, and cuts off bodies without one
+   (or that lie about it) as soon as the bytes received pass the limit.
+2. Starlette spools each multipart file as it arrives (in memory up to
+   1MB, then in a temporary file), so parsing holds at most one small
+   chunk per file in memory.
+3. read_upload() checks the spooled size and sniffs the image header from
+   the first bytes, and only then reads the file; oversized files and
+   non-images are never read in full.
+"""
+import logging
+from typing import Optional
+
+from fastapi import UploadFile
+from starlette.exceptions import HTTPException
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+# Headroom over the file size limit for multipart boundaries, headers and fields
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+# Leading bytes that identify the formats in ALLOWED_EXTENSIONS
+IMAGE_SIGNATURES = (
+    (b"\xff\xd8\xff", "jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "png"),
+    (b"GIF87a", "gif"),
+    (b"GIF89a", "gif"),
+    (b"BM", "bmp"),
+)
+SNIFF_BYTES = 16
+
+class RequestBodyTooLarge(HTTPException):
+    """413 raised while the body is being received"""
+
+    def __init__(self, limit: int):
+        super().__init__(
+            status_code=413,
+            detail=f"Request body too large. Maximum size: {limit / (1024 * 1024):.0f}MB"
+        )
+
+class UploadRejectedError(ValueError):
+    """Raised by read_upload() for files that are too large or not images"""
+
+    def __init__(self, message: str, too_large: bool = False):
+        super().__init__(message)
+        self.too_large = too_large
+
+def sniff_image_format(head: bytes) -> Optional[str]:
+    """Image format from the first bytes of a file, or None if not a supported image"""
+    for signature, name in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return name
+    return None
+
+async def read_upload(upload: UploadFile, max_bytes: int, sniff: bool = True) -> bytes:
+    """
+    Read a spooled upload after checking its size and image header
+
+    The size is known from the spool, so oversized files are rejected
+    without reading them; only SNIFF_BYTES are read to reject non-images.
+    The content is then read in one call, into a single bytes object.
+
+    Raises:
+        UploadRejectedError: If the file is too large or not a supported image
+    """
+    if upload.size is not None and upload.size > max_bytes:
+        raise UploadRejectedError(f"File too large. Maximum size: {max_bytes // (1024 * 1024)}MB", too_large=True)
+    if sniff:
+        head = await upload.read(SNIFF_BYTES)
+        if head and sniff_image_format(head) is None:
+            raise UploadRejectedError("File content is not a supported image (jpeg, png, gif or bmp)")
+        await upload.seek(0)
+    content = await upload.read()
+    if len(content) > max_bytes:
+        raise UploadRejectedError(f"File too large. Maximum size: {max_bytes // (1024 * 1024)}MB", too_large=True)
+    return content
+
+class BodySizeLimitMiddleware:
+    """
+    Reject request bodies over a per-path limit with 413
+
+    ``limits`` maps request paths to the largest body in bytes; other
+    paths are not limited. Implemented as plain ASGI middleware so it sees
+    the body messages before the form parser does.
+    """
+
+    def __init__(self, app, limits: dict):
+        self.app = app
+        self.limits = limits
+
+    async def __call__(self, scope, receive, send):
+        limit = self.limits.get(scope.get("path")) if scope["type"] == "http" else None
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        declared = dict(scope["headers"]).get(b"content-length", b"")
+        if declared.isdigit() and int(declared) > limit:
+            logger.warning(f"Rejected {scope['path']} upload of {int(declared)} bytes (limit {limit})")
+            await self._reject(send, limit)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    logger.warning(f"Cut off {scope['path']} upload after {received} bytes (limit {limit})")
+                    raise RequestBodyTooLarge(limit)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+    @staticmethod
+    async def _reject(send, limit: int):
+        error = RequestBodyTooLarge(limit)
+        body = f'{{"detail":"{error.detail}"}}'.encode()
+        await send({
+            "type": "http.response.start",
+            "status": error.status_code,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"connection", b"close"),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,473 @@
+"""
+Float16 vector index for embedding similarity search and near-duplicate detection
+
+An index is a directory holding:
+
+    index.json      header: dim, row count, model version, IVF parameters
+    vectors.f16     count x dim float16 rows (L2-normalised), memory-mapped
+    meta.jsonl      one JSON object per row (path, class, ...)
+    meta.offsets    int64 byte offset of each meta.jsonl line
+    ivf_*.npy       optional inverted-file partition (see train_ivf)
+
+Vectors are stored at half precision, so a million 2048-d embeddings take
+4GB on disk and are paged in by the OS instead of being loaded into the
+process. Search is vectorised NumPy: an exact brute-force scan in chunks,
+or, once an IVF partition has been trained, a scan of only the partitions
+nearest to the query.
+
+Rows are appended by a single writer (backend.tools.bulk_classify --index).
+The header is replaced atomically after the data has been flushed, so
+readers such as the API only ever see complete rows and pick up new ones
+on their next search. Nothing here imports torch.
+"""
+import json
+import logging
+import math
+import os
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+from .config import EMBEDDING_INDEX_DIR, EMBEDDING_SEARCH_K, EMBEDDING_IVF_PROBES
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+HEADER_FILE = "index.json"
+VECTORS_FILE = "vectors.f16"
+META_FILE = "meta.jsonl"
+OFFSETS_FILE = "meta.offsets"
+IVF_CENTROIDS_FILE = "ivf_centroids.npy"
+IVF_ORDER_FILE = "ivf_order.npy"
+IVF_OFFSETS_FILE = "ivf_offsets.npy"
+
+# Rows scored at a time during a scan
+SCAN_CHUNK_ROWS = 32768
+# Extra candidates per query re-scored in float32 after the float16 pass
+RERANK_CANDIDATES = 32
+
+class VectorIndexError(ValueError):
+    """Raised for invalid index files or operations"""
+
+def normalize(vectors) -> np.ndarray:
+    """L2-normalised float32 copy of a (N, dim) array, so cosine similarity is a dot product"""
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+_torch = None
+
+def _coarse_scores(queries: np.ndarray, rows: np.ndarray) -> np.ndarray:
+    """
+    Approximate similarities (N queries x M rows) against float16 rows
+
+    torch's CPU half-precision matmul reads the float16 rows directly
+    (F16C/AVX-512 conversion) and is several times faster than converting
+    them with NumPy, which is the fallback when torch is not installed.
+    The scores have float16 precision, so search() re-ranks the winners.
+    """
+    global _torch
+    if _torch is None:
+        try:
+            import torch
+            _torch = torch
+        except ImportError:
+            _torch = False
+    if _torch:
+        return _torch.mm(_torch.from_numpy(queries).half(), _torch.from_numpy(rows).T).float().numpy()
+    return queries @ rows.astype(np.float32).T
+
+def _merge_top_k(best_scores, best_ids, scores, ids, k):
+    """Keep the k highest scores per row out of the current best and a new block"""
+    ids = np.concatenate([best_ids, np.broadcast_to(ids, scores.shape)], axis=1)
+    scores = np.concatenate([best_scores, scores], axis=1)
+    if scores.shape[1] > k:
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        scores = np.take_along_axis(scores, top, axis=1)
+        ids = np.take_along_axis(ids, top, axis=1)
+    return scores, ids
+
+def _write_atomic(path: Path, write):
+    """Write a file through a temporary sibling and rename it into place"""
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+class VectorIndex:
+    """
+    Memory-mapped float16 embedding index
+
+    Open an existing index with ``VectorIndex(path)`` (a missing directory
+    is an empty index) or start one with ``VectorIndex.create(path, dim)``.
+    """
+
+    def __init__(self, path: str, probes: int = EMBEDDING_IVF_PROBES):
+        self.path = Path(path)
+        self.probes = max(1, probes)
+
+        self.dim = None
+        self.count = 0
+        self.meta_bytes = 0
+        self.model_version = None
+        self.ivf = None
+
+        self._lock = threading.Lock()
+        self._header_stamp = None
+        self._vectors = None
+        self._offsets = None
+        self._ivf_arrays = None
+        self._writable = False
+        self.refresh()
+
+    @classmethod
+    def create(cls, path: str, dim: int, model_version: str = None) -> "VectorIndex":
+        """Open the index at path for writing, creating it if needed"""
+        index = cls(path)
+        if index.dim is None:
+            index.path.mkdir(parents=True, exist_ok=True)
+            index.dim = dim
+            index.model_version = model_version
+            index._write_header()
+            logger.info(f"Created vector index at {index.path} (dim={dim})")
+        elif index.dim != dim:
+            raise VectorIndexError(f"Index at {path} has dim {index.dim}, not {dim}")
+        return index
+
+    # -- header and mappings ---------------------------------------------
+
+    def _file(self, name: str) -> Path:
+        return self.path / name
+
+    def refresh(self) -> bool:
+        """Re-read the header and remap the files if another process changed them"""
+        header_path = self._file(HEADER_FILE)
+        try:
+            stat = header_path.stat()
+        except FileNotFoundError:
+            return False
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        if stamp == self._header_stamp:
+            return False
+
+        with self._lock:
+            if stamp == self._header_stamp:
+                return False
+            try:
+                header = json.loads(header_path.read_text(encoding="utf-8"))
+            except (OSError, ValueError) as e:
+                raise VectorIndexError(f"Unreadable index header {header_path}: {e}")
+            if header.get("format") != FORMAT_VERSION:
+                raise VectorIndexError(f"Unsupported index format: {header.get('format')}")
+
+            self.dim = header["dim"]
+            self.count = header["count"]
+            self.meta_bytes = header["meta_bytes"]
+            self.model_version = header.get("model_version")
+            self.ivf = header.get("ivf")
+            self._map()
+            self._header_stamp = stamp
+        return True
+
+    def _map(self):
+        """Memory-map the first ``count`` rows and the IVF arrays"""
+        if self.count:
+            # Copy-on-write: pages are shared and never written, but the
+            # array counts as writable so torch can wrap it without a copy
+            self._vectors = np.memmap(self._file(VECTORS_FILE), dtype=np.float16, mode="c",
+                                      shape=(self.count, self.dim))
+            self._offsets = np.memmap(self._file(OFFSETS_FILE), dtype=np.int64, mode="r", shape=(self.count,))
+        else:
+            self._vectors = self._offsets = None
+
+        self._ivf_arrays = None
+        if self.ivf:
+            self._ivf_arrays = (
+                np.load(self._file(IVF_CENTROIDS_FILE)),
+                np.load(self._file(IVF_ORDER_FILE), mmap_mode="r"),
+                np.load(self._file(IVF_OFFSETS_FILE)),
+                self.ivf["count"],
+            )
+
+    def _write_header(self):
+        header = {
+            "format": FORMAT_VERSION,
+            "dim": self.dim,
+            "dtype": "float16",
+            "count": self.count,
+            "meta_bytes": self.meta_bytes,
+            "model_version": self.model_version,
+            "ivf": self.ivf,
+            "updated_at": time.time(),
+        }
+        _write_atomic(self._file(HEADER_FILE), lambda f: f.write(json.dumps(header, indent=2).encode()))
+        stat = self._file(HEADER_FILE).stat()
+        self._header_stamp = (stat.st_mtime_ns, stat.st_size)
+        self._map()
+
+    # -- writing -----------------------------------------------------------
+
+    def _prepare_write(self):
+        """Drop bytes an interrupted writer appended after the last header update"""
+        if self._writable:
+            return
+        if self.dim is None:
+            raise VectorIndexError(f"No index at {self.path}; use VectorIndex.create()")
+        for name, size in ((VECTORS_FILE, self.count * self.dim * 2), (OFFSETS_FILE, self.count * 8),
+                           (META_FILE, self.meta_bytes)):
+            with open(self._file(name), "ab") as f:
+                f.truncate(size)
+        self._writable = True
+
+    def add(self, vectors, metadata: list, model_version: str = None) -> range:
+        """
+        Append embeddings with one metadata dict each
+
+        Args:
+            vectors: (N, dim) array; rows are L2-normalised before storing
+            metadata: N JSON-serialisable dicts (e.g. path, class, confidence)
+            model_version: Model that produced the embeddings; must match
+                the index's, since embeddings of different models don't compare
+
+        Returns:
+            range: Row ids of the added vectors
+        """
+        vectors = normalize(vectors)
+        if vectors.shape[1] != self.dim:
+            raise VectorIndexError(f"Expected {self.dim}-d vectors, got {vectors.shape[1]}-d")
+        if len(metadata) != len(vectors):
+            raise VectorIndexError("One metadata entry is needed per vector")
+        if model_version and self.model_version and model_version != self.model_version:
+            raise VectorIndexError(
+                f"Index holds embeddings of model version {self.model_version}, not {model_version}"
+            )
+
+        with self._lock:
+            self._prepare_write()
+            lines = [json.dumps(entry, ensure_ascii=False).encode() + b"\n" for entry in metadata]
+            offsets = self.meta_bytes + np.concatenate([[0], np.cumsum([len(line) for line in lines])[:-1]])
+
+            for name, data in ((VECTORS_FILE, vectors.astype(np.float16).tobytes()),
+                               (META_FILE, b"".join(lines)),
+                               (OFFSETS_FILE, offsets.astype(np.int64).tobytes())):
+                with open(self._file(name), "ab") as f:
+                    f.write(data)
+                    f.flush()
+                    os.fsync(f.fileno())
+
+            first = self.count
+            self.count += len(vectors)
+            self.meta_bytes += sum(len(line) for line in lines)
+            self.model_version = self.model_version or model_version
+            self._write_header()
+        return range(first, self.count)
+
+    def truncate(self, count: int):
+        """Keep only the first count rows (used when resuming an interrupted build)"""
+        with self._lock:
+            if count >= self.count:
+                return
+            self.meta_bytes = int(self._offsets[count]) if count else 0
+            self.count = count
+            if not count:
+                self.model_version = None
+            if self.ivf and self.ivf["count"] > count:
+                self.ivf = None
+            self._writable = False
+            self._write_header()
+            self._prepare_write()
+
+    # -- search --------------------------------------------------------------
+
+    def _check_queries(self, queries) -> np.ndarray:
+        queries = normalize(queries)
+        if self.dim is not None and queries.shape[1] != self.dim:
+            raise VectorIndexError(f"Expected {self.dim}-d queries, got {queries.shape[1]}-d")
+        return queries
+
+    def _scan(self, vectors, queries, start: int, stop: int, candidates: int) -> np.ndarray:
+        """Ids of the best candidates per query over rows [start, stop), by coarse score"""
+        best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+        best_ids = np.full((len(queries), 0), -1, dtype=np.int64)
+        for low in range(start, stop, SCAN_CHUNK_ROWS):
+            high = min(low + SCAN_CHUNK_ROWS, stop)
+            best_scores, best_ids = _merge_top_k(
+                best_scores, best_ids, _coarse_scores(queries, vectors[low:high]), np.arange(low, high), candidates
+            )
+        return best_ids
+
+    def _probe_ivf(self, vectors, ivf_arrays, query, candidates: int, probes: int) -> np.ndarray:
+        """Candidate ids for one query from the nearest IVF partitions plus rows added after training"""
+        centroids, order, list_offsets, trained_count = ivf_arrays
+        probes = min(probes, len(centroids))
+        nearest = np.argpartition(-(centroids @ query), probes - 1)[:probes]
+        rows = np.sort(np.concatenate([order[list_offsets[l]:list_offsets[l + 1]] for l in nearest]))
+
+        _, ids = _merge_top_k(
+            np.full((1, 0), -np.inf, dtype=np.float32), np.full((1, 0), -1, dtype=np.int64),
+            _coarse_scores(query[None, :], vectors[rows]), rows, candidates
+        )
+        if trained_count < len(vectors):
+            ids = np.concatenate([ids, self._scan(vectors, query[None, :], trained_count, len(vectors), candidates)], axis=1)
+        return ids[0]
+
+    def search(self, queries, k: int = EMBEDDING_SEARCH_K, probes: int = None, exact: bool = False) -> list:
+        """
+        Nearest neighbours by cosine similarity
+
+        Rows are scored at float16 precision first; the best ``k +
+        RERANK_CANDIDATES`` per query are then re-scored in float32, so the
+        reported similarities and their order are exact.
+
+        Args:
+            queries: (dim,) or (N, dim) embeddings
+            k: Neighbours per query
+            probes: IVF partitions to scan (default: self.probes)
+            exact: Scan every row even if an IVF partition is trained
+
+        Returns:
+            list: Per query, a list of (row id, similarity), best first
+        """
+        self.refresh()
+        queries = self._check_queries(queries)
+        vectors, ivf_arrays = self._vectors, self._ivf_arrays
+        if vectors is None:
+            return [[] for _ in queries]
+        k = max(1, min(k, len(vectors)))
+        candidates = k + RERANK_CANDIDATES
+
+        if ivf_arrays is not None and not exact:
+            candidate_ids = [self._probe_ivf(vectors, ivf_arrays, query, candidates, probes or self.probes)
+                             for query in queries]
+        else:
+            candidate_ids = self._scan(vectors, queries, 0, len(vectors), candidates)
+
+        neighbours = []
+        for query, ids in zip(queries, candidate_ids):
+            ids = np.unique(ids[ids >= 0])
+            # Clip float16 rounding of the stored unit vectors (a copy can score 1.0001)
+            scores = np.clip(np.asarray(vectors[ids], dtype=np.float32) @ query, -1.0, 1.0)
+            ranked = np.argsort(-scores)[:k]
+            neighbours.append([(int(ids[i]), float(scores[i])) for i in ranked])
+        return neighbours
+
+    def metadata(self, ids) -> list:
+        """Metadata dicts for row ids"""
+        offsets = self._offsets
+        entries = []
+        with open(self._file(META_FILE), "rb") as f:
+            for row in ids:
+                f.seek(int(offsets[row]))
+                entries.append(json.loads(f.readline()))
+        return entries
+
+    def vectors(self, start: int = 0, stop: int = None) -> np.ndarray:
+        """Rows [start, stop) as float32"""
+        return np.asarray(self._vectors[start:stop], dtype=np.float32)
+
+    def find_duplicates(self, threshold: float, k: int = 10, probes: int = None, exact: bool = False,
+                        batch_size: int = 256):
+        """
+        Yield (row, other row, similarity) for near-duplicate pairs in the index
+
+        Each row is searched against the index; pairs at or above threshold
+        are reported once, as (lower id, higher id).
+        """
+        self.refresh()
+        for start in range(0, self.count, batch_size):
+            queries = self.vectors(start, min(start + batch_size, self.count))
+            for offset, neighbours in enumerate(self.search(queries, k + 1, probes, exact)):
+                row = start + offset
+                for other, score in neighbours:
+                    if other > row and score >= threshold:
+                        yield row, other, score
+
+    # -- approximate index ---------------------------------------------------
+
+    def _assign(self, vectors, centroids) -> np.ndarray:
+        """Nearest centroid of each row, in chunks"""
+        assignment = np.empty(len(vectors), dtype=np.int64)
+        for low in range(0, len(vectors), SCAN_CHUNK_ROWS):
+            chunk = np.asarray(vectors[low:low + SCAN_CHUNK_ROWS], dtype=np.float32)
+            assignment[low:low + len(chunk)] = np.argmax(chunk @ centroids.T, axis=1)
+        return assignment
+
+    def train_ivf(self, lists: int = None, sample_size: int = None, iterations: int = 10, seed: int = 0) -> dict:
+        """
+        Partition the index with spherical k-means (inverted file, IVF)
+
+        Searches then score only the ``probes`` partitions whose centroids
+        are nearest to the query, plus any rows added after training.
+
+        Args:
+            lists: Number of partitions (default: sqrt of the row count)
+            sample_size: Rows used to fit the centroids (default: 64 per list)
+            iterations: k-means iterations
+            seed: Random seed for sampling and initialisation
+
+        Returns:
+            dict: The IVF header entry
+        """
+        self.refresh()
+        if not self.count:
+            raise VectorIndexError("Cannot train an empty index")
+        count, vectors = self.count, self._vectors
+        lists = max(1, min(lists or int(math.sqrt(count)), count))
+        sample_size = min(count, max(sample_size or lists * 64, lists))
+        rng = np.random.default_rng(seed)
+
+        started = time.perf_counter()
+        sample = np.asarray(vectors[np.sort(rng.choice(count, sample_size, replace=False))], dtype=np.float32)
+        centroids = sample[rng.choice(sample_size, lists, replace=False)].copy()
+        for _ in range(iterations):
+            assignment = self._assign(sample, centroids)
+            sizes = np.bincount(assignment, minlength=lists)
+            filled = np.flatnonzero(sizes)
+            starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])[filled]
+            centroids[filled] = np.add.reduceat(sample[np.argsort(assignment, kind="stable")], starts, axis=0)
+            # Re-seed empty partitions from random sample rows
+            empty = np.flatnonzero(sizes == 0)
+            centroids[empty] = sample[rng.choice(sample_size, len(empty), replace=False)]
+            centroids = normalize(centroids)
+
+        assignment = self._assign(vectors, centroids)
+        order = np.argsort(assignment, kind="stable").astype(np.int64)
+        list_offsets = np.concatenate([[0], np.cumsum(np.bincount(assignment, minlength=lists))]).astype(np.int64)
+
+        with self._lock:
+            _write_atomic(self._file(IVF_CENTROIDS_FILE), lambda f: np.save(f, centroids))
+            _write_atomic(self._file(IVF_ORDER_FILE), lambda f: np.save(f, order))
+            _write_atomic(self._file(IVF_OFFSETS_FILE), lambda f: np.save(f, list_offsets))
+            self.ivf = {
+                "lists": lists,
+                "count": count,
+                "sample_size": sample_size,
+                "largest_list": int(np.diff(list_offsets).max()),
+                "trained_at": time.time(),
+            }
+            self._write_header()
+        logger.info(f"Trained IVF with {lists} lists over {count} vectors in {time.perf_counter() - started:.1f}s")
+        return self.ivf
+
+    def stats(self) -> dict:
+        """Size, model version and IVF state of the index"""
+        self.refresh()
+        vectors_path = self._file(VECTORS_FILE)
+        return {
+            "path": str(self.path),
+            "count": self.count,
+            "dim": self.dim,
+            "dtype": "float16",
+            "model_version": self.model_version,
+            "vectors_mb": round(vectors_path.stat().st_size / (1024 * 1024), 1) if vectors_path.exists() else 0.0,
+            "ivf": self.ivf,
+            "probes": self.probes,
+        }
+
+# Index searched by the API (None when EMBEDDING_INDEX_DIR is not set)
+embedding_index = VectorIndex(EMBEDDING_INDEX_DIR) if EMBEDDING_INDEX_DIR else None
@@ -1,78 +1,366 @@
+"""
+Live garbage classification from local cameras or video files
+backend/local_camera_demo.py
+
+Runs as a three-stage pipeline so the display never waits for the model:
+
+- capture: one thread per source reads frames and keeps only the newest
+  (latest-frame semantics, so the camera buffer never backs up)
+- inference: one worker takes the newest frame of every source, crops the
+  ROIs, skips ROIs whose content has not changed (StreamClassifier) and
+  classifies the rest of all sources in a single batch; with --detect it
+  instead locates the items in each whole frame (one backbone pass per
+  frame, see backend/apps/model/detect.py)
+- render: draws boxes, labels and FPS/latency counters and shows the
+  frames (on the main thread, which OpenCV's GUI requires on some
+  platforms), or in --headless mode logs the results instead
+
+Usage:
+    python -m backend.local_camera_demo                       # webcam 0
+    python -m backend.local_camera_demo --source 0 --source 1 --grid 2x2
+    python -m backend.local_camera_demo --source clip.mp4 --headless --output results.jsonl
+    python -m backend.local_camera_demo --detect --min-confidence 0.8
+"""
+import argparse
+import json
+import logging
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+
 import cv2
-import torch
-import torchvision.transforms as transforms
 from PIL import Image
-from apps.model import garbage_Model
-
-# -------- CONFIG --------
-DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
-CLASS_NAMES = [
-    'battery','biological','cardboard','clothes','glass',
-    'metal','paper','plastic','shoes','trash'
-]
-
-# -------- LOAD MODEL --------
-model = garbage_Model(num_classes=10)
-model.load_state_dict(torch.load("models/resnet50_model.pth", map_location=DEVICE))
-model.to(DEVICE)
-model.eval()
-
-transform = transforms.Compose([
-    transforms.Resize((224,224)),
-    transforms.ToTensor(),
-    transforms.Normalize(
-        mean=[0.485,0.456,0.406],
-        std=[0.229,0.224,0.225]
-    )
-])
-
-# -------- CAMERA --------
-cap = cv2.VideoCapture(0)
-
-while True:
-    ret, frame = cap.read()
-    if not ret:
-        break
-
-    h, w, _ = frame.shape
-
-    # ---- CENTER ROI (Pseudo Bounding Box) ----
-    box_size = 300
-    x1 = w//2 - box_size//2
-    y1 = h//2 - box_size//2
-    x2 = w//2 + box_size//2
-    y2 = h//2 + box_size//2
-
-    roi = frame[y1:y2, x1:x2]
-
-    # ---- PREDICTION ----
-    img = Image.fromarray(cv2.cvtColor(roi, cv2.COLOR_BGR2RGB))
-    input_tensor = transform(img).unsqueeze(0).to(DEVICE)
-
-    with torch.no_grad():
-        outputs = model(input_tensor)
-        probs = torch.softmax(outputs, dim=1)
-        conf, pred = torch.max(probs, 1)
-
-    label = CLASS_NAMES[pred.item()]
-    confidence = conf.item()
-
-    # ---- DRAW BOX ----
-    cv2.rectangle(frame, (x1,y1), (x2,y2), (0,255,0), 3)
-    cv2.putText(
-        frame,
-        f"{label} ({confidence:.2f})",
-        (x1, y1-10),
-        cv2.FONT_HERSHEY_SIMPLEX,
-        0.9,
-        (0,255,0),
-        2
+
+from backend.apps.config import DETECT_MIN_CONFIDENCE, STREAM_CHANGE_THRESHOLD, STREAM_SMOOTHING
+from backend.apps.model import predictor
+from backend.apps.stream import PredictionSmoother, StreamClassifier, frame_signature
+
+# Setup logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("local_camera_demo")
+
+WINDOW_TITLE = "Garbage Classification (Live)"
+STATS_INTERVAL_SECONDS = 5.0
+
+class LatestValue:
+    """Thread-safe single slot: put() replaces whatever was not taken yet"""
+
+    def __init__(self):
+        self._value = None
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def put(self, value):
+        with self._lock:
+            if self._value is not None:
+                self.dropped += 1
+            self._value = value
+
+    def take(self):
+        """The pending value (or None), emptying the slot"""
+        with self._lock:
+            value, self._value = self._value, None
+            return value
+
+class RateMeter:
+    """Events per second, smoothed over recent intervals"""
+
+    def __init__(self, smoothing: float = 0.9):
+        self.smoothing = smoothing
+        self.rate = 0.0
+        self._last = None
+
+    def tick(self):
+        now = time.perf_counter()
+        if self._last is not None and now > self._last:
+            instant = 1.0 / (now - self._last)
+            self.rate = instant if self.rate == 0 else self.smoothing * self.rate + (1 - self.smoothing) * instant
+        self._last = now
+
+@dataclass
+class Frame:
+    index: int
+    image: object  # BGR numpy array from OpenCV
+    captured_at: float
+
+@dataclass
+class Source:
+    """One camera or video file and the state shared between the stages"""
+    name: str
+    spec: str
+    frames: LatestValue = field(default_factory=LatestValue)
+    results: LatestValue = field(default_factory=LatestValue)
+    capture_rate: RateMeter = field(default_factory=RateMeter)
+    finished: bool = False
+    captured: int = 0
+    processed: int = 0
+    latency_ms: float = 0.0
+    streams: dict = field(default_factory=dict)
+
+def open_capture(spec: str):
+    """cv2.VideoCapture for a camera index ("0") or a file/URL"""
+    capture = cv2.VideoCapture(int(spec) if spec.isdigit() else spec)
+    if not capture.isOpened():
+        raise ValueError(f"Cannot open video source: {spec}")
+    return capture
+
+def capture_loop(source: Source, new_frame: threading.Event, stop: threading.Event, max_frames: int):
+    """Capture stage: read frames and offer only the newest to the inference worker"""
+    capture = None
+    try:
+        capture = open_capture(source.spec)
+        is_file = not source.spec.isdigit()
+        # Play files at their own frame rate so they behave like a camera
+        frame_interval = 1.0 / (capture.get(cv2.CAP_PROP_FPS) or 30.0) if is_file else 0.0
+        next_frame_at = time.perf_counter()
+        while not stop.is_set() and (not max_frames or source.captured < max_frames):
+            ok, image = capture.read()
+            if not ok:
+                break
+            source.captured += 1
+            source.capture_rate.tick()
+            source.frames.put(Frame(source.captured, image, time.perf_counter()))
+            new_frame.set()
+
+            if frame_interval:
+                next_frame_at += frame_interval
+                delay = next_frame_at - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+    except Exception as e:
+        logger.error(f"Capture failed on {source.name}: {e}")
+    finally:
+        if capture is not None:
+            capture.release()
+        source.finished = True
+        new_frame.set()
+        logger.info(f"{source.name}: capture finished after {source.captured} frames")
+
+def roi_boxes(height: int, width: int, box_size: int, grid: tuple) -> list:
+    """(x1, y1, x2, y2) regions to classify: a centred square, or a rows x cols grid"""
+    rows, cols = grid
+    if rows * cols > 1:
+        return [
+            (col * width // cols, row * height // rows, (col + 1) * width // cols, (row + 1) * height // rows)
+            for row in range(rows) for col in range(cols)
+        ]
+    size = min(box_size, height, width)
+    x1, y1 = width // 2 - size // 2, height // 2 - size // 2
+    return [(x1, y1, x1 + size, y1 + size)]
+
+def detect_frames(pending: list, args) -> dict:
+    """Detected items per source for (source, frame) pairs, as (box, result) ROIs"""
+    batch = predictor.detect_transform.new_buffer(len(pending))
+    sizes = []
+    for row, (_, frame) in zip(batch, pending):
+        image = Image.fromarray(cv2.cvtColor(frame.image, cv2.COLOR_BGR2RGB))
+        sizes.append(image.size)
+        predictor.detect_transform(image, row)
+    outputs = predictor.detect_batch(batch, sizes, min_confidence=args.min_confidence)
+    return {
+        source.name: (source, frame, [(tuple(d["box"]), dict(d, skipped=False)) for d in output["detections"]])
+        for (source, frame), output in zip(pending, outputs)
+    }
+
+def inference_loop(sources: list, new_frame: threading.Event, stop: threading.Event, args, infer_rate: RateMeter):
+    """Inference stage: batch the changed ROIs of every source's newest frame"""
+    try:
+        while not stop.is_set():
+            new_frame.wait(timeout=0.1)
+            new_frame.clear()
+
+            pending = [(source, frame) for source in sources for frame in [source.frames.take()] if frame is not None]
+            if not pending:
+                if all(source.finished for source in sources):
+                    break
+                continue
+
+            if args.detect:
+                results = detect_frames(pending, args)
+                publish(results, args, infer_rate)
+                continue
+
+            # Decide per ROI whether it needs the model; collect those into one batch
+            jobs, to_predict = [], []
+            for source, frame in pending:
+                height, width = frame.image.shape[:2]
+                for roi_index, box in enumerate(roi_boxes(height, width, args.box_size, args.grid)):
+                    x1, y1, x2, y2 = box
+                    image = Image.fromarray(cv2.cvtColor(frame.image[y1:y2, x1:x2], cv2.COLOR_BGR2RGB))
+                    stream = source.streams.get(roi_index)
+                    if stream is None:
+                        stream = source.streams[roi_index] = StreamClassifier(
+                            change_threshold=args.change_threshold,
+                            smoother=PredictionSmoother(mode=args.smoothing)
+                        )
+                    signature = frame_signature(image)
+                    needs_model = stream.should_infer(signature)
+                    jobs.append((source, frame, roi_index, box, stream, signature, needs_model))
+                    if needs_model:
+                        to_predict.append(image)
+
+            predictions = []
+            if to_predict:
+                batch = predictor.new_batch_buffer(len(to_predict))
+                for row, image in zip(batch, to_predict):
+                    predictor.preprocess_image(image, out=row)
+                predictions = iter(predictor.predict_batch(batch))
+
+            results = {}
+            for source, frame, roi_index, box, stream, signature, needs_model in jobs:
+                result = stream.update(next(predictions), signature) if needs_model else stream.reuse()
+                results.setdefault(source.name, (source, frame, []))[2].append((box, result))
+            publish(results, args, infer_rate)
+    except Exception as e:
+        logger.exception(f"Inference failed: {e}")
+    finally:
+        # Let the capture and render stages finish too
+        stop.set()
+
+def publish(results: dict, args, infer_rate: RateMeter):
+    """Hand each source's (frame, ROIs) to the render stage and log them to --output"""
+    done_at = time.perf_counter()
+    infer_rate.tick()
+    for source, frame, rois in results.values():
+        source.processed += 1
+        source.latency_ms = (done_at - frame.captured_at) * 1000
+        source.results.put((frame, rois))
+        if args.output_file:
+            for roi_index, (box, result) in enumerate(rois):
+                args.output_file.write(json.dumps({
+                    "source": source.name,
+                    "frame": frame.index,
+                    "roi": roi_index,
+                    "box": list(box),
+                    "class": result["class"],
+                    "confidence": result["confidence"],
+                    "skipped": result["skipped"],
+                    "latency_ms": round(source.latency_ms, 1),
+                }) + "\n")
+
+def draw(frame: Frame, rois: list, source: Source, infer_rate: RateMeter, display_rate: RateMeter):
+    """Render stage: boxes, labels and pipeline counters onto the frame"""
+    image = frame.image
+    for box, result in rois:
+        x1, y1, x2, y2 = box
+        color = (0, 255, 0) if not result["skipped"] else (0, 200, 255)
+        cv2.rectangle(image, (x1, y1), (x2, y2), color, 3)
+        cv2.putText(image, f"{result['class']} ({result['confidence']:.2f})", (x1 + 5, max(20, y1 - 10)),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.8, color, 2)
+    counters = (
+        f"capture {source.capture_rate.rate:4.1f} fps | infer {infer_rate.rate:4.1f} fps | "
+        f"display {display_rate.rate:4.1f} fps | latency {source.latency_ms:5.0f} ms | dropped {source.frames.dropped}"
     )
+    cv2.putText(image, counters, (10, image.shape[0] - 12), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+    return image
+
+def log_stats(sources: list, infer_rate: RateMeter):
+    for source in sources:
+        skipped = sum(stream.stats()["skipped"] for stream in list(source.streams.values()))
+        inferred = sum(stream.stats()["inferred"] for stream in list(source.streams.values()))
+        logger.info(
+            f"{source.name}: captured {source.captured} ({source.capture_rate.rate:.1f} fps), "
+            f"processed {source.processed}, dropped {source.frames.dropped}, "
+            f"ROIs inferred {inferred} / skipped {skipped}, latency {source.latency_ms:.0f} ms, "
+            f"inference {infer_rate.rate:.1f} fps"
+        )
+
+def render_loop(sources: list, stop: threading.Event, args, infer_rate: RateMeter):
+    """Show the newest result of each source until ESC/q or the sources end"""
+    display_rates = {source.name: RateMeter() for source in sources}
+    last_stats = time.perf_counter()
+    while not stop.is_set():
+        for source in sources:
+            item = source.results.take()
+            if item is None:
+                continue
+            frame, rois = item
+            display_rates[source.name].tick()
+            if not args.headless:
+                cv2.imshow(f"{WINDOW_TITLE} - {source.name}", draw(frame, rois, source, infer_rate, display_rates[source.name]))
+
+        if args.headless:
+            time.sleep(0.01)
+        elif cv2.waitKey(1) & 0xFF in (27, ord("q")):
+            stop.set()
+        if time.perf_counter() - last_stats >= STATS_INTERVAL_SECONDS:
+            log_stats(sources, infer_rate)
+            last_stats = time.perf_counter()
+
+def parse_grid(value: str) -> tuple:
+    try:
+        rows, cols = (int(part) for part in value.lower().split("x"))
+        if rows < 1 or cols < 1:
+            raise ValueError
+        return rows, cols
+    except ValueError:
+        raise argparse.ArgumentTypeError("Grid must look like 2x2")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Live garbage classification from cameras or video files")
+    parser.add_argument("--source", action="append", dest="sources",
+                        help="Camera index or video file/URL; repeat for several sources (default: 0)")
+    parser.add_argument("--box-size", type=int, default=300, help="Side of the centred ROI in pixels (default: 300)")
+    parser.add_argument("--grid", type=parse_grid, default=(1, 1),
+                        help="Classify a rows x cols grid of ROIs instead of the centre box, e.g. 2x2")
+    parser.add_argument("--detect", action="store_true",
+                        help="Locate and classify every item in the frame instead of fixed ROIs")
+    parser.add_argument("--min-confidence", type=float, default=DETECT_MIN_CONFIDENCE,
+                        help=f"With --detect, smallest confidence for an item to be shown (default: {DETECT_MIN_CONFIDENCE})")
+    parser.add_argument("--smoothing", default=STREAM_SMOOTHING, choices=["ema", "majority", "none"],
+                        help=f"Label smoothing over recent predictions (default: {STREAM_SMOOTHING})")
+    parser.add_argument("--change-threshold", type=float, default=STREAM_CHANGE_THRESHOLD,
+                        help="Reuse the last prediction while an ROI changes less than this many grey levels "
+                             f"(0 = always infer, default: {STREAM_CHANGE_THRESHOLD:g})")
+    parser.add_argument("--headless", action="store_true", help="No windows; log results (e.g. for a video file)")
+    parser.add_argument("--max-frames", type=int, default=0, help="Stop each source after this many frames")
+    parser.add_argument("--output", help="Write one JSON line per classified ROI to this file")
+    return parser.parse_args(argv)
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    specs = args.sources or ["0"]
+    sources = [Source(name=f"source{i}:{spec}", spec=spec) for i, spec in enumerate(specs)]
+
+    logger.info("Loading model...")
+    predictor.get_model()
+    if not args.detect:
+        predictor.warm_up([len(sources) * args.grid[0] * args.grid[1]])
+
+    args.output_file = open(args.output, "w", encoding="utf-8") if args.output else None
+    new_frame, stop = threading.Event(), threading.Event()
+    infer_rate = RateMeter()
+    threads = [
+        threading.Thread(target=capture_loop, args=(source, new_frame, stop, args.max_frames),
+                         name=f"capture-{i}", daemon=True)
+        for i, source in enumerate(sources)
+    ]
+    threads.append(threading.Thread(target=inference_loop, args=(sources, new_frame, stop, args, infer_rate),
+                                    name="inference", daemon=True))
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
 
-    cv2.imshow("Garbage Classification (Live)", frame)
+    try:
+        render_loop(sources, stop, args, infer_rate)
+    except KeyboardInterrupt:
+        logger.info("Interrupted")
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join(timeout=5)
+        if args.output_file:
+            args.output_file.close()
+        if not args.headless:
+            cv2.destroyAllWindows()
 
-    if cv2.waitKey(1) & 0xFF == 27:
-        break
+    log_stats(sources, infer_rate)
+    logger.info(f"Finished in {time.perf_counter() - started:.1f}s")
+    return 0 if any(source.processed for source in sources) else 1
 
-cap.release()
-cv2.destroyAllWindows()
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,243 @@
+"""
+Find the fastest worker, thread and batch settings for this machine
+backend/tools/autotune.py
+
+For every combination of worker count, intra-op threads per worker,
+channels-last and CPU affinity, starts the workers the way
+`uvicorn --workers N` does (spawned processes configured by runtime.py
+from the same environment variables), loads the serving model in each and
+runs forward passes of every batch size in all workers at once. The
+combined images per second decide the winner; --max-latency-ms rules out
+settings whose 95th percentile batch latency is too slow.
+
+The best settings are written as an environment file for the API:
+
+    set -a; . ./runtime.env; set +a
+    uvicorn backend.apps.main:app --host 0.0.0.0 --port 8000
+
+Usage:
+    python -m backend.tools.autotune
+    python -m backend.tools.autotune --workers 1,2,4 --threads 0,2 --batch-sizes 1,8,16 --output autotune.json
+    python -m backend.tools.autotune --max-latency-ms 250 --env-file runtime.env
+"""
+import argparse
+import itertools
+import json
+import logging
+import multiprocessing as mp
+import os
+import queue
+import sys
+import time
+from datetime import datetime, timezone
+
+# Setup logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("autotune")
+
+DEFAULT_BATCH_SIZES = (1, 8, 16, 32)
+DEFAULT_ENV_FILE = "runtime.env"
+
+def default_worker_counts() -> list:
+    """1, 2, 4, ... up to the number of physical cores"""
+    from backend.apps.runtime import available_cpus, physical_cores
+    cores = len(physical_cores(available_cpus()))
+    counts = [1]
+    while counts[-1] * 2 <= cores:
+        counts.append(counts[-1] * 2)
+    return counts
+
+def percentile(values: list, p: float) -> float:
+    """Nearest-rank percentile of an unsorted list"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+def worker(batch_sizes, duration, barrier, results):
+    """Load the serving model, then time each batch size in step with the other workers"""
+    logging.getLogger().setLevel(logging.WARNING)
+    try:
+        import torch
+        from backend.apps.config import IMAGE_SIZE
+        from backend.apps.model import predictor
+
+        net, _ = predictor.build_model(*predictor.model_source())
+        generator = torch.Generator().manual_seed(0)
+        for size in batch_sizes:
+            batch = torch.randn(size, 3, *IMAGE_SIZE, generator=generator)
+            with torch.no_grad():
+                net(predictor.model_input(net, batch))
+                barrier.wait()
+                latencies = []
+                started = time.perf_counter()
+                while not latencies or time.perf_counter() - started < duration:
+                    batch_started = time.perf_counter()
+                    net(predictor.model_input(net, batch))
+                    latencies.append(time.perf_counter() - batch_started)
+                elapsed = time.perf_counter() - started
+            results.put({
+                "batch_size": size,
+                "images_per_second": size * len(latencies) / elapsed,
+                "latencies": latencies,
+                "runtime": predictor.cpu_runtime,
+            })
+    except Exception as e:
+        barrier.abort()
+        results.put({"error": f"{type(e).__name__}: {e}"})
+
+def measure(setting: dict, batch_sizes: list, duration: float) -> list:
+    """
+    Run one worker/thread/format combination over all batch sizes
+
+    Returns:
+        list: One result per batch size, combined over the workers
+
+    Raises:
+        RuntimeError: If a worker failed or stopped answering
+    """
+    env = {
+        "WEB_CONCURRENCY": str(setting["workers"]),
+        "TORCH_THREADS": str(setting["threads"]),
+        "CHANNELS_LAST": "1" if setting["channels_last"] else "0",
+        "CPU_AFFINITY": setting["affinity"],
+    }
+    saved = {key: os.environ.get(key) for key in env}
+    os.environ.update(env)
+    context = mp.get_context("spawn")
+    barrier, results = context.Barrier(setting["workers"]), context.Queue()
+    processes = [
+        context.Process(target=worker, args=(batch_sizes, duration, barrier, results))
+        for _ in range(setting["workers"])
+    ]
+    try:
+        for process in processes:
+            process.start()
+        by_size = {size: [] for size in batch_sizes}
+        for _ in range(setting["workers"] * len(batch_sizes)):
+            try:
+                result = results.get(timeout=600 + duration * 10)
+            except queue.Empty:
+                raise RuntimeError("A worker stopped answering")
+            if "error" in result:
+                raise RuntimeError(result["error"])
+            by_size[result["batch_size"]].append(result)
+    finally:
+        for process in processes:
+            process.join(timeout=30)
+            if process.is_alive():
+                process.terminate()
+        for key, value in saved.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+    rows = []
+    for size, per_worker in by_size.items():
+        latencies = [latency for result in per_worker for latency in result["latencies"]]
+        runtime = per_worker[0]["runtime"]
+        rows.append({
+            **setting,
+            "threads_per_worker": runtime["threads"],
+            "pinned": runtime["pinned"],
+            "batch_size": size,
+            "images_per_second": round(sum(result["images_per_second"] for result in per_worker), 2),
+            "batch_p50_ms": round(percentile(latencies, 50) * 1000, 2),
+            "batch_p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        })
+    return rows
+
+def choose(rows: list, max_latency_ms: float = None) -> dict:
+    """Highest-throughput row within the latency limit (None if none qualifies)"""
+    eligible = [row for row in rows if max_latency_ms is None or row["batch_p95_ms"] <= max_latency_ms]
+    return max(eligible, key=lambda row: row["images_per_second"], default=None)
+
+def write_env_file(path: str, best: dict):
+    """Write the chosen settings as KEY=value lines"""
+    lines = [
+        f"# Written by backend.tools.autotune on {datetime.now(timezone.utc):%Y-%m-%d %H:%M} UTC: "
+        f"{best['images_per_second']} images/s, p95 batch {best['batch_p95_ms']} ms",
+        f"WEB_CONCURRENCY={best['workers']}",
+        f"TORCH_THREADS={best['threads']}",
+        "TORCH_INTEROP_THREADS=1",
+        f"CPU_AFFINITY={best['affinity']}",
+        f"CHANNELS_LAST={1 if best['channels_last'] else 0}",
+        f"BATCH_MAX_SIZE={best['batch_size']}",
+    ]
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+
+def int_list(text: str) -> list:
+    return [int(value) for value in text.split(",") if value.strip()]
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Sweep worker/thread/batch settings and write the fastest")
+    parser.add_argument("--workers", type=int_list, default=None,
+                        help="Worker counts to try (default: 1, 2, 4, ... up to the physical cores)")
+    parser.add_argument("--threads", type=int_list, default=[0],
+                        help="Intra-op threads per worker to try; 0 = one per core of the worker's share (default: 0)")
+    parser.add_argument("--batch-sizes", type=int_list, default=list(DEFAULT_BATCH_SIZES),
+                        help="Batch sizes to time (default: 1,8,16,32)")
+    parser.add_argument("--channels-last", type=int_list, default=[1, 0],
+                        help="Channels-last settings to try, 1 and/or 0 (default: 1,0)")
+    parser.add_argument("--affinity", default="auto",
+                        help="CPU_AFFINITY modes to try, comma-separated (default: auto)")
+    parser.add_argument("--duration", type=float, default=5.0,
+                        help="Seconds to run each batch size (default: 5)")
+    parser.add_argument("--max-latency-ms", type=float, default=None,
+                        help="Ignore settings whose p95 batch latency is above this")
+    parser.add_argument("--env-file", default=DEFAULT_ENV_FILE,
+                        help=f"Where to write the best settings (default: {DEFAULT_ENV_FILE})")
+    parser.add_argument("--output", help="Write the full report as JSON to this file")
+    return parser.parse_args(argv)
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    from backend.apps.runtime import AFFINITY_MODES
+
+    affinities = [mode.strip() for mode in args.affinity.split(",") if mode.strip()]
+    unknown = [mode for mode in affinities if mode not in AFFINITY_MODES]
+    if unknown:
+        logger.error(f"Unknown affinity mode(s): {', '.join(unknown)}. Use: {', '.join(AFFINITY_MODES)}")
+        return 2
+
+    settings = [
+        {"workers": workers, "threads": threads, "channels_last": bool(channels_last), "affinity": affinity}
+        for workers, threads, channels_last, affinity in itertools.product(
+            args.workers or default_worker_counts(), args.threads, args.channels_last, affinities
+        )
+    ]
+    rows, failures = [], []
+    for setting in settings:
+        logger.info(f"Measuring {setting}")
+        try:
+            measured = measure(setting, args.batch_sizes, args.duration)
+        except RuntimeError as e:
+            logger.warning(f"Skipping {setting}: {e}")
+            failures.append({**setting, "error": str(e)})
+            continue
+        for row in measured:
+            logger.info(
+                f"  batch {row['batch_size']}: {row['images_per_second']} images/s, "
+                f"p95 batch {row['batch_p95_ms']} ms ({row['threads_per_worker']} threads per worker)"
+            )
+        rows.extend(measured)
+
+    best = choose(rows, args.max_latency_ms)
+    report = {"cpu_count": os.cpu_count(), "results": rows, "failures": failures, "best": best}
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if best is None:
+        logger.error("No setting met the latency limit" if rows else "Every setting failed")
+        return 1
+    write_env_file(args.env_file, best)
+    logger.info(f"Best: {best['workers']} workers x {best['threads_per_worker']} threads, batch {best['batch_size']}, "
+                f"channels_last={best['channels_last']} -> {args.env_file}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,502 @@
+"""
+Micro-benchmarks and load tests with diffable JSON reports
+backend/tools/benchmark.py
+
+micro:   times preprocessing (torchvision transform, fast transform, full
+         decode + preprocess) per sample image, and the GarbageModel forward
+         pass at batch sizes 1..64. The model is randomly initialised with a
+         fixed seed, so no checkpoint is needed. With --tta-modes it also
+         times test-time augmentation of one image: all views in one
+         batched forward pass against one forward pass per view. It also
+         reports the time and size of each response encoding for one and
+         64 predictions.
+load:    sends /predict requests with a fixed number of concurrent clients,
+         either in-process (ASGI transport, no server needed) or against a
+         running server (--url), and reports throughput and latency
+         percentiles. Uploads get unique trailing bytes so the prediction
+         cache does not answer them (--allow-cache to measure cache hits).
+         --accept sets the response format (e.g. application/msgpack).
+compare: diffs two reports and exits with status 1 if a latency got slower
+         or a throughput got lower by more than --threshold percent.
+
+Usage:
+    python -m backend.tools.benchmark micro --output micro.json
+    python -m backend.tools.benchmark load --concurrency 16 --requests 400 --output load.json
+    python -m backend.tools.benchmark load --url http://localhost:8000 --concurrency 32 --duration 30
+    python -m backend.tools.benchmark compare baseline.json load.json --threshold 10
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+# Setup logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("benchmark")
+
+DEFAULT_BATCH_SIZES = (1, 2, 4, 8, 16, 32, 64)
+DEFAULT_IMAGES = "test images"
+
+# Settings worth recording alongside load-test numbers
+ENV_SETTINGS = {
+    "BATCH_MAX_SIZE", "BATCH_MAX_WAIT_MS", "INFERENCE_THREADS", "MAX_IN_FLIGHT_REQUESTS",
+    "INFERENCE_BACKEND", "PREPROCESS_ENGINE", "PREDICTION_CACHE", "MODEL_MMAP",
+    "WEB_CONCURRENCY", "TORCH_THREADS", "TORCH_INTEROP_THREADS", "CPU_AFFINITY", "CHANNELS_LAST",
+}
+
+def percentile(values: list, p: float) -> float:
+    """Nearest-rank percentile of an unsorted list"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+def latency_summary(seconds: list) -> dict:
+    """Latency statistics in milliseconds"""
+    return {
+        "mean_ms": round(statistics.mean(seconds) * 1000, 3) if seconds else 0.0,
+        "p50_ms": round(percentile(seconds, 50) * 1000, 3),
+        "p95_ms": round(percentile(seconds, 95) * 1000, 3),
+        "p99_ms": round(percentile(seconds, 99) * 1000, 3),
+        "max_ms": round(max(seconds) * 1000, 3) if seconds else 0.0,
+    }
+
+def environment() -> dict:
+    """Machine and code version the numbers were measured on"""
+    info = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+    try:
+        info["git_commit"] = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        info["git_commit"] = None
+    if "torch" in sys.modules:
+        torch = sys.modules["torch"]
+        info["torch"] = torch.__version__
+        info["torch_threads"] = torch.get_num_threads()
+    return info
+
+def load_images(folder: str) -> list:
+    """(name, bytes) for every image in folder"""
+    from backend.apps.model.optimize import iter_image_paths
+    images = [(Path(path).name, Path(path).read_bytes()) for path in iter_image_paths(folder)]
+    if not images:
+        raise ValueError(f"No images found in {folder}")
+    return images
+
+def write_report(report: dict, output: str):
+    print(json.dumps(report, indent=2))
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        logger.info(f"Report written to {output}")
+
+# ---------------------------------------------------------------------------
+# Micro-benchmarks
+# ---------------------------------------------------------------------------
+
+def time_call(func, repeats: int, warmup: int = 1) -> list:
+    """Wall-clock durations of repeated calls, after warm-up calls"""
+    for _ in range(warmup):
+        func()
+    durations = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - started)
+    return durations
+
+def bench_preprocessing(images: list, repeats: int) -> dict:
+    """Median per-image preprocessing time of each engine"""
+    from backend.apps.model import predictor
+    from backend.utils.image_utils import decode_image
+
+    decoded = [decode_image(content) for _, content in images]
+    engines = {
+        "torchvision_transform": lambda: [predictor.transform(image) for image in decoded],
+        "fast_transform": lambda: [predictor.fast_transform(image) for image in decoded],
+        "decode_and_preprocess": lambda: [predictor.preprocess_bytes(content) for _, content in images],
+    }
+    results = {}
+    for name, func in engines.items():
+        per_image = [d / len(images) for d in time_call(func, repeats)]
+        results[name] = {"per_image_ms": round(statistics.median(per_image) * 1000, 3)}
+        logger.info(f"{name:<24} {results[name]['per_image_ms']:8.3f} ms/image")
+    return results
+
+def bench_forward(backend: str, batch_sizes: list, repeats: int, seed: int) -> dict:
+    """Forward-pass latency and throughput of a randomly initialised model"""
+    import torch
+    from backend.apps.config import CLASSES, IMAGE_SIZE, QUANT_CALIBRATION_DIR, QUANT_CALIBRATION_IMAGES
+    from backend.apps.model.model import GarbageModel
+    from backend.apps.model.optimize import build_inference_model
+    from backend.apps.model.predictor import device, transform
+
+    torch.manual_seed(seed)
+    model = GarbageModel(num_classes=len(CLASSES)).to(device).eval()
+    if backend != "eager":
+        model = build_inference_model(
+            model, backend, device, transform=transform,
+            calibration_dir=QUANT_CALIBRATION_DIR, calibration_images=QUANT_CALIBRATION_IMAGES
+        )
+
+    results = {}
+    generator = torch.Generator().manual_seed(seed)
+    for size in batch_sizes:
+        batch = torch.randn(size, 3, *IMAGE_SIZE, generator=generator).to(device)
+
+        def forward():
+            with torch.no_grad():
+                model(batch)
+            if device.type == "cuda":
+                torch.cuda.synchronize()
+
+        median = statistics.median(time_call(forward, repeats, warmup=2))
+        results[str(size)] = {
+            "batch_ms": round(median * 1000, 3),
+            "per_image_ms": round(median / size * 1000, 3),
+            "images_per_second": round(size / median, 2),
+        }
+        logger.info(
+            f"{backend} batch {size:>3}: {results[str(size)]['batch_ms']:9.2f} ms "
+            f"({results[str(size)]['images_per_second']:.1f} img/s)"
+        )
+    return results
+
+def bench_tta(modes: list, repeats: int, seed: int) -> dict:
+    """Batched test-time augmentation of one image against sequential per-view calls"""
+    import torch
+    from backend.apps.config import CLASSES, IMAGE_SIZE, TTA_MAX_VIEWS_PER_FORWARD
+    from backend.apps.model.model import GarbageModel
+    from backend.apps.model.predictor import device
+    from backend.apps.model.tta import tta_probabilities, tta_views, view_count
+
+    torch.manual_seed(seed)
+    model = GarbageModel(num_classes=len(CLASSES)).to(device).eval()
+    image = torch.randn(1, 3, *IMAGE_SIZE, generator=torch.Generator().manual_seed(seed)).to(device)
+
+    def synchronize():
+        if device.type == "cuda":
+            torch.cuda.synchronize()
+
+    results = {}
+    for mode in modes:
+        def batched():
+            tta_probabilities(model, image, mode, TTA_MAX_VIEWS_PER_FORWARD)
+            synchronize()
+
+        def sequential():
+            with torch.no_grad():
+                for view in tta_views(image, mode):
+                    torch.softmax(model(view.unsqueeze(0)), dim=1)
+            synchronize()
+
+        batched_median = statistics.median(time_call(batched, repeats))
+        sequential_median = statistics.median(time_call(sequential, repeats))
+        results[mode] = {
+            "views": view_count(mode),
+            "batched_ms": round(batched_median * 1000, 3),
+            "sequential_ms": round(sequential_median * 1000, 3),
+            "speedup": round(sequential_median / batched_median, 2),
+        }
+        logger.info(
+            f"TTA {mode} ({results[mode]['views']} views): batched {results[mode]['batched_ms']:.1f} ms, "
+            f"sequential {results[mode]['sequential_ms']:.1f} ms"
+        )
+    return results
+
+def bench_encoding(repeats: int, seed: int) -> dict:
+    """Per-response formatting and encoding time, and body size, of each response format"""
+    import torch
+    from backend.apps import encoding
+    from backend.apps.config import CLASSES
+    from backend.apps.model import predictor
+
+    # The encoders take microseconds, so each timed call encodes many responses
+    calls = 200
+    generator = torch.Generator().manual_seed(seed)
+    results = {}
+    for count in (1, 64):
+        probabilities = torch.softmax(torch.randn(count, len(CLASSES), generator=generator), dim=1)
+        predictions = predictor._format_predictions(probabilities)
+        content = predictions[0] if count == 1 else {"total": count, "results": predictions}
+        encoders = {
+            # What a plain JSONResponse does
+            "json_stdlib": lambda: json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode(),
+            **{media_type: (lambda media_type=media_type: encoding.encode(content, media_type, predictions))
+               for media_type in encoding.available_media_types(probabilities=True)},
+        }
+        timings = {"format_us": round(statistics.median(time_call(
+            lambda: [predictor._format_predictions(probabilities) for _ in range(calls)],
+            repeats
+        )) / calls * 1e6, 2)}
+        for name, encode in encoders.items():
+            median = statistics.median(time_call(lambda: [encode() for _ in range(calls)], repeats))
+            timings[name] = {"encode_us": round(median / calls * 1e6, 2), "bytes": len(encode())}
+        results[f"{count}_predictions"] = timings
+        logger.info(f"Encoding {count} predictions: " + ", ".join(
+            f"{name} {value['encode_us']}us/{value['bytes']}B" for name, value in timings.items() if name != "format_us"
+        ))
+    return results
+
+def run_micro(args) -> int:
+    import torch
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    report = {"kind": "micro", "environment": environment(), "config": {
+        "batch_sizes": args.batch_sizes, "repeats": args.repeats, "seed": args.seed, "backends": args.backends,
+        "tta_modes": args.tta_modes,
+    }}
+    report["preprocessing"] = bench_preprocessing(load_images(args.images), args.repeats)
+    report["forward"] = {
+        backend: bench_forward(backend, args.batch_sizes, args.repeats, args.seed) for backend in args.backends
+    }
+    if args.tta_modes:
+        report["tta"] = bench_tta(args.tta_modes, args.repeats, args.seed)
+    report["encoding"] = bench_encoding(args.repeats, args.seed)
+    write_report(report, args.output)
+    return 0
+
+# ---------------------------------------------------------------------------
+# Load test
+# ---------------------------------------------------------------------------
+
+def use_random_model():
+    """Serve a seeded, randomly initialised model so no checkpoint is needed"""
+    import torch
+    from backend.apps.config import CLASSES
+    from backend.apps.model import predictor
+    from backend.apps.model.model import GarbageModel
+    from backend.apps.model.registry import LoadedModel
+
+    torch.manual_seed(0)
+    net = GarbageModel(num_classes=len(CLASSES)).to(predictor.device).eval()
+    predictor.registry.register(LoadedModel(version="random", path="random", backend="eager", net=net))
+
+async def client_loop(client, images: list, deadline: float, sent: Counter, limit: int, unique: bool,
+                      latencies: list, statuses: Counter):
+    """One simulated client sending /predict requests back to back"""
+    while time.perf_counter() < deadline:
+        if limit and sent["requests"] >= limit:
+            return
+        sequence = sent["requests"]
+        sent["requests"] += 1
+        name, content = images[sequence % len(images)]
+        if unique:
+            # Trailing bytes are ignored by image decoders but change the cache key
+            content = content + sequence.to_bytes(8, "little") + os.urandom(8)
+
+        started = time.perf_counter()
+        try:
+            response = await client.post("/predict", files={"file": (name, content, "application/octet-stream")})
+            statuses[str(response.status_code)] += 1
+            if response.status_code == 200:
+                latencies.append(time.perf_counter() - started)
+                sent["response_bytes"] += len(response.content)
+        except Exception as e:
+            statuses[type(e).__name__] += 1
+
+async def drive(client, images: list, concurrency: int, requests: int, duration: float, unique: bool) -> dict:
+    """Run the clients and summarise throughput and latency"""
+    latencies, statuses, sent = [], Counter(), Counter()
+    deadline = time.perf_counter() + duration if duration else float("inf")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        client_loop(client, images, deadline, sent, requests, unique, latencies, statuses) for _ in range(concurrency)
+    ))
+    elapsed = time.perf_counter() - started
+
+    completed = sum(statuses.values())
+    return {
+        "requests": completed,
+        "succeeded": len(latencies),
+        "status_counts": dict(sorted(statuses.items())),
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput_per_second": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "avg_response_bytes": round(sent["response_bytes"] / len(latencies), 1) if latencies else 0.0,
+        "latency": latency_summary(latencies),
+    }
+
+async def load_test(args) -> dict:
+    try:
+        import httpx
+    except ImportError:
+        raise SystemExit("The load test needs httpx. Run: pip install httpx")
+
+    images = load_images(args.images)
+    if args.url:
+        return await measure(httpx, args, images, None, args.url.rstrip("/"))
+
+    from backend.apps.config import MODEL_PATH
+    from backend.apps.main import app
+    from backend.apps.model import loader
+    if args.random_model or not os.path.exists(MODEL_PATH):
+        logger.info("Using a randomly initialised model (no checkpoint loaded)")
+        use_random_model()
+
+    # Run the app's startup/shutdown handlers around the in-process test
+    async with app.router.lifespan_context(app):
+        if not await asyncio.to_thread(loader.wait_until_ready, 600):
+            raise SystemExit(f"Model failed to load: {loader.status()['error']}")
+        return await measure(httpx, args, images, httpx.ASGITransport(app=app), "http://benchmark")
+
+async def measure(httpx, args, images: list, transport, base_url: str) -> dict:
+    """Warm up, then run the measured load against base_url"""
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    headers = {"Accept": args.accept} if args.accept else None
+    async with httpx.AsyncClient(transport=transport, base_url=base_url, timeout=args.timeout, limits=limits,
+                                 headers=headers) as client:
+        ready = await client.get("/ready")
+        if ready.status_code != 200:
+            raise SystemExit(f"Server at {base_url} is not ready ({ready.status_code})")
+        if args.warmup:
+            logger.info(f"Warm-up: {args.warmup} requests")
+            await drive(client, images, args.concurrency, args.warmup, 0, not args.allow_cache)
+
+        logger.info(f"Measuring: concurrency {args.concurrency}, "
+                    f"{args.requests or 'unlimited'} requests, {args.duration or 'no'} time limit")
+        result = await drive(client, images, args.concurrency, args.requests, args.duration, not args.allow_cache)
+        stats = await client.get("/stats")
+        if stats.status_code == 200:
+            result["server_batching"] = stats.json().get("batching")
+    return result
+
+def run_load(args) -> int:
+    if not args.requests and not args.duration:
+        args.requests = 200
+    result = asyncio.run(load_test(args))
+    report = {
+        "kind": "load",
+        "environment": environment(),
+        "config": {
+            "target": args.url or "in-process",
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "duration": args.duration,
+            "unique_uploads": not args.allow_cache,
+            "accept": args.accept,
+            "env": {key: os.environ[key] for key in sorted(os.environ) if key in ENV_SETTINGS},
+        },
+        "result": result,
+    }
+    write_report(report, args.output)
+    return 0 if result["succeeded"] else 1
+
+# ---------------------------------------------------------------------------
+# Report comparison
+# ---------------------------------------------------------------------------
+
+def flatten(report: dict, prefix: str = "") -> dict:
+    """Numeric leaves of a report keyed by their dotted path"""
+    values = {}
+    for key, value in report.items():
+        path = f"{prefix}{key}"
+        if key in ("environment", "config"):
+            continue
+        if isinstance(value, dict):
+            values.update(flatten(value, path + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            values[path] = value
+    return values
+
+def direction(path: str) -> int:
+    """+1 if higher is better, -1 if lower is better, 0 if not compared"""
+    if path.endswith("max_wait_ms"):
+        # The batcher's configured wait, not a measurement
+        return 0
+    if path.endswith("_ms"):
+        return -1
+    if path.endswith("per_second"):
+        return 1
+    return 0
+
+def run_compare(args) -> int:
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = flatten(json.load(f))
+    with open(args.current, encoding="utf-8") as f:
+        current = flatten(json.load(f))
+
+    regressions = 0
+    for path in sorted(set(baseline) & set(current)):
+        sign = direction(path)
+        if not sign or not baseline[path]:
+            continue
+        change = (current[path] - baseline[path]) / baseline[path] * 100
+        regressed = -sign * change > args.threshold
+        regressions += regressed
+        marker = "REGRESSION" if regressed else ""
+        print(f"{path:<60} {baseline[path]:>12.3f} -> {current[path]:>12.3f} {change:+7.1f}% {marker}")
+
+    print(f"{regressions} regression(s) beyond {args.threshold}%")
+    return 1 if regressions else 0
+
+# ---------------------------------------------------------------------------
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark preprocessing, model forward and the HTTP API")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    micro = commands.add_parser("micro", help="Preprocessing and forward-pass micro-benchmarks")
+    micro.add_argument("--images", default=DEFAULT_IMAGES, help="Folder of sample images (default: 'test images')")
+    micro.add_argument("--batch-sizes", type=int, nargs="+", default=list(DEFAULT_BATCH_SIZES),
+                       help="Forward-pass batch sizes (default: 1 2 4 8 16 32 64)")
+    micro.add_argument("--backends", nargs="+", default=["eager"],
+                       choices=["eager", "torchscript", "compile", "int8_dynamic", "int8_static"],
+                       help="Inference backends to benchmark (default: eager)")
+    micro.add_argument("--tta-modes", nargs="+", default=[], choices=["flip", "five_crop", "ten_crop", "multi_scale"],
+                       help="Test-time augmentation modes to benchmark (default: none)")
+    micro.add_argument("--repeats", type=int, default=5, help="Timed repetitions per measurement (default: 5)")
+    micro.add_argument("--threads", type=int, help="torch intra-op threads (default: torch's choice)")
+    micro.add_argument("--seed", type=int, default=0, help="Random seed for weights and inputs (default: 0)")
+    micro.add_argument("--output", help="Write the report as JSON to this file")
+
+    load = commands.add_parser("load", help="Concurrent /predict load test")
+    load.add_argument("--url", help="Base URL of a running server (default: run the app in-process)")
+    load.add_argument("--images", default=DEFAULT_IMAGES, help="Folder of images to upload (default: 'test images')")
+    load.add_argument("--concurrency", type=int, default=8, help="Concurrent clients (default: 8)")
+    load.add_argument("--requests", type=int, help="Total requests to send (default: 200 unless --duration)")
+    load.add_argument("--duration", type=float, help="Stop after this many seconds")
+    load.add_argument("--warmup", type=int, default=16, help="Unmeasured warm-up requests (default: 16)")
+    load.add_argument("--timeout", type=float, default=60.0, help="Per-request timeout in seconds (default: 60)")
+    load.add_argument("--allow-cache", action="store_true", help="Upload identical bytes so repeats hit the cache")
+    load.add_argument("--accept", help="Accept header for the responses (default: JSON)")
+    load.add_argument("--random-model", action="store_true",
+                      help="In-process only: serve a random model even if the checkpoint exists")
+    load.add_argument("--output", help="Write the report as JSON to this file")
+
+    compare = commands.add_parser("compare", help="Compare two reports and flag regressions")
+    compare.add_argument("baseline", help="Report from the reference commit")
+    compare.add_argument("current", help="Report to check")
+    compare.add_argument("--threshold", type=float, default=10.0,
+                         help="Allowed slowdown in percent before failing (default: 10)")
+
+    return parser.parse_args(argv)
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    if args.command == "micro":
+        return run_micro(args)
+    if args.command == "load":
+        return run_load(args)
+    return run_compare(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,256 @@
+"""
+Offline bulk classification of image directories
+backend/tools/bulk_classify.py
+
+Walks a directory (or reads a file list), decodes images in a pool of
+DataLoader worker processes, runs fixed-size batches through the model and
+streams results to JSONL or CSV. Progress is checkpointed after every batch
+so an interrupted run can be resumed with --resume. With --index the
+embeddings from the same forward pass are added to a vector index for
+similarity search and near-duplicate detection (see /search and
+backend.tools.embedding_index).
+
+Usage:
+    python -m backend.tools.bulk_classify --input "test images" --output results.jsonl
+    python -m backend.tools.bulk_classify --file-list paths.txt --output results.csv --workers 8
+    python -m backend.tools.bulk_classify --input /data/images --output results.jsonl --resume
+    python -m backend.tools.bulk_classify --input /data/images --output results.jsonl --index /data/index
+"""
+import argparse
+import csv
+import json
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+
+import torch
+from torch.utils.data import DataLoader, IterableDataset, get_worker_info
+
+from backend.apps.config import ALLOWED_EXTENSIONS, CLASSES, IMAGE_SIZE
+from backend.apps.model.predictor import preprocess_bytes, predict_batch, predict_and_embed, get_loaded
+from backend.apps.vector_index import VectorIndex
+
+# Setup logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("bulk_classify")
+
+def iter_directory(root: str):
+    """Yield image paths under root in a stable (sorted) order without listing everything up front"""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if name.rsplit('.', 1)[-1].lower() in ALLOWED_EXTENSIONS:
+                yield os.path.join(dirpath, name)
+
+def iter_file_list(list_path: str):
+    """Yield paths from a text file with one path per line"""
+    with open(list_path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                yield line
+
+class ImagePathDataset(IterableDataset):
+    """
+    Streams (index, path, tensor, error) items for a path source
+
+    Paths are split across DataLoader workers in whole batches: worker w
+    decodes batches w, w + num_workers, ... Because the DataLoader returns
+    worker batches round-robin, results come back in input order, which is
+    what makes the count-based checkpoint valid.
+    """
+
+    def __init__(self, input_dir=None, file_list=None, batch_size=32, skip=0):
+        self.input_dir = input_dir
+        self.file_list = file_list
+        self.batch_size = batch_size
+        self.skip = skip
+
+    def _paths(self):
+        if self.input_dir:
+            return iter_directory(self.input_dir)
+        return iter_file_list(self.file_list)
+
+    def __iter__(self):
+        worker = get_worker_info()
+        worker_id = worker.id if worker else 0
+        num_workers = worker.num_workers if worker else 1
+
+        for index, path in enumerate(self._paths()):
+            if index < self.skip:
+                continue
+            if ((index - self.skip) // self.batch_size) % num_workers != worker_id:
+                continue
+            try:
+                tensor = preprocess_bytes(Path(path).read_bytes())
+                error = ""
+            except Exception as e:
+                tensor = torch.zeros(3, *IMAGE_SIZE)
+                error = str(e) or e.__class__.__name__
+            yield index, path, tensor, error
+
+class ResultWriter:
+    """Appends prediction rows to a JSONL or CSV file"""
+
+    def __init__(self, path: str, fmt: str, append: bool):
+        self.fmt = fmt
+        new_file = not (append and os.path.exists(path) and os.path.getsize(path) > 0)
+        self._file = open(path, "a" if append else "w", encoding="utf-8", newline="")
+        if fmt == "csv":
+            self._csv = csv.writer(self._file)
+            if new_file:
+                self._csv.writerow(["path", "class", "confidence", "error"] + CLASSES)
+
+    def write(self, path: str, result: dict = None, error: str = ""):
+        if self.fmt == "jsonl":
+            row = {"path": path, **result} if result else {"path": path, "error": error}
+            self._file.write(json.dumps(row) + "\n")
+        elif result:
+            probs = [result["all_predictions"][name] for name in CLASSES]
+            self._csv.writerow([path, result["class"], result["confidence"], ""] + probs)
+        else:
+            self._csv.writerow([path, "", "", error] + [""] * len(CLASSES))
+
+    def flush(self) -> int:
+        """Flush to disk and return the current file size (used as the resume offset)"""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        return self._file.tell()
+
+    def close(self):
+        self._file.close()
+
+def load_checkpoint(path: str) -> dict:
+    """Read a checkpoint file, or return an empty one"""
+    if not os.path.exists(path):
+        return {"processed": 0, "output_bytes": 0}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def save_checkpoint(path: str, state: dict):
+    """Atomically write the checkpoint"""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
+
+def add_to_index(index: VectorIndex, path: str, embeddings, image_paths: list, predictions: list) -> VectorIndex:
+    """Append embeddings with their path and predicted class, creating the index on first use"""
+    model_version = get_loaded().version
+    if index.dim is None:
+        index = VectorIndex.create(path, embeddings.shape[1], model_version)
+    index.add(embeddings, [
+        {"path": image_path, "class": prediction["class"], "confidence": prediction["confidence"]}
+        for image_path, prediction in zip(image_paths, predictions)
+    ], model_version)
+    return index
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Classify a directory of garbage images in bulk")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--input", help="Directory to walk recursively for images")
+    source.add_argument("--file-list", help="Text file with one image path per line")
+    parser.add_argument("--output", required=True, help="Output file (.jsonl or .csv)")
+    parser.add_argument("--format", choices=["jsonl", "csv"], help="Output format (default: from extension)")
+    parser.add_argument("--batch-size", type=int, default=32, help="Images per forward pass (default: 32)")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) - 1),
+                        help="Decoder worker processes (default: CPU count - 1)")
+    parser.add_argument("--checkpoint", help="Checkpoint file (default: <output>.ckpt)")
+    parser.add_argument("--resume", action="store_true", help="Continue from the checkpoint")
+    parser.add_argument("--index", help="Also add image embeddings to the vector index in this directory")
+    parser.add_argument("--log-every", type=int, default=20, help="Log throughput every N batches")
+    return parser.parse_args(argv)
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    fmt = args.format or ("csv" if args.output.lower().endswith(".csv") else "jsonl")
+    checkpoint_path = args.checkpoint or args.output + ".ckpt"
+
+    state = {"processed": 0, "output_bytes": 0, "index_count": 0}
+    if args.resume:
+        state = load_checkpoint(checkpoint_path)
+        # Drop anything written after the last checkpoint so rows are never duplicated
+        if os.path.exists(args.output):
+            with open(args.output, "r+b") as f:
+                f.truncate(state["output_bytes"])
+        logger.info(f"Resuming after {state['processed']} images")
+
+    index = VectorIndex(args.index) if args.index else None
+    if index is not None and index.dim is not None:
+        # Like the output file: start over, or drop rows added after the checkpoint
+        index.truncate(state.get("index_count", 0))
+        logger.info(f"Vector index {args.index}: continuing from {index.count} vectors")
+
+    dataset = ImagePathDataset(
+        input_dir=args.input,
+        file_list=args.file_list,
+        batch_size=args.batch_size,
+        skip=state["processed"],
+    )
+    loader = DataLoader(
+        dataset,
+        batch_size=args.batch_size,
+        num_workers=args.workers,
+        prefetch_factor=2 if args.workers > 0 else None,
+    )
+
+    writer = ResultWriter(args.output, fmt, append=args.resume)
+    started = time.perf_counter()
+    window_started, window_count = started, 0
+    done = 0
+
+    try:
+        for batch_number, (indices, paths, tensors, errors) in enumerate(loader, start=1):
+            ok = [i for i, error in enumerate(errors) if not error]
+            if ok and index is not None:
+                results, embeddings = predict_and_embed(tensors[ok])
+                index = add_to_index(index, args.index, embeddings, [paths[i] for i in ok], results)
+                predictions = dict(zip(ok, results))
+            else:
+                predictions = dict(zip(ok, predict_batch(tensors[ok]))) if ok else {}
+
+            for i, path in enumerate(paths):
+                if i in predictions:
+                    writer.write(path, result=predictions[i])
+                else:
+                    writer.write(path, error=errors[i])
+
+            done += len(paths)
+            window_count += len(paths)
+            state = {
+                "processed": int(indices[-1]) + 1,
+                "output_bytes": writer.flush(),
+                "index_count": index.count if index is not None else 0,
+            }
+            save_checkpoint(checkpoint_path, state)
+
+            if batch_number % args.log_every == 0:
+                now = time.perf_counter()
+                logger.info(
+                    f"{state['processed']} images processed | "
+                    f"{window_count / (now - window_started):.1f} img/s (recent) | "
+                    f"{done / (now - started):.1f} img/s (overall)"
+                )
+                window_started, window_count = now, 0
+    except KeyboardInterrupt:
+        logger.warning(f"Interrupted. Re-run with --resume to continue after {state['processed']} images.")
+        return 130
+    finally:
+        writer.close()
+
+    elapsed = time.perf_counter() - started
+    logger.info(
+        f"Finished: {done} images in {elapsed:.1f}s "
+        f"({done / elapsed if elapsed > 0 else 0:.1f} img/s). Results: {args.output}"
+    )
+    if index is not None:
+        logger.info(f"Vector index {args.index}: {index.count} vectors")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,158 @@
+"""
+Accuracy and throughput of the early-exit cascade across confidence thresholds
+backend/tools/cascade_report.py
+
+Runs the full model and the cascade student over a labelled folder (labels
+from the parent folder or file name, as in compare_backends) and reports,
+for each threshold, the share of images escalated to the full model, the
+accuracy and agreement with the full model alone, and the measured
+throughput of the cascade against the full model. The recommended
+threshold is the cheapest one whose accuracy (or agreement, without
+labels) is at most --max-drop below the full model's.
+
+Usage:
+    python -m backend.tools.cascade_report --data /data/val --student backend/apps/model/cascade_student.pth
+    python -m backend.tools.cascade_report --data /data/val --thresholds 0.7 0.8 0.9 --backend int8_static --output cascade.json
+"""
+import argparse
+import json
+import logging
+import sys
+import time
+from pathlib import Path
+
+import torch
+
+from backend.apps.config import CASCADE_MODEL_PATH, INFERENCE_BACKEND
+from backend.apps.model.cascade import cascade_probabilities, load_student
+from backend.apps.model.optimize import SUPPORTED_BACKENDS, iter_image_paths
+from backend.apps.model.predictor import build_model, checkpoint_version, device, model_source, preprocess_bytes
+from backend.tools.compare_backends import label_for
+
+# Setup logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("cascade_report")
+
+def load_dataset(folder: str, limit: int = None):
+    """Preprocess images the way the API does into one tensor plus their labels"""
+    tensors, labels = [], []
+    for path in iter_image_paths(folder, limit):
+        try:
+            tensors.append(preprocess_bytes(Path(path).read_bytes()))
+            labels.append(label_for(path))
+        except Exception as e:
+            logger.warning(f"Skipping {path}: {e}")
+    if not tensors:
+        raise ValueError(f"No readable images found in {folder}")
+    return torch.stack(tensors), labels
+
+def batches(images: torch.Tensor, batch_size: int):
+    return [images[i:i + batch_size].to(device) for i in range(0, len(images), batch_size)]
+
+def timed_seconds(run, repeats: int) -> float:
+    """Median wall time of run() over repeats, after one warm-up call"""
+    timings = []
+    with torch.no_grad():
+        run()
+        for _ in range(repeats):
+            started = time.perf_counter()
+            run()
+            timings.append(time.perf_counter() - started)
+    timings.sort()
+    return timings[len(timings) // 2]
+
+def score(top1: torch.Tensor, labels: list, reference_top1: torch.Tensor) -> dict:
+    labelled = [i for i, label in enumerate(labels) if label is not None]
+    accuracy = None
+    if labelled:
+        accuracy = round(sum(int(top1[i]) == labels[i] for i in labelled) / len(labelled), 4)
+    return {"accuracy": accuracy, "agreement_with_full": round((top1 == reference_top1).float().mean().item(), 4)}
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Report the cascade's accuracy/throughput trade-off per threshold")
+    parser.add_argument("--data", required=True, help="Folder of labelled images")
+    parser.add_argument("--student", default=CASCADE_MODEL_PATH, help="Student checkpoint (default: CASCADE_MODEL_PATH)")
+    parser.add_argument("--model", help="Full model checkpoint or ONNX file (default: the configured model)")
+    parser.add_argument("--backend", default=INFERENCE_BACKEND, choices=SUPPORTED_BACKENDS,
+                        help=f"Inference backend of the full model (default: {INFERENCE_BACKEND})")
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[0.5, 0.6, 0.7, 0.8, 0.9, 0.95, 0.99],
+                        help="Confidence thresholds to evaluate")
+    parser.add_argument("--max-drop", type=float, default=0.01,
+                        help="Accuracy loss tolerated for the recommended threshold (default: 0.01)")
+    parser.add_argument("--limit", type=int, help="Maximum number of images to use")
+    parser.add_argument("--batch-size", type=int, default=16, help="Batch size for evaluation and timing")
+    parser.add_argument("--repeats", type=int, default=3, help="Timed passes over the data per configuration")
+    parser.add_argument("--output", help="Write the report as JSON to this file")
+    return parser.parse_args(argv)
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    if not args.student:
+        raise SystemExit("No student model: pass --student or set CASCADE_MODEL_PATH")
+
+    images, labels = load_dataset(args.data, args.limit)
+    logger.info(f"Loaded {len(images)} images ({sum(l is not None for l in labels)} labelled) from {args.data}")
+
+    model_path, backend = model_source(args.model, args.backend)
+    net, version = build_model(model_path, backend)
+    student = load_student(args.student, device)
+    if checkpoint_version(model_path) != student.teacher_version:
+        logger.warning(
+            f"Student was distilled from {student.teacher_version}, not from {model_path}; "
+            f"the API would not use it in front of this model"
+        )
+
+    data = batches(images, args.batch_size)
+    with torch.no_grad():
+        full = torch.cat([torch.softmax(net(batch), dim=1).cpu() for batch in data])
+        student_probabilities = torch.cat([torch.softmax(student(batch), dim=1).cpu() for batch in data])
+    full_top1 = full.argmax(dim=1)
+    student_confidence, student_top1 = student_probabilities.max(dim=1)
+
+    full_seconds = timed_seconds(lambda: [net(batch) for batch in data], args.repeats)
+    report = {
+        "model_version": version,
+        "student": {"path": args.student, "arch": student.arch, "teacher_version": student.teacher_version},
+        "device": str(device),
+        "images": len(images),
+        "batch_size": args.batch_size,
+        "full_model": dict(score(full_top1, labels, full_top1),
+                           images_per_second=round(len(images) / full_seconds, 1)),
+        "student_only": dict(score(student_top1, labels, full_top1),
+                             images_per_second=round(len(images) / timed_seconds(
+                                 lambda: [student(batch) for batch in data], args.repeats), 1)),
+        "thresholds": {},
+    }
+
+    for threshold in args.thresholds:
+        escalated = student_confidence < threshold
+        # Same combination the API serves: student answer, or the full model's when escalated
+        top1 = torch.where(escalated, full_top1, student_top1)
+        seconds = timed_seconds(
+            lambda: [cascade_probabilities(student, net, batch, threshold) for batch in data], args.repeats)
+        report["thresholds"][str(threshold)] = dict(
+            score(top1, labels, full_top1),
+            escalation_rate=round(escalated.float().mean().item(), 4),
+            images_per_second=round(len(images) / seconds, 1),
+            relative_compute=round(seconds / full_seconds, 3),
+        )
+
+    # Cheapest threshold within max_drop of the full model
+    metric = "accuracy" if report["full_model"]["accuracy"] is not None else "agreement_with_full"
+    baseline = report["full_model"][metric]
+    eligible = [(entry["relative_compute"], threshold) for threshold, entry in report["thresholds"].items()
+                if entry[metric] >= baseline - args.max_drop]
+    report["recommended_threshold"] = float(min(eligible)[1]) if eligible else None
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        logger.info(f"Report written to {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,152 @@
+"""
+Parity and speed check of the fast preprocessing engine against torchvision
+backend/tools/check_preprocess.py
+
+For every image (plus a synthetic large photo, like a 10MB phone upload)
+this decodes the raw bytes with both engines and reports:
+
+- exact: the fused lookup-table normalisation vs ToTensor + Normalize on
+  the same full decode; must match to within --tolerance (float32 rounding)
+- draft: the full fast path (JPEG draft-mode decode) vs torchvision; small
+  differences are expected, so only the max/mean difference is reported,
+  plus top-1 agreement when --predict is given
+- time per image for both engines, decode included
+
+Exits with status 1 if the exact comparison exceeds the tolerance.
+
+Usage:
+    python -m backend.tools.check_preprocess --data "test images"
+    python -m backend.tools.check_preprocess --data /data/val --predict --output report.json
+"""
+import argparse
+import io
+import json
+import logging
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import torch
+from PIL import Image
+
+from backend.apps.config import IMAGE_SIZE
+from backend.apps.model.optimize import iter_image_paths
+from backend.apps.model.preprocess import FastTransform
+from backend.apps.model.predictor import transform
+from backend.utils.image_utils import decode_image
+
+# Setup logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("check_preprocess")
+
+def large_photo(source: bytes, size=(4032, 3024)) -> bytes:
+    """Upscale an image into a phone-camera sized JPEG"""
+    buffer = io.BytesIO()
+    decode_image(source).resize(size, Image.BICUBIC).save(buffer, "JPEG", quality=95)
+    return buffer.getvalue()
+
+def torchvision_preprocess(content: bytes) -> torch.Tensor:
+    return transform(decode_image(content))
+
+def median_ms(func, content: bytes, repeats: int) -> float:
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        func(content)
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000
+
+def compare(name: str, content: bytes, fast: FastTransform, exact: FastTransform, repeats: int) -> dict:
+    reference = torchvision_preprocess(content)
+    exact_output = exact(decode_image(content))
+    fast_output = fast(decode_image(content, draft_size=fast.draft_size))
+    draft_diff = (fast_output - reference).abs()
+    return {
+        "image": name,
+        "size": list(Image.open(io.BytesIO(content)).size),
+        "bytes": len(content),
+        "exact_max_abs_diff": (exact_output - reference).abs().max().item(),
+        "draft_max_abs_diff": draft_diff.max().item(),
+        "draft_mean_abs_diff": draft_diff.mean().item(),
+        "torchvision_ms": round(median_ms(torchvision_preprocess, content, repeats), 3),
+        "fast_ms": round(median_ms(lambda c: fast(decode_image(c, draft_size=fast.draft_size)), content, repeats), 3),
+        "_tensors": (reference, fast_output),
+    }
+
+def top1_agreement(rows: list) -> float:
+    """Fraction of images where both engines give the same FP32 prediction"""
+    from backend.apps.model.predictor import build_fp32_model, device
+    model = build_fp32_model()
+    reference = torch.stack([row["_tensors"][0] for row in rows]).to(device)
+    fast = torch.stack([row["_tensors"][1] for row in rows]).to(device)
+    with torch.no_grad():
+        agree = model(reference).argmax(dim=1) == model(fast).argmax(dim=1)
+    return agree.float().mean().item()
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Check fast preprocessing parity and speed against torchvision")
+    parser.add_argument("--data", default="test images", help="Folder of images (default: 'test images')")
+    parser.add_argument("--limit", type=int, help="Use at most this many images")
+    parser.add_argument("--repeats", type=int, default=10, help="Timing repeats per image (default: 10)")
+    parser.add_argument("--tolerance", type=float, default=1e-5,
+                        help="Maximum allowed difference for the exact comparison (default: 1e-5)")
+    parser.add_argument("--predict", action="store_true", help="Also report FP32 top-1 agreement (loads the model)")
+    parser.add_argument("--output", help="Write the report as JSON to this file")
+    return parser.parse_args(argv)
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    fast = FastTransform(IMAGE_SIZE)
+    exact = FastTransform(IMAGE_SIZE, draft=False)
+
+    samples = [(Path(path).name, Path(path).read_bytes()) for path in iter_image_paths(args.data, args.limit)]
+    if not samples:
+        logger.error(f"No images found in {args.data}")
+        return 1
+    samples.append(("synthetic_4032x3024.jpg", large_photo(samples[0][1])))
+
+    rows = []
+    for name, content in samples:
+        try:
+            rows.append(compare(name, content, fast, exact, args.repeats))
+        except Exception as e:
+            logger.warning(f"Skipping {name}: {e}")
+    if not rows:
+        logger.error("No readable images")
+        return 1
+
+    report = {
+        "image_size": list(IMAGE_SIZE),
+        "images": len(rows),
+        "exact_max_abs_diff": max(row["exact_max_abs_diff"] for row in rows),
+        "draft_max_abs_diff": max(row["draft_max_abs_diff"] for row in rows),
+        "torchvision_ms_total": round(sum(row["torchvision_ms"] for row in rows), 3),
+        "fast_ms_total": round(sum(row["fast_ms"] for row in rows), 3),
+    }
+    if args.predict:
+        report["top1_agreement"] = top1_agreement(rows)
+    for row in rows:
+        row.pop("_tensors")
+        logger.info(
+            f"{row['image']:<28} {row['size'][0]}x{row['size'][1]:<5} "
+            f"torchvision {row['torchvision_ms']:8.2f}ms  fast {row['fast_ms']:8.2f}ms  "
+            f"draft diff {row['draft_max_abs_diff']:.4f}"
+        )
+    report["per_image"] = rows
+
+    print(json.dumps({key: value for key, value in report.items() if key != "per_image"}, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    if report["exact_max_abs_diff"] > args.tolerance:
+        logger.error(f"Fast preprocessing differs from torchvision by {report['exact_max_abs_diff']:.2e}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
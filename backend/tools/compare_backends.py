@@ -0,0 +1,156 @@
+"""
+Accuracy and latency comparison of inference backends against FP32
+backend/tools/compare_backends.py
+
+Labels are taken from the parent folder name (ImageFolder layout, e.g.
+data/glass/001.jpg) or, failing that, from a class name contained in the
+file name (e.g. "battery_18.jpg"). Unlabelled images still count towards
+agreement with the FP32 model.
+
+Usage:
+    python -m backend.tools.compare_backends --data "test images"
+    python -m backend.tools.compare_backends --data /data/val --backends eager int8_dynamic int8_static --output report.json
+"""
+import argparse
+import copy
+import io
+import json
+import logging
+import os
+import sys
+import time
+
+import torch
+from PIL import Image
+
+from backend.apps.config import CLASSES, MODEL_PATH, ONNX_MODEL_PATH, QUANT_CALIBRATION_DIR, QUANT_CALIBRATION_IMAGES
+from backend.apps.model.optimize import SUPPORTED_BACKENDS, build_inference_model, iter_image_paths
+from backend.apps.model.onnx_runtime import OnnxModel
+from backend.apps.model.predictor import build_fp32_model, device, transform
+
+# Setup logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("compare_backends")
+
+def label_for(path: str):
+    """Class index from the parent folder or file name, or None if unknown"""
+    parent = os.path.basename(os.path.dirname(path)).lower()
+    if parent in CLASSES:
+        return CLASSES.index(parent)
+    name = os.path.basename(path).lower()
+    matches = [i for i, cls in enumerate(CLASSES) if cls in name]
+    return matches[0] if len(matches) == 1 else None
+
+def load_dataset(folder: str, limit: int = None):
+    """Preprocess images into one tensor plus their labels"""
+    tensors, labels = [], []
+    for path in iter_image_paths(folder, limit):
+        try:
+            with Image.open(path) as image:
+                tensors.append(transform(image.convert("RGB")))
+            labels.append(label_for(path))
+        except Exception as e:
+            logger.warning(f"Skipping {path}: {e}")
+    if not tensors:
+        raise ValueError(f"No readable images found in {folder}")
+    return torch.stack(tensors), labels
+
+def serialized_size_mb(model) -> float:
+    """Size of the model weights when saved, in MB (the .onnx file for the onnx backend)"""
+    if isinstance(model, OnnxModel):
+        return os.path.getsize(model.path) / (1024 * 1024)
+    buffer = io.BytesIO()
+    torch.save(getattr(model, "_orig_mod", model).state_dict(), buffer)
+    return buffer.tell() / (1024 * 1024)
+
+def run_probabilities(model, images: torch.Tensor, batch_size: int) -> torch.Tensor:
+    with torch.no_grad():
+        outputs = [model(images[i:i + batch_size].to(device)) for i in range(0, len(images), batch_size)]
+    return torch.softmax(torch.cat(outputs), dim=1).cpu()
+
+def time_per_image_ms(model, images: torch.Tensor, batch_size: int, repeats: int) -> float:
+    """Median latency per image in ms for forward passes at batch_size"""
+    batch = images[:batch_size]
+    if len(batch) < batch_size:
+        batch = batch.repeat((batch_size + len(batch) - 1) // len(batch), 1, 1, 1)[:batch_size]
+    batch = batch.to(device)
+    timings = []
+    with torch.no_grad():
+        model(batch)  # warm-up
+        for _ in range(repeats):
+            started = time.perf_counter()
+            model(batch)
+            timings.append(time.perf_counter() - started)
+    timings.sort()
+    return timings[len(timings) // 2] / batch_size * 1000
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Compare inference backends against the FP32 model")
+    parser.add_argument("--data", required=True, help="Folder of (optionally labelled) images")
+    parser.add_argument("--backends", nargs="+", default=["eager", "torchscript", "int8_dynamic", "int8_static"],
+                        choices=SUPPORTED_BACKENDS, help="Backends to compare")
+    parser.add_argument("--limit", type=int, help="Maximum number of images to use")
+    parser.add_argument("--batch-size", type=int, default=16, help="Batch size for evaluation and timing")
+    parser.add_argument("--repeats", type=int, default=5, help="Timed forward passes per batch size")
+    parser.add_argument("--calibration-dir", default=QUANT_CALIBRATION_DIR, help="Calibration images for int8_static")
+    parser.add_argument("--onnx-model", default=ONNX_MODEL_PATH, help="Exported model for the onnx backend")
+    parser.add_argument("--output", help="Write the report as JSON to this file")
+    return parser.parse_args(argv)
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    images, labels = load_dataset(args.data, args.limit)
+    labelled = [i for i, label in enumerate(labels) if label is not None]
+    logger.info(f"Loaded {len(images)} images ({len(labelled)} labelled) from {args.data}")
+
+    fp32 = build_fp32_model(MODEL_PATH)
+    reference = run_probabilities(fp32, images, args.batch_size)
+    reference_top1 = reference.argmax(dim=1)
+
+    report = {"model": MODEL_PATH, "device": str(device), "images": len(images),
+              "labelled": len(labelled), "backends": {}}
+    for backend in args.backends:
+        logger.info(f"Evaluating backend '{backend}'")
+        started = time.perf_counter()
+        model = build_inference_model(
+            None if backend == "onnx" else copy.deepcopy(fp32), backend, device,
+            transform=transform,
+            calibration_dir=args.calibration_dir,
+            calibration_images=QUANT_CALIBRATION_IMAGES,
+            onnx_path=args.onnx_model
+        )
+        build_seconds = time.perf_counter() - started
+
+        probabilities = run_probabilities(model, images, args.batch_size)
+        top1 = probabilities.argmax(dim=1)
+        diff = (probabilities - reference).abs()
+        accuracy = None
+        if labelled:
+            correct = sum(int(top1[i]) == labels[i] for i in labelled)
+            accuracy = round(correct / len(labelled), 4)
+
+        report["backends"][backend] = {
+            "accuracy": accuracy,
+            "top1_agreement_with_fp32": round((top1 == reference_top1).float().mean().item(), 4),
+            "mean_abs_prob_diff": round(diff.mean().item(), 6),
+            "max_abs_prob_diff": round(diff.max().item(), 6),
+            "latency_ms_per_image_batch1": round(time_per_image_ms(model, images, 1, args.repeats), 3),
+            f"latency_ms_per_image_batch{args.batch_size}": round(
+                time_per_image_ms(model, images, args.batch_size, args.repeats), 3),
+            # Frozen TorchScript folds weights into prepacked constants; they are the FP32 weights
+            "size_mb": round(serialized_size_mb(fp32 if isinstance(model, torch.jit.ScriptModule) else model), 2),
+            "build_seconds": round(build_seconds, 2),
+        }
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        logger.info(f"Report written to {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,194 @@
+"""
+Distil a small student model from GarbageModel for the early-exit cascade
+backend/tools/distill_student.py
+
+The student learns to reproduce the full model's softened class
+probabilities on augmented images, so unlabelled images are enough.
+Images that carry a label (parent folder or file name, as in
+compare_backends) also add a cross-entropy term weighted by --alpha. A
+held-out split is scored after every epoch: agreement with the teacher,
+accuracy, and the share of images the student would escalate at
+CASCADE_THRESHOLD. The best epoch by agreement is saved.
+
+Serve it with CASCADE_MODEL_PATH=<output>, then pick the threshold with
+backend.tools.cascade_report.
+
+Usage:
+    python -m backend.tools.distill_student --data /data/train --output backend/apps/model/cascade_student.pth
+    python -m backend.tools.distill_student --data /data/train --arch resnet18 --pretrained --epochs 15
+"""
+import argparse
+import logging
+import random
+import sys
+import time
+
+import torch
+import torch.nn.functional as F
+from PIL import Image
+from torch.utils.data import DataLoader, Dataset
+from torchvision import transforms
+
+from backend.apps.config import CASCADE_THRESHOLD, IMAGE_SIZE, MODEL_PATH
+from backend.apps.model.cascade import STUDENT_ARCHITECTURES, StudentModel, save_student
+from backend.apps.model.optimize import iter_image_paths
+from backend.apps.model.predictor import build_model, checkpoint_version, device, model_source, transform
+from backend.apps.model.preprocess import NORMALIZE_MEAN, NORMALIZE_STD
+from backend.tools.compare_backends import label_for
+
+# Setup logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("distill_student")
+
+# Training-time augmentation; the teacher sees the same augmented image
+train_transform = transforms.Compose([
+    transforms.RandomResizedCrop(IMAGE_SIZE, scale=(0.6, 1.0)),
+    transforms.RandomHorizontalFlip(),
+    transforms.ColorJitter(brightness=0.2, contrast=0.2, saturation=0.2),
+    transforms.ToTensor(),
+    transforms.Normalize(mean=list(NORMALIZE_MEAN), std=list(NORMALIZE_STD))
+])
+
+class ImageFileDataset(Dataset):
+    """(tensor, label) pairs for image paths; unlabelled images get label -1"""
+
+    def __init__(self, paths: list, image_transform):
+        self.paths = paths
+        self.transform = image_transform
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __getitem__(self, index):
+        path = self.paths[index]
+        with Image.open(path) as image:
+            tensor = self.transform(image.convert("RGB"))
+        label = label_for(path)
+        return tensor, -1 if label is None else label
+
+def readable(path: str) -> bool:
+    """Whether PIL can identify the file (reads the header only)"""
+    try:
+        with Image.open(path):
+            return True
+    except Exception as e:
+        logger.warning(f"Skipping {path}: {e}")
+        return False
+
+def distillation_loss(student_logits, teacher_logits, labels, temperature: float, alpha: float):
+    """Soft-target KL divergence, plus cross-entropy on the labelled rows"""
+    soft = F.kl_div(
+        F.log_softmax(student_logits / temperature, dim=1),
+        F.softmax(teacher_logits / temperature, dim=1),
+        reduction="batchmean"
+    ) * temperature ** 2
+    if alpha <= 0 or not (labels >= 0).any():
+        return soft
+    hard = F.cross_entropy(student_logits, labels, ignore_index=-1)
+    return (1 - alpha) * soft + alpha * hard
+
+def evaluate(student, teacher, loader, threshold: float) -> dict:
+    """Agreement with the teacher, accuracy and escalation rate on held-out images"""
+    student.eval()
+    agree = correct = labelled = escalated = total = 0
+    with torch.no_grad():
+        for images, labels in loader:
+            images = images.to(device)
+            probabilities = torch.softmax(student(images), dim=1).cpu()
+            confidence, predicted = probabilities.max(dim=1)
+            teacher_predicted = teacher(images).argmax(dim=1).cpu()
+            mask = labels >= 0
+            agree += int((predicted == teacher_predicted).sum())
+            correct += int((predicted[mask] == labels[mask]).sum())
+            labelled += int(mask.sum())
+            escalated += int((confidence < threshold).sum())
+            total += len(labels)
+    return {
+        "agreement": round(agree / total, 4) if total else None,
+        "accuracy": round(correct / labelled, 4) if labelled else None,
+        "escalation_rate": round(escalated / total, 4) if total else None,
+    }
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Distil a cascade student model from the full model")
+    parser.add_argument("--data", required=True, help="Folder of training images (labels optional)")
+    parser.add_argument("--teacher", default=MODEL_PATH, help="Full model checkpoint or ONNX file (default: MODEL_PATH)")
+    parser.add_argument("--output", default="cascade_student.pth", help="Student checkpoint to write")
+    parser.add_argument("--arch", default="mobilenet_v3_large", choices=STUDENT_ARCHITECTURES, help="Student architecture")
+    parser.add_argument("--input-size", type=int,
+                        help="Square size the student resizes its input to (default: the serving size)")
+    parser.add_argument("--pretrained", action="store_true",
+                        help="Start from torchvision ImageNet weights (downloaded on first use; recommended)")
+    parser.add_argument("--epochs", type=int, default=10, help="Training epochs (default: 10)")
+    parser.add_argument("--batch-size", type=int, default=32, help="Training batch size (default: 32)")
+    parser.add_argument("--lr", type=float, default=1e-3, help="AdamW learning rate (default: 0.001)")
+    parser.add_argument("--temperature", type=float, default=4.0, help="Distillation temperature (default: 4)")
+    parser.add_argument("--alpha", type=float, default=0.3,
+                        help="Weight of the hard-label loss for labelled images (default: 0.3)")
+    parser.add_argument("--val-fraction", type=float, default=0.1, help="Images held out for evaluation (default: 0.1)")
+    parser.add_argument("--threshold", type=float, default=CASCADE_THRESHOLD,
+                        help=f"Confidence threshold for the escalation rate (default: {CASCADE_THRESHOLD})")
+    parser.add_argument("--workers", type=int, default=2, help="DataLoader worker processes (default: 2)")
+    parser.add_argument("--limit", type=int, help="Maximum number of images to use")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed (default: 0)")
+    return parser.parse_args(argv)
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    torch.manual_seed(args.seed)
+
+    paths = [path for path in iter_image_paths(args.data, args.limit) if readable(path)]
+    if len(paths) < 2:
+        raise SystemExit(f"Need at least 2 images in {args.data}, found {len(paths)}")
+    random.Random(args.seed).shuffle(paths)
+    val_count = min(max(1, int(len(paths) * args.val_fraction)), len(paths) - 1)
+    val_paths, train_paths = paths[:val_count], paths[val_count:]
+    logger.info(f"{len(train_paths)} training and {len(val_paths)} held-out images from {args.data}")
+
+    teacher_path, teacher_backend = model_source(args.teacher, "eager")
+    teacher, _ = build_model(teacher_path, teacher_backend)
+    teacher_version = checkpoint_version(teacher_path)
+
+    student = StudentModel(args.arch, input_size=args.input_size, pretrained=args.pretrained).to(device)
+    optimizer = torch.optim.AdamW(student.parameters(), lr=args.lr, weight_decay=1e-4)
+    train_loader = DataLoader(ImageFileDataset(train_paths, train_transform), batch_size=args.batch_size,
+                              shuffle=True, num_workers=args.workers, drop_last=len(train_paths) > args.batch_size)
+    val_loader = DataLoader(ImageFileDataset(val_paths, transform), batch_size=args.batch_size,
+                            num_workers=args.workers)
+    scheduler = torch.optim.lr_scheduler.CosineAnnealingLR(optimizer, T_max=args.epochs * max(1, len(train_loader)))
+
+    best = None
+    for epoch in range(1, args.epochs + 1):
+        student.train()
+        started = time.perf_counter()
+        total_loss = 0.0
+        for images, labels in train_loader:
+            images, labels = images.to(device), labels.to(device)
+            with torch.no_grad():
+                teacher_logits = teacher(images).to(device)
+            loss = distillation_loss(student(images), teacher_logits, labels, args.temperature, args.alpha)
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+            scheduler.step()
+            total_loss += loss.item() * len(images)
+
+        scores = evaluate(student, teacher, val_loader, args.threshold)
+        logger.info(
+            f"Epoch {epoch}/{args.epochs}: loss {total_loss / len(train_paths):.4f}, "
+            f"held-out agreement {scores['agreement']}, accuracy {scores['accuracy']}, "
+            f"escalation at {args.threshold} {scores['escalation_rate']} ({time.perf_counter() - started:.1f}s)"
+        )
+        if best is None or scores["agreement"] >= best["agreement"]:
+            best = dict(scores, epoch=epoch)
+            save_student(student, args.output, teacher_version,
+                         images=len(train_paths), temperature=args.temperature, alpha=args.alpha, **best)
+
+    logger.info(f"Student saved to {args.output} (epoch {best['epoch']}, teacher {teacher_version})")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,214 @@
+"""
+Maintain and query the embedding vector index
+backend/tools/embedding_index.py
+
+Build an index while classifying an archive with
+``backend.tools.bulk_classify --index DIR``, then:
+
+info:       size, model version and IVF state of an index
+train:      partition the index (IVF) so searches scan only the partitions
+            nearest to the query; rows added later are still found (they
+            are scanned exhaustively until the next train)
+search:     nearest indexed images for image files
+duplicates: write every near-duplicate pair in the index as JSONL
+bench:      build a synthetic clustered index and report exact and IVF
+            query latency and IVF recall, no model needed
+
+Usage:
+    python -m backend.tools.embedding_index info /data/index
+    python -m backend.tools.embedding_index train /data/index --lists 1024
+    python -m backend.tools.embedding_index search /data/index photo.jpg --k 5
+    python -m backend.tools.embedding_index duplicates /data/index --threshold 0.97 --output dups.jsonl
+    python -m backend.tools.embedding_index bench --vectors 200000 --probes 4 8 16
+"""
+import argparse
+import json
+import logging
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from backend.apps.config import EMBEDDING_DUPLICATE_THRESHOLD, EMBEDDING_SEARCH_K, EMBEDDING_IVF_PROBES
+from backend.apps.vector_index import VectorIndex
+
+# Setup logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("embedding_index")
+
+def open_index(path: str) -> VectorIndex:
+    index = VectorIndex(path)
+    if index.dim is None:
+        raise SystemExit(f"No index at {path}. Build one with backend.tools.bulk_classify --index")
+    return index
+
+def run_info(args) -> int:
+    print(json.dumps(open_index(args.index).stats(), indent=2))
+    return 0
+
+def run_train(args) -> int:
+    index = open_index(args.index)
+    ivf = index.train_ivf(lists=args.lists, sample_size=args.sample, iterations=args.iterations, seed=args.seed)
+    print(json.dumps(ivf, indent=2))
+    return 0
+
+def run_search(args) -> int:
+    from backend.apps.model import predictor
+
+    index = open_index(args.index)
+    model = predictor.get_loaded()
+    if index.model_version and model.version != index.model_version:
+        raise SystemExit(
+            f"Index holds embeddings of model version {index.model_version}, "
+            f"but the configured model is {model.version}"
+        )
+
+    for image_path in args.images:
+        tensor = predictor.preprocess_bytes(Path(image_path).read_bytes()).unsqueeze(0)
+        prediction = predictor.predict_and_embed(tensor, model)
+        started = time.perf_counter()
+        neighbours = index.search(prediction[1][0], args.k, args.probes, args.exact)[0]
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        entries = index.metadata([row for row, _ in neighbours])
+        print(json.dumps({
+            "query": image_path,
+            "class": prediction[0][0]["class"],
+            "search_ms": round(elapsed_ms, 2),
+            "neighbors": [{**entry, "id": row, "score": round(score, 4)}
+                          for (row, score), entry in zip(neighbours, entries)],
+        }, indent=2))
+    return 0
+
+def run_duplicates(args) -> int:
+    index = open_index(args.index)
+    output = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    started = time.perf_counter()
+    pairs = 0
+    try:
+        for row, other, score in index.find_duplicates(args.threshold, args.k, args.probes, args.exact):
+            first, second = index.metadata([row, other])
+            output.write(json.dumps({
+                "a": first.get("path", row), "b": second.get("path", other), "score": round(score, 4)
+            }) + "\n")
+            pairs += 1
+    finally:
+        if args.output:
+            output.close()
+    logger.info(f"{pairs} near-duplicate pairs (>= {args.threshold}) among {index.count} images "
+                f"in {time.perf_counter() - started:.1f}s")
+    return 0
+
+def run_bench(args) -> int:
+    rng = np.random.default_rng(args.seed)
+    directory = Path(args.dir) if args.dir else Path(tempfile.mkdtemp(prefix="vector-index-bench-"))
+    try:
+        # Clustered data, closer to real embeddings than uniform noise
+        centers = rng.standard_normal((args.clusters, args.dim)).astype(np.float32)
+        index = VectorIndex.create(directory / "index", args.dim, "bench")
+        started = time.perf_counter()
+        for low in range(0, args.vectors, 50000):
+            size = min(50000, args.vectors - low)
+            vectors = centers[rng.integers(0, args.clusters, size)]
+            vectors += args.spread * rng.standard_normal((size, args.dim)).astype(np.float32)
+            index.add(vectors, [{"row": row} for row in range(low, low + size)], "bench")
+        build_seconds = time.perf_counter() - started
+
+        queries = index.vectors(0, args.queries) + 0.3 * args.spread * rng.standard_normal(
+            (args.queries, args.dim)).astype(np.float32)
+        index.search(queries[:1], args.k, exact=True)
+
+        def timed(**kwargs):
+            started = time.perf_counter()
+            results = [index.search(query, args.k, **kwargs)[0] for query in queries]
+            return results, (time.perf_counter() - started) / len(queries) * 1000
+
+        truth, exact_ms = timed(exact=True)
+        report = {
+            "vectors": args.vectors,
+            "dim": args.dim,
+            "vectors_mb": index.stats()["vectors_mb"],
+            "build_seconds": round(build_seconds, 2),
+            "exact_ms_per_query": round(exact_ms, 3),
+        }
+
+        started = time.perf_counter()
+        report["ivf"] = index.train_ivf(lists=args.lists, seed=args.seed)
+        report["ivf"]["train_seconds"] = round(time.perf_counter() - started, 2)
+        report["ivf_probes"] = {}
+        for probes in args.probes:
+            results, ivf_ms = timed(probes=probes)
+            recall = np.mean([
+                len({row for row, _ in found} & {row for row, _ in expected}) / max(len(expected), 1)
+                for found, expected in zip(results, truth)
+            ])
+            report["ivf_probes"][str(probes)] = {"ms_per_query": round(ivf_ms, 3), "recall": round(float(recall), 3)}
+        print(json.dumps(report, indent=2))
+    finally:
+        if not args.dir:
+            shutil.rmtree(directory, ignore_errors=True)
+    return 0
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain and query the embedding vector index")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    info = commands.add_parser("info", help="Show index statistics")
+    info.add_argument("index", help="Index directory")
+
+    train = commands.add_parser("train", help="Train the IVF partition for approximate search")
+    train.add_argument("index", help="Index directory")
+    train.add_argument("--lists", type=int, help="Partitions (default: sqrt of the vector count)")
+    train.add_argument("--sample", type=int, help="Vectors used to fit the centroids (default: 64 per partition)")
+    train.add_argument("--iterations", type=int, default=10, help="k-means iterations (default: 10)")
+    train.add_argument("--seed", type=int, default=0, help="Random seed (default: 0)")
+
+    search = commands.add_parser("search", help="Find the indexed images most similar to image files")
+    search.add_argument("index", help="Index directory")
+    search.add_argument("images", nargs="+", help="Query images")
+
+    duplicates = commands.add_parser("duplicates", help="List near-duplicate pairs in the index")
+    duplicates.add_argument("index", help="Index directory")
+    duplicates.add_argument("--threshold", type=float, default=EMBEDDING_DUPLICATE_THRESHOLD,
+                            help=f"Minimum cosine similarity (default: {EMBEDDING_DUPLICATE_THRESHOLD})")
+    duplicates.add_argument("--output", help="JSONL file for the pairs (default: stdout)")
+
+    for command in (search, duplicates):
+        command.add_argument("--k", type=int, default=EMBEDDING_SEARCH_K,
+                             help=f"Neighbours per image (default: {EMBEDDING_SEARCH_K})")
+        command.add_argument("--probes", type=int, help=f"IVF partitions to scan (default: {EMBEDDING_IVF_PROBES})")
+        command.add_argument("--exact", action="store_true", help="Scan every vector, ignoring the IVF partition")
+
+    bench = commands.add_parser("bench", help="Benchmark search on a synthetic index")
+    bench.add_argument("--vectors", type=int, default=200000, help="Vectors to index (default: 200000)")
+    bench.add_argument("--dim", type=int, default=2048, help="Vector size (default: 2048)")
+    bench.add_argument("--clusters", type=int, default=1000, help="Synthetic clusters (default: 1000)")
+    bench.add_argument("--spread", type=float, default=0.7, help="Noise around each cluster centre (default: 0.7)")
+    bench.add_argument("--queries", type=int, default=50, help="Timed queries (default: 50)")
+    bench.add_argument("--k", type=int, default=EMBEDDING_SEARCH_K, help="Neighbours per query")
+    bench.add_argument("--lists", type=int, help="IVF partitions (default: sqrt of --vectors)")
+    bench.add_argument("--probes", type=int, nargs="+", default=[4, 8, 16, 32],
+                       help="IVF probe counts to measure (default: 4 8 16 32)")
+    bench.add_argument("--dir", help="Keep the synthetic index in this directory")
+    bench.add_argument("--seed", type=int, default=0, help="Random seed (default: 0)")
+
+    return parser.parse_args(argv)
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    commands = {
+        "info": run_info,
+        "train": run_train,
+        "search": run_search,
+        "duplicates": run_duplicates,
+        "bench": run_bench,
+    }
+    return commands[args.command](args)
+
+if __name__ == "__main__":
+    sys.exit(main())
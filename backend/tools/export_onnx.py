@@ -0,0 +1,90 @@
+"""
+Export the GarbageModel checkpoint to ONNX and verify parity with PyTorch
+backend/tools/export_onnx.py
+
+The exported graph has a dynamic batch axis, so the ONNX Runtime backend
+(INFERENCE_BACKEND=onnx) can serve batched requests.
+
+Usage:
+    python -m backend.tools.export_onnx
+    python -m backend.tools.export_onnx --checkpoint path/to/model.pth --output model.onnx --verify-dir "test images"
+"""
+import argparse
+import logging
+import sys
+
+import numpy as np
+import torch
+from PIL import Image
+
+from backend.apps.config import MODEL_PATH, ONNX_MODEL_PATH
+from backend.apps.model.onnx_runtime import INPUT_NAME, OUTPUT_NAME, OnnxModel
+from backend.apps.model.optimize import example_input, iter_image_paths
+from backend.apps.model.predictor import build_fp32_model, transform
+
+# Setup logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("export_onnx")
+
+def export(checkpoint: str, output: str, opset: int) -> torch.nn.Module:
+    """Export the checkpoint to ONNX and return the PyTorch model used"""
+    model = build_fp32_model(checkpoint).cpu()
+    logger.info(f"Exporting {checkpoint} -> {output} (opset {opset})")
+    torch.onnx.export(
+        model,
+        (example_input(2),),
+        output,
+        input_names=[INPUT_NAME],
+        output_names=[OUTPUT_NAME],
+        dynamic_shapes={"x": {0: torch.export.Dim("batch", min=1, max=1024)}},
+        opset_version=opset,
+        external_data=False,
+    )
+    return model
+
+def verify(model: torch.nn.Module, output: str, verify_dir: str = None, atol: float = 1e-3) -> bool:
+    """Compare PyTorch and ONNX Runtime outputs on random inputs and sample images"""
+    batches = [example_input(1), example_input(5)]
+    if verify_dir:
+        tensors = []
+        for path in iter_image_paths(verify_dir, limit=32):
+            with Image.open(path) as image:
+                tensors.append(transform(image.convert("RGB")))
+        if tensors:
+            batches.append(torch.stack(tensors))
+
+    session = OnnxModel(output)
+    ok = True
+    for batch in batches:
+        with torch.no_grad():
+            expected = model(batch).numpy()
+        actual = session.run(batch.numpy())
+        max_logit_diff = float(np.abs(expected - actual).max())
+        same_top1 = bool((expected.argmax(axis=1) == actual.argmax(axis=1)).all())
+        logger.info(f"batch={len(batch)}: max |logit diff| = {max_logit_diff:.2e}, top-1 identical = {same_top1}")
+        ok = ok and same_top1 and max_logit_diff <= atol
+    return ok
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Export the model to ONNX with a dynamic batch axis")
+    parser.add_argument("--checkpoint", default=MODEL_PATH, help="PyTorch checkpoint (default: MODEL_PATH)")
+    parser.add_argument("--output", default=ONNX_MODEL_PATH, help="ONNX file to write (default: ONNX_MODEL_PATH)")
+    parser.add_argument("--opset", type=int, default=18, help="ONNX opset version")
+    parser.add_argument("--verify-dir", help="Also check parity on images from this folder")
+    parser.add_argument("--atol", type=float, default=1e-3, help="Maximum allowed logit difference")
+    return parser.parse_args(argv)
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    model = export(args.checkpoint, args.output, args.opset)
+    if not verify(model, args.output, args.verify_dir, args.atol):
+        logger.error("ONNX Runtime outputs do not match PyTorch within tolerance")
+        return 1
+    logger.info(f"Parity verified. Serve it with INFERENCE_BACKEND=onnx (ONNX_MODEL_PATH={args.output})")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
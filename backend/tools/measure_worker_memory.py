@@ -0,0 +1,93 @@
+"""
+Per-worker memory with and without memory-mapped model weights
+backend/tools/measure_worker_memory.py
+
+Starts N worker processes the way `uvicorn --workers N` does (spawned,
+each importing the predictor and serving one prediction), keeps them all
+alive together and reports each worker's RSS, PSS and private memory, once
+with MODEL_MMAP=0 (every worker copies the weights) and once with
+MODEL_MMAP=1 (workers share one page-cache copy). CHANNELS_LAST is the
+same in both runs (off unless set), so only the weight sharing differs.
+
+Usage:
+    python -m backend.tools.measure_worker_memory --workers 4
+"""
+import argparse
+import json
+import logging
+import multiprocessing as mp
+import os
+import sys
+
+# Setup logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("measure_worker_memory")
+
+def worker(results, release, image_path):
+    """Load the model like a serving worker, predict once, report memory, then wait"""
+    logging.getLogger().setLevel(logging.WARNING)
+    from PIL import Image
+    from backend.apps.model import predictor
+    from backend.utils.memory_utils import memory_usage
+
+    if image_path:
+        with Image.open(image_path) as image:
+            predictor.predict_image(image.convert("RGB"))
+    results.put(memory_usage())
+    release.wait()
+
+def measure(workers: int, mmap_enabled: bool, image_path: str) -> list:
+    """Start the workers with MODEL_MMAP set and collect their memory usage"""
+    os.environ["MODEL_MMAP"] = "1" if mmap_enabled else "0"
+    # Its default follows MODEL_MMAP; pin it so both runs convert the same way
+    os.environ.setdefault("CHANNELS_LAST", "0")
+    context = mp.get_context("spawn")
+    results, release = context.Queue(), context.Event()
+    processes = [context.Process(target=worker, args=(results, release, image_path)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    try:
+        usage = [results.get(timeout=600) for _ in processes]
+    finally:
+        release.set()
+        for process in processes:
+            process.join()
+    return usage
+
+def summarise(usage: list) -> dict:
+    keys = ("rss_mb", "pss_mb", "private_mb")
+    summary = {f"avg_{key}": round(sum(u.get(key, 0) for u in usage) / len(usage), 1) for key in keys}
+    summary["total_pss_mb"] = round(sum(u.get("pss_mb", 0) for u in usage), 1)
+    return summary
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Measure per-worker memory with and without mmap-shared weights")
+    parser.add_argument("--workers", type=int, default=4, help="Number of worker processes (default: 4)")
+    parser.add_argument("--image", default=os.path.join("test images", "trash_129.jpg"),
+                        help="Image to predict in each worker so pages are actually touched")
+    parser.add_argument("--output", help="Write the report as JSON to this file")
+    return parser.parse_args(argv)
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    image_path = args.image if os.path.exists(args.image) else None
+    report = {"workers": args.workers}
+    for label, enabled in (("copied_weights", False), ("mmap_shared_weights", True)):
+        logger.info(f"Measuring {args.workers} workers with MODEL_MMAP={int(enabled)}")
+        usage = measure(args.workers, enabled, image_path)
+        if not usage[0]:
+            logger.error("Per-process memory breakdown needs Linux /proc/<pid>/smaps_rollup")
+            return 1
+        report[label] = {"summary": summarise(usage), "per_worker": usage}
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,158 @@
+"""
+Image processing utilities
+backend/utils/image_utils.py
+"""
+from PIL import Image, UnidentifiedImageError
+import io
+import logging
+import tarfile
+import zipfile
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+SUPPORTED_MODES = ('RGB', 'RGBA', 'L')
+
+class ImageDecodeError(ValueError):
+    """Raised when uploaded bytes cannot be decoded into a usable image"""
+
+def decode_image(content: bytes, draft_size: tuple = None, return_size: bool = False):
+    """
+    Decode uploaded bytes into an RGB PIL image
+
+    Args:
+        content: Raw image file bytes
+        draft_size: Optional (width, height) the caller will downscale to.
+            JPEGs are then decoded at the smallest 1/2, 1/4 or 1/8 scale
+            that is still at least this size, which is much faster than a
+            full-resolution decode for large photos.
+        return_size: Also return the (width, height) stored in the file,
+            which draft decoding would otherwise hide
+
+    Returns:
+        Image.Image: Decoded RGB image, or (image, size) with return_size
+
+    Raises:
+        ImageDecodeError: If the bytes are not a supported, readable image
+    """
+    try:
+        image = Image.open(io.BytesIO(content))
+    except UnidentifiedImageError:
+        raise ImageDecodeError("Cannot identify image file. File may be corrupted.")
+    except Exception as e:
+        logger.error(f"Error opening image: {e}")
+        raise ImageDecodeError("Invalid or corrupted image file")
+
+    # Validate image can be converted to RGB
+    if image.mode not in SUPPORTED_MODES:
+        raise ImageDecodeError(f"Unsupported image mode: {image.mode}")
+
+    size = image.size
+    if draft_size and image.format == "JPEG":
+        try:
+            image.draft("RGB", draft_size)
+        except Exception as e:
+            logger.warning(f"JPEG draft decoding unavailable: {e}")
+
+    try:
+        image = image.convert("RGB")
+    except Exception as e:
+        logger.error(f"Error processing image: {e}")
+        raise ImageDecodeError("Invalid or corrupted image file")
+    return (image, size) if return_size else image
+
+class ArchiveError(ValueError):
+    """Raised when an uploaded archive cannot be read"""
+
+class ArchiveTooLargeError(ArchiveError):
+    """Raised when the extracted files of an archive exceed the total size limit"""
+
+def _read_bounded(fileobj, max_bytes: int):
+    """Read at most max_bytes from a member; None if it holds more"""
+    data = fileobj.read(max_bytes + 1)
+    return data if len(data) <= max_bytes else None
+
+def read_archive(content, max_members: int, max_member_bytes: int, max_total_bytes: int = None) -> list:
+    """
+    Extract regular files from a zip or tar (optionally gzipped) archive
+
+    Directories and hidden/metadata entries (``.*``, ``__MACOSX``) are
+    skipped. Members larger than ``max_member_bytes`` are not kept; their
+    content is returned as None so the caller can report them individually.
+    Sizes declared in the archive are not trusted: at most
+    ``max_member_bytes + 1`` bytes are read from any member, and extraction
+    stops as soon as the files read add up to more than ``max_total_bytes``,
+    so a small archive cannot expand into gigabytes of memory.
+
+    Args:
+        content: Raw archive bytes, or a seekable binary file (e.g. the
+            spooled upload) to extract from without reading it into memory
+        max_members: Maximum number of files to extract
+        max_member_bytes: Maximum uncompressed size of a single file
+        max_total_bytes: Maximum uncompressed size of all extracted files
+            together (None = no limit)
+
+    Returns:
+        list: (name, bytes or None) tuples in archive order
+
+    Raises:
+        ArchiveTooLargeError: If the extracted files exceed max_total_bytes
+        ArchiveError: If the archive is unreadable or has too many files
+    """
+    def wanted(name: str) -> bool:
+        parts = name.replace('\\', '/').split('/')
+        return not any(part.startswith('.') or part == '__MACOSX' for part in parts)
+
+    def source():
+        if isinstance(content, (bytes, bytearray)):
+            return io.BytesIO(content)
+        content.seek(0)
+        return content
+
+    members = []
+    total = 0
+
+    def add(name: str, data):
+        nonlocal total
+        if data is not None:
+            total += len(data)
+            if max_total_bytes is not None and total > max_total_bytes:
+                raise ArchiveTooLargeError(
+                    f"Archive expands to more than {max_total_bytes // (1024 * 1024)}MB of files"
+                )
+        members.append((name, data))
+
+    try:
+        if zipfile.is_zipfile(source()):
+            with zipfile.ZipFile(source()) as archive:
+                for info in archive.infolist():
+                    if info.is_dir() or not wanted(info.filename):
+                        continue
+                    if len(members) >= max_members:
+                        raise ArchiveError(f"Archive contains more than {max_members} files")
+                    data = None
+                    if info.file_size <= max_member_bytes:
+                        with archive.open(info) as member:
+                            data = _read_bounded(member, max_member_bytes)
+                    add(info.filename, data)
+        else:
+            with tarfile.open(fileobj=source(), mode="r:*") as archive:
+                for info in archive:
+                    if not info.isfile() or not wanted(info.name):
+                        continue
+                    if len(members) >= max_members:
+                        raise ArchiveError(f"Archive contains more than {max_members} files")
+                    data = None
+                    if info.size <= max_member_bytes:
+                        data = _read_bounded(archive.extractfile(info), max_member_bytes)
+                    add(info.name, data)
+    except ArchiveError:
+        raise
+    except (zipfile.BadZipFile, tarfile.TarError) as e:
+        logger.error(f"Error reading archive: {e}")
+        raise ArchiveError("Cannot read archive. Supported formats: zip, tar, tar.gz")
+    except Exception as e:
+        logger.error(f"Unexpected error reading archive: {e}")
+        raise ArchiveError("Invalid or corrupted archive")
+
+    return members
@@ -0,0 +1,47 @@
+"""
+Process memory measurement utilities
+backend/utils/memory_utils.py
+"""
+import logging
+import os
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+SMAPS_ROLLUP = "/proc/{pid}/smaps_rollup"
+
+def memory_usage(pid: int = None) -> dict:
+    """
+    Memory usage of a process in MB
+
+    On Linux this reads /proc/<pid>/smaps_rollup, which separates pages
+    shared with other processes (e.g. a memory-mapped checkpoint used by
+    several workers) from private ones:
+
+    - rss: resident set size, counting shared pages in full
+    - pss: proportional set size, shared pages divided among their users
+    - shared: resident pages also mapped by other processes
+    - private: pages only this process holds (what another worker really costs)
+
+    Returns an empty dict where /proc is not available.
+    """
+    path = SMAPS_ROLLUP.format(pid=pid or os.getpid())
+    fields = {}
+    try:
+        with open(path) as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 3 and parts[-1] == "kB":
+                    fields[parts[0].rstrip(":")] = int(parts[1])
+    except OSError:
+        return {}
+
+    def mb(*keys):
+        return round(sum(fields.get(key, 0) for key in keys) / 1024, 1)
+
+    return {
+        "rss_mb": mb("Rss"),
+        "pss_mb": mb("Pss"),
+        "shared_mb": mb("Shared_Clean", "Shared_Dirty"),
+        "private_mb": mb("Private_Clean", "Private_Dirty"),
+    }
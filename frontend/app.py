@@ -4,9 +4,12 @@ Flask frontend application with error handling
 from flask import Flask, render_template, request, jsonify, flash, redirect, url_for
 import requests
 import logging
+from werkzeug.exceptions import RequestEntityTooLarge
 from werkzeug.utils import secure_filename
 import os
 
+from backend_client import BackendPool, MultipartFileBody
+
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -15,14 +18,47 @@ app = Flask(__name__)
 app.secret_key = 'your-secret-key-change-in-production'  # Change this!
 
 # Configuration
-API_URL = "http://127.0.0.1:8000/predict"
+# Comma-separated API base URLs; requests are balanced across them
+API_URLS = [url.strip() for url in os.getenv("API_URLS", "http://127.0.0.1:8000").split(",") if url.strip()]
+API_BALANCING = os.getenv("API_BALANCING", "least_loaded")  # or "round_robin"
+API_POOL_SIZE = int(os.getenv("API_POOL_SIZE", "20"))  # keep-alive connections per backend
+API_RETRIES = int(os.getenv("API_RETRIES", "2"))
+API_RETRY_BACKOFF = float(os.getenv("API_RETRY_BACKOFF", "0.2"))  # seconds, doubled per retry
+API_CONNECT_TIMEOUT = float(os.getenv("API_CONNECT_TIMEOUT", "2"))
+API_READ_TIMEOUT = float(os.getenv("API_READ_TIMEOUT", "30"))
+HEALTH_CACHE_SECONDS = float(os.getenv("HEALTH_CACHE_SECONDS", "5"))
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'bmp'}
 MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
 
+# Werkzeug rejects larger request bodies with 413 before parsing them
+# (headroom for the multipart framing around the file)
+app.config["MAX_CONTENT_LENGTH"] = MAX_FILE_SIZE + 64 * 1024
+
+# Leading bytes of the allowed image formats
+IMAGE_SIGNATURES = (b"\xff\xd8\xff", b"\x89PNG\r\n\x1a\n", b"GIF87a", b"GIF89a", b"BM")
+
 def allowed_file(filename):
     """Check if file extension is allowed"""
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def looks_like_image(stream):
+    """Check the first bytes of an uploaded file against the allowed image formats"""
+    head = stream.read(16)
+    stream.seek(0)
+    return head.startswith(IMAGE_SIGNATURES)
+
+# Shared by all request threads: keep-alive connections, balancing, retries
+backend_pool = BackendPool(
+    API_URLS,
+    strategy=API_BALANCING,
+    pool_size=API_POOL_SIZE,
+    retries=API_RETRIES,
+    backoff=API_RETRY_BACKOFF,
+    connect_timeout=API_CONNECT_TIMEOUT,
+    read_timeout=API_READ_TIMEOUT,
+    health_ttl=HEALTH_CACHE_SECONDS
+)
+
 @app.route("/", methods=["GET", "POST"])
 def index():
     """Home page with image upload"""
@@ -61,15 +97,16 @@ def index():
                 error = "Uploaded file is empty."
                 return render_template("index.html", result=result, error=error)
             
-            # Make API request
+            if not looks_like_image(file.stream):
+                error = "The file is not a valid image."
+                return render_template("index.html", result=result, error=error)
+            
+            # Make API request, streaming the file instead of loading it into memory
             try:
                 logger.info(f"Sending file to API: {file.filename}")
                 
-                response = requests.post(
-                    API_URL, 
-                    files={"file": (secure_filename(file.filename), file, file.content_type)},
-                    timeout=30  # 30 second timeout
-                )
+                body = MultipartFileBody("file", secure_filename(file.filename), file.stream, file_size, file.content_type)
+                response = backend_pool.post("/predict", body)
                 
                 # Check response status
                 if response.status_code == 200:
@@ -80,6 +117,8 @@ def index():
                     error = f"Validation error: {error_detail}"
                 elif response.status_code == 413:
                     error = "File too large for processing."
+                elif response.status_code == 503 and 'Retry-After' in response.headers:
+                    error = "Server is busy. Please try again in a moment."
                 elif response.status_code == 503:
                     error = "Model service unavailable. Please contact administrator."
                 else:
@@ -89,7 +128,7 @@ def index():
                 error = "Request timeout. The server is taking too long to respond."
                 logger.error("API request timeout")
             except requests.exceptions.ConnectionError:
-                error = "Cannot connect to API server. Please ensure backend is running on port 8000."
+                error = "Cannot connect to API server. Please ensure the backend is running."
                 logger.error("API connection error")
             except requests.exceptions.RequestException as e:
                 error = f"Network error: {str(e)}"
@@ -98,6 +137,8 @@ def index():
                 error = "Invalid response from server."
                 logger.error(f"JSON decode error: {e}")
                 
+        except RequestEntityTooLarge:
+            error = "File too large. Maximum size is 10MB."
         except Exception as e:
             error = f"An unexpected error occurred: {str(e)}"
             logger.error(f"Unexpected error: {e}")
@@ -111,17 +152,12 @@ def live():
 
 @app.route("/health")
 def health():
-    """Health check endpoint"""
-    try:
-        # Check if API is reachable
-        response = requests.get("http://127.0.0.1:8000/health", timeout=20)
-        api_status = "online" if response.status_code == 200 else "offline"
-    except:
-        api_status = "offline"
-    
+    """Health check endpoint (backend readiness is cached for HEALTH_CACHE_SECONDS)"""
+    backend_health = backend_pool.health()
     return jsonify({
         "frontend": "online",
-        "backend": api_status
+        "backend": "online" if backend_health["online"] else "offline",
+        "backends": backend_health["backends"]
     })
 
 @app.errorhandler(404)
@@ -140,7 +176,7 @@ if __name__ == "__main__":
     logger.info("🌐 Starting Flask Frontend Server")
     logger.info("=" * 60)
     logger.info("Frontend URL: http://localhost:5000")
-    logger.info("Make sure backend is running on http://localhost:8000")
+    logger.info(f"API backends: {', '.join(API_URLS)} ({API_BALANCING})")
     logger.info("=" * 60)
     
     app.run(host="0.0.0.0", port=5000, debug=True)
@@ -0,0 +1,266 @@
+"""
+Pooled, load-balanced HTTP client for the classification API backends
+"""
+import io
+import itertools
+import logging
+import threading
+import time
+import uuid
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+class NoBackendAvailable(requests.exceptions.ConnectionError):
+    """Raised when every backend failed to accept the request"""
+
+class MultipartFileBody:
+    """
+    multipart/form-data body holding one file, read from the file in chunks
+
+    requests builds ``files=`` bodies in memory. Passed as ``data`` instead,
+    this object is sent in blocks with an exact Content-Length, so the
+    upload is streamed from Werkzeug's spooled file to the API and the API
+    can reject an oversized body from its headers. rewind() resets it for
+    a retry.
+    """
+
+    def __init__(self, field, filename, stream, size, content_type=None):
+        self.boundary = uuid.uuid4().hex
+        self._head = (
+            f'--{self.boundary}\r\n'
+            f'Content-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+            f'Content-Type: {content_type or "application/octet-stream"}\r\n\r\n'
+        ).encode()
+        self._tail = f"\r\n--{self.boundary}--\r\n".encode()
+        self._stream = stream
+        self._start = stream.tell()
+        self._length = len(self._head) + size + len(self._tail)
+        self.rewind()
+
+    @property
+    def content_type(self):
+        return f"multipart/form-data; boundary={self.boundary}"
+
+    def rewind(self):
+        self._stream.seek(self._start)
+        self._parts = [io.BytesIO(self._head), self._stream, io.BytesIO(self._tail)]
+
+    def __len__(self):
+        return self._length
+
+    def read(self, size=-1):
+        chunks = []
+        while self._parts and size != 0:
+            chunk = self._parts[0].read(size)
+            if not chunk:
+                self._parts.pop(0)
+                continue
+            chunks.append(chunk)
+            if size > 0:
+                size -= len(chunk)
+        return b"".join(chunks)
+
+class Backend:
+    """One API base URL with its load and health state"""
+
+    def __init__(self, url):
+        self.url = url
+        self.in_flight = 0
+        self.failures = 0
+        self.ejected_until = 0.0
+        self.ready = None
+        self.last_error = None
+
+    @property
+    def ejected(self):
+        return time.monotonic() < self.ejected_until
+
+    def describe(self):
+        return {
+            "url": self.url,
+            "ready": self.ready,
+            "ejected": self.ejected,
+            "in_flight": self.in_flight,
+            "consecutive_failures": self.failures,
+            "last_error": self.last_error,
+        }
+
+class BackendPool:
+    """
+    Shared keep-alive session over one or more API backends
+
+    Each request goes to one backend, chosen round-robin or by fewest
+    requests in flight from this process ("least_loaded"). A backend that
+    refuses connections ``eject_after`` times in a row, or fails a health
+    check, is skipped for ``eject_seconds`` and then tried again. If
+    every backend is ejected, all of them are tried rather than failing
+    outright.
+
+    Connection errors are retried up to ``retries`` times: on the next
+    backend straight away, with exponential backoff once all have failed. A 503 answer (overloaded or still
+    loading) is retried without waiting, on a backend that was not tried
+    yet. Read timeouts are not retried, because the backend may still be
+    working on the request.
+    """
+
+    def __init__(self, urls, strategy="least_loaded", pool_size=20, retries=2, backoff=0.2,
+                 connect_timeout=2.0, read_timeout=30.0, health_ttl=5.0,
+                 eject_after=3, eject_seconds=10.0):
+        if not urls:
+            raise ValueError("At least one backend URL is required")
+        if strategy not in ("least_loaded", "round_robin"):
+            raise ValueError(f"Unknown balancing strategy '{strategy}'. Use least_loaded or round_robin")
+        self.backends = [Backend(url.rstrip("/")) for url in urls]
+        self.strategy = strategy
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = (connect_timeout, read_timeout)
+        self.health_ttl = health_ttl
+        self.eject_after = eject_after
+        self.eject_seconds = eject_seconds
+
+        # One connection pool per backend host, pool_size connections each;
+        # block=True makes extra threads wait for a connection instead of
+        # opening (and then discarding) more
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=len(self.backends), pool_maxsize=pool_size, pool_block=True)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._lock = threading.Lock()
+        self._turn = itertools.count()
+        self._health = None
+        self._health_checked = 0.0
+        self._health_lock = threading.Lock()
+
+    # -- selection -------------------------------------------------------
+
+    def _choose(self, exclude):
+        """Pick a backend not in exclude (and not ejected, if any remain)"""
+        with self._lock:
+            candidates = [b for b in self.backends if b not in exclude] or list(self.backends)
+            available = [b for b in candidates if not b.ejected] or candidates
+            turn = next(self._turn)
+            if self.strategy == "round_robin":
+                backend = available[turn % len(available)]
+            else:
+                # Rotate before taking the minimum so ties are spread out
+                offset = turn % len(available)
+                rotated = available[offset:] + available[:offset]
+                backend = min(rotated, key=lambda b: b.in_flight)
+            backend.in_flight += 1
+            return backend
+
+    def _release(self, backend, error=None):
+        with self._lock:
+            backend.in_flight -= 1
+            if error is None:
+                backend.failures = 0
+                return
+            backend.failures += 1
+            backend.last_error = error
+            if backend.failures >= self.eject_after and not backend.ejected:
+                backend.ejected_until = time.monotonic() + self.eject_seconds
+                logger.warning(f"Ejecting backend {backend.url} for {self.eject_seconds}s: {error}")
+
+    # -- requests --------------------------------------------------------
+
+    def request(self, method, path, body=None, **kwargs):
+        """
+        Send a request to a backend, retrying connection errors on others
+
+        Args:
+            method: HTTP method
+            path: Path on the API, e.g. "/predict"
+            body: Optional MultipartFileBody (rewound before each attempt)
+            **kwargs: Passed to requests (headers, params, ...)
+
+        Returns:
+            requests.Response: The first response that is not a retried 503
+
+        Raises:
+            NoBackendAvailable: If every attempt failed to connect
+            requests.exceptions.Timeout: If a backend did not answer in time
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        if body is not None:
+            kwargs["data"] = body
+            kwargs.setdefault("headers", {})["Content-Type"] = body.content_type
+
+        tried = []
+        last_error = None
+        for attempt in range(self.retries + 1):
+            backend = self._choose(tried)
+            tried.append(backend)
+            if body is not None:
+                body.rewind()
+            try:
+                response = self.session.request(method, backend.url + path, **kwargs)
+            except requests.exceptions.ConnectionError as e:
+                self._release(backend, str(e))
+                last_error = e
+                logger.warning(f"Backend {backend.url} unreachable (attempt {attempt + 1}): {e}")
+                # Back off only once every backend has failed; another
+                # backend is tried straight away
+                if attempt < self.retries and len(tried) >= len(self.backends):
+                    time.sleep(self.backoff * (2 ** attempt))
+                continue
+            except Exception:
+                self._release(backend)
+                raise
+            self._release(backend)
+
+            untried = [b for b in self.backends if b not in tried and not b.ejected]
+            if response.status_code == 503 and untried and attempt < self.retries:
+                logger.info(f"Backend {backend.url} answered 503, trying another")
+                response.close()
+                continue
+            return response
+        raise NoBackendAvailable(f"No backend reachable after {len(tried)} attempts: {last_error}")
+
+    def post(self, path, body=None, **kwargs):
+        return self.request("POST", path, body, **kwargs)
+
+    # -- health ----------------------------------------------------------
+
+    def health(self):
+        """
+        Readiness of every backend, cached for health_ttl seconds
+
+        While one thread refreshes the result, others get the previous one
+        instead of waiting. Backends that are down or not ready are
+        ejected, so requests avoid them until they recover.
+        """
+        now = time.monotonic()
+        if self._health is not None and now - self._health_checked < self.health_ttl:
+            return self._health
+        if not self._health_lock.acquire(blocking=self._health is None):
+            return self._health
+        try:
+            for backend in self.backends:
+                try:
+                    response = self.session.get(backend.url + "/ready", timeout=(1.0, 2.0))
+                    backend.ready = response.status_code == 200
+                    backend.last_error = None if backend.ready else f"not ready ({response.status_code})"
+                except requests.exceptions.RequestException as e:
+                    backend.ready = False
+                    backend.last_error = str(e)
+                with self._lock:
+                    if backend.ready:
+                        backend.ejected_until = 0.0
+                        backend.failures = 0
+                    else:
+                        backend.ejected_until = time.monotonic() + self.eject_seconds
+            self._health = {
+                "online": any(b.ready for b in self.backends),
+                "strategy": self.strategy,
+                "backends": [b.describe() for b in self.backends],
+            }
+            self._health_checked = time.monotonic()
+            return self._health
+        finally:
+            self._health_lock.release()
@@ -0,0 +1,115 @@
+"""
+Tests for the micro-batching scheduler (backend/apps/model/batcher.py)
+"""
+import asyncio
+import types
+
+import pytest
+
+from backend.apps.model import batcher as batcher_module
+from backend.apps.model.batcher import MicroBatcher
+
+class FakePredictor:
+    """Records each forward pass; the result of an item is its tensor echoed back"""
+
+    def __init__(self, fail: bool = False):
+        self.calls = []
+        self.fail = fail
+
+    def predict_tensors(self, tensors, max_batch_size, model, tta):
+        self.calls.append((list(tensors), model.version, tta))
+        if self.fail:
+            raise RuntimeError("forward pass failed")
+        return [{"input": tensor, "version": model.version, "tta": tta} for tensor in tensors]
+
+@pytest.fixture
+def predictor(monkeypatch):
+    fake = FakePredictor()
+    monkeypatch.setattr(batcher_module.loader, "get_predictor", lambda: fake)
+    monkeypatch.setattr(batcher_module.loader, "mark_first_prediction", lambda: None)
+    return fake
+
+def model(version: str):
+    return types.SimpleNamespace(version=version)
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+def test_concurrent_requests_share_one_forward_pass(predictor):
+    async def scenario():
+        batcher = MicroBatcher(max_batch_size=8, max_wait_ms=50)
+        v1 = model("v1")
+        try:
+            return await asyncio.gather(*(batcher.submit(n, v1) for n in range(5))), batcher.stats()
+        finally:
+            await batcher.stop()
+
+    results, stats = run(scenario())
+
+    assert [result["input"] for result in results] == [0, 1, 2, 3, 4]
+    assert len(predictor.calls) == 1
+    assert stats["total_requests"] == 5
+    assert stats["batch_size_histogram"] == {"5": 1}
+
+def test_batches_are_capped_at_max_batch_size(predictor):
+    async def scenario():
+        batcher = MicroBatcher(max_batch_size=2, max_wait_ms=50)
+        v1 = model("v1")
+        try:
+            return await asyncio.gather(*(batcher.submit(n, v1) for n in range(5)))
+        finally:
+            await batcher.stop()
+
+    results = run(scenario())
+
+    assert [result["input"] for result in results] == [0, 1, 2, 3, 4]
+    assert [len(tensors) for tensors, _, _ in predictor.calls] == [2, 2, 1]
+
+def test_versions_and_tta_modes_run_separately(predictor):
+    async def scenario():
+        batcher = MicroBatcher(max_batch_size=8, max_wait_ms=50)
+        v1, v2 = model("v1"), model("v2")
+        try:
+            return await asyncio.gather(
+                batcher.submit("a", v1), batcher.submit("b", v2), batcher.submit("c", v1, "flip"), batcher.submit("d", v1)
+            )
+        finally:
+            await batcher.stop()
+
+    results = run(scenario())
+
+    assert [(result["input"], result["version"], result["tta"]) for result in results] == [
+        ("a", "v1", None), ("b", "v2", None), ("c", "v1", "flip"), ("d", "v1", None)
+    ]
+    assert sorted((version, str(tta), tensors) for tensors, version, tta in predictor.calls) == [
+        ("v1", "None", ["a", "d"]), ("v1", "flip", ["c"]), ("v2", "None", ["b"])
+    ]
+
+def test_forward_pass_errors_reach_every_caller(predictor):
+    predictor.fail = True
+
+    async def scenario():
+        batcher = MicroBatcher(max_batch_size=8, max_wait_ms=20)
+        v1 = model("v1")
+        try:
+            return await asyncio.gather(batcher.submit(1, v1), batcher.submit(2, v1), return_exceptions=True)
+        finally:
+            await batcher.stop()
+
+    outcomes = run(scenario())
+
+    assert all(isinstance(outcome, RuntimeError) for outcome in outcomes)
+
+def test_stop_fails_queued_requests(predictor):
+    async def scenario():
+        batcher = MicroBatcher(max_batch_size=8, max_wait_ms=1000)
+        await batcher.start()
+        # Occupy the worker with a first batch that waits out its window
+        first = asyncio.ensure_future(batcher.submit(1, model("v1")))
+        await asyncio.sleep(0.01)
+        await batcher.stop()
+        return await asyncio.gather(first, return_exceptions=True)
+
+    outcome, = run(scenario())
+
+    assert isinstance(outcome, RuntimeError)
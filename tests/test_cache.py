@@ -0,0 +1,92 @@
+"""
+Tests for the two-tier prediction cache (backend/apps/cache.py)
+"""
+import asyncio
+import os
+import threading
+import time
+
+from backend.apps import cache as cache_module
+from backend.apps.cache import PredictionCache, cache_key
+
+RESULT = {"class": "glass", "confidence": 0.85}
+
+def test_key_depends_on_content_and_model_version():
+    key = PredictionCache.key(b"image", "v1")
+
+    assert key == PredictionCache.key(b"image", "v1")
+    assert key != PredictionCache.key(b"image", "v2")
+    assert key != PredictionCache.key(b"other", "v1")
+
+def test_cache_key_matches_for_small_and_large_uploads():
+    small, large = b"x" * 10, b"x" * (cache_module.INLINE_HASH_BYTES + 1)
+
+    assert asyncio.run(cache_key(small, "v1")) == PredictionCache.key(small, "v1")
+    assert asyncio.run(cache_key(large, "v1")) == PredictionCache.key(large, "v1")
+
+def test_lru_evicts_least_recently_used():
+    cache = PredictionCache(max_entries=2, ttl_seconds=60, disk_dir="", enabled=True)
+    cache.put("a", RESULT)
+    cache.put("b", RESULT)
+    cache.get("a")
+    cache.put("c", RESULT)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == RESULT
+    assert cache.stats()["evictions"] == 1
+
+def test_entries_expire():
+    cache = PredictionCache(max_entries=2, ttl_seconds=0, disk_dir="", enabled=True)
+    cache.put("a", RESULT)
+
+    assert cache.get("a") is None
+    assert cache.stats()["expirations"] == 1
+
+def test_disabled_cache_stores_nothing():
+    cache = PredictionCache(enabled=False, disk_dir="")
+    cache.put("a", RESULT)
+
+    assert cache.get("a") is None
+
+def test_disk_tier_is_shared_and_promoted(tmp_path):
+    writer = PredictionCache(ttl_seconds=60, disk_dir=str(tmp_path), enabled=True)
+    reader = PredictionCache(ttl_seconds=60, disk_dir=str(tmp_path), enabled=True)
+    writer.put("ab12", RESULT)
+
+    assert reader.get("ab12") == RESULT
+    assert reader.get("ab12") == RESULT
+    stats = reader.stats()
+    assert (stats["disk_hits"], stats["memory_hits"]) == (1, 1)
+
+def test_async_disk_io_runs_off_the_event_loop(tmp_path, monkeypatch):
+    cache = PredictionCache(ttl_seconds=60, disk_dir=str(tmp_path), enabled=True)
+    threads = []
+    for name in ("_disk_get", "_disk_put"):
+        original = getattr(cache, name)
+
+        def recording(*args, _original=original):
+            threads.append(threading.current_thread())
+            return _original(*args)
+
+        monkeypatch.setattr(cache, name, recording)
+
+    async def scenario():
+        await cache.put_async("cd34", RESULT)
+        cache.clear()
+        return await cache.get_async("cd34"), await cache.get_async("ef56")
+
+    assert asyncio.run(scenario()) == (RESULT, None)
+    assert len(threads) == 3
+    assert threading.main_thread() not in threads
+
+def test_expired_disk_files_are_pruned_in_the_background(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache_module, "DISK_PRUNE_INTERVAL", 2)
+    cache = PredictionCache(ttl_seconds=0, disk_dir=str(tmp_path), enabled=True)
+    cache.put("aa01", RESULT)
+    cache.put("bb02", RESULT)
+
+    deadline = time.time() + 5
+    while cache.stats()["expirations"] < 2:
+        assert time.time() < deadline, "expired cache files were not pruned"
+        time.sleep(0.01)
+    assert not any(files for _, _, files in os.walk(tmp_path))
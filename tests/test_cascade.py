@@ -0,0 +1,85 @@
+"""
+Tests for the early-exit cascade (backend/apps/model/cascade.py)
+"""
+import types
+
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("torchvision")
+
+from backend.apps.model.cascade import Cascade, cascade_probabilities
+
+CLASSES = 4
+STUDENT_CLASS, FULL_CLASS = 1, 3
+
+class StubStudent(torch.nn.Module):
+    """Sure of STUDENT_CLASS for the rows listed in confident, unsure of the rest"""
+
+    def __init__(self, confident: set, teacher_version: str = "hash-a"):
+        super().__init__()
+        self.confident = confident
+        self.teacher_version = teacher_version
+        self.arch = "stub"
+
+    def forward(self, batch):
+        logits = torch.zeros(len(batch), CLASSES)
+        for row, image in enumerate(batch):
+            if int(image[0, 0, 0]) in self.confident:
+                logits[row, STUDENT_CLASS] = 10.0
+        return logits
+
+class StubNet(torch.nn.Module):
+    """Full model: sure of FULL_CLASS, recording which images it was given"""
+
+    def __init__(self):
+        super().__init__()
+        self.seen = []
+
+    def forward(self, batch):
+        self.seen.extend(int(image[0, 0, 0]) for image in batch)
+        logits = torch.zeros(len(batch), CLASSES)
+        logits[:, FULL_CLASS] = 10.0
+        return logits
+
+def numbered_batch(count: int) -> torch.Tensor:
+    """Image i is filled with the value i, so stubs can tell rows apart"""
+    return torch.arange(count, dtype=torch.float32).reshape(count, 1, 1, 1).expand(count, 3, 4, 4).contiguous()
+
+def test_only_unsure_rows_reach_the_full_model():
+    student, net = StubStudent(confident={0, 2, 3}), StubNet()
+
+    probabilities, escalated = cascade_probabilities(student, net, numbered_batch(5), threshold=0.9)
+
+    assert net.seen == [1, 4]
+    assert escalated.tolist() == [False, True, False, False, True]
+    assert probabilities.argmax(dim=1).tolist() == [STUDENT_CLASS, FULL_CLASS, STUDENT_CLASS, STUDENT_CLASS, FULL_CLASS]
+    assert torch.allclose(probabilities.sum(dim=1), torch.ones(5))
+
+def test_confident_batch_skips_the_full_model():
+    net = StubNet()
+
+    _, escalated = cascade_probabilities(StubStudent(confident={0, 1}), net, numbered_batch(2), threshold=0.9)
+
+    assert net.seen == []
+    assert not escalated.any()
+
+def make_cascade(student: StubStudent) -> Cascade:
+    hashes = {"a.pth": "hash-a", "b.pth": "hash-b"}
+    cascade = Cascade("student.pt", 0.9, torch.device("cpu"), fingerprint=lambda path: hashes[path])
+    cascade._student = student
+    return cascade
+
+def test_student_applies_only_to_its_teacher():
+    cascade = make_cascade(StubStudent(confident=set(), teacher_version="hash-a"))
+
+    assert cascade.applies_to(types.SimpleNamespace(path="a.pth", version="a"))
+    assert not cascade.applies_to(types.SimpleNamespace(path="b.pth", version="b"))
+
+def test_run_counts_escalations():
+    cascade = make_cascade(StubStudent(confident={0, 1, 2}))
+
+    cascade.run(StubNet(), numbered_batch(4))
+
+    stats = cascade.stats()
+    assert (stats["images"], stats["escalated"], stats["escalation_rate"]) == (4, 1, 0.25)
@@ -0,0 +1,100 @@
+"""
+Tests for multi-item detection (backend/apps/model/detect.py)
+"""
+import os
+import types
+
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("torchvision")
+
+from backend.apps.model.detect import detect_regions
+
+CLASSES = 3
+GRID = 16
+
+class FakeNetwork(torch.nn.Module):
+    """Returns a fixed feature map; its head maps channel c to class c"""
+
+    def __init__(self, feature_map: torch.Tensor):
+        super().__init__()
+        self.feature_map = feature_map.unsqueeze(0)
+        head = torch.nn.Linear(CLASSES, CLASSES)
+        head.weight.data = torch.eye(CLASSES) * 10
+        head.bias.data.zero_()
+        self.model = types.SimpleNamespace(fc=head)
+
+    def forward_feature_map(self, batch):
+        return self.feature_map
+
+def detect(feature_map: torch.Tensor, min_confidence: float = 0.7) -> tuple:
+    """(image class, [(box, class)]) for a (CLASSES, GRID, GRID) feature map"""
+    (image_probabilities, regions), = detect_regions(
+        FakeNetwork(feature_map), torch.zeros(1, 3, 512, 512), min_confidence, 10, 0.3
+    )
+    return int(image_probabilities.argmax()), [
+        ([round(v, 2) for v in box.tolist()], int(probabilities.argmax())) for box, probabilities in regions
+    ]
+
+def test_single_item_is_one_detection():
+    feature_map = torch.zeros(CLASSES, GRID, GRID)
+    feature_map[0] = 1
+
+    image_class, regions = detect(feature_map)
+
+    assert image_class == 0
+    assert regions == [([0.0, 0.0, 1.0, 1.0], 0)]
+
+def test_item_of_another_class_inside_the_main_one_is_reported():
+    feature_map = torch.zeros(CLASSES, GRID, GRID)
+    feature_map[0] = 1
+    feature_map[:, 2:6, 2:6] = 0
+    feature_map[2, 2:6, 2:6] = 1
+
+    _, regions = detect(feature_map)
+
+    assert sorted(label for _, label in regions) == [0, 2]
+    box = next(box for box, label in regions if label == 2)
+    assert box[0] <= 2 / GRID and box[2] >= 6 / GRID and box[2] <= 0.5
+
+def test_side_by_side_items_get_one_box_each():
+    feature_map = torch.zeros(CLASSES, GRID, GRID)
+    feature_map[0, :, :GRID // 2] = 1
+    feature_map[1, :, GRID // 2:] = 1
+
+    _, regions = detect(feature_map)
+
+    assert sorted(label for _, label in regions) == [0, 1]
+    left = next(box for box, label in regions if label == 0)
+    right = next(box for box, label in regions if label == 1)
+    assert left[0] == 0.0 and right[2] == 1.0
+
+def test_separate_items_of_one_class_are_not_merged():
+    feature_map = torch.zeros(CLASSES, GRID, GRID)
+    feature_map[0, 2:6, 2:6] = 1
+    feature_map[0, 10:14, 10:14] = 1
+
+    _, regions = detect(feature_map)
+
+    assert [label for _, label in regions] == [0, 0]
+
+def test_nothing_confident_is_no_detection():
+    _, regions = detect(torch.zeros(CLASSES, GRID, GRID))
+
+    assert regions == []
+
+def test_single_object_photo_is_one_detection():
+    from backend.apps.config import BASE_DIR, MODEL_PATH
+    if not os.path.exists(MODEL_PATH):
+        pytest.skip("model weights not available")
+    from backend.apps.model import predictor
+
+    model = predictor.load_model(activate=False)
+    with open(os.path.join(BASE_DIR, "test images", "battery_18.jpg"), "rb") as f:
+        tensor, size = predictor.preprocess_for_detection(f.read())
+
+    result, = predictor.detect_batch(tensor.unsqueeze(0), [size], model)
+
+    assert result["count"] == 1
+    assert result["detections"][0]["class"] == result["image"]["class"]
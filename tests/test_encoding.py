@@ -0,0 +1,84 @@
+"""
+Tests for response format negotiation and encoding (backend/apps/encoding.py)
+"""
+import json
+import math
+
+import numpy as np
+import pytest
+
+from backend.apps import encoding
+from backend.apps.config import CLASSES
+from backend.apps.encoding import (
+    JSON_MEDIA_TYPE, MSGPACK_MEDIA_TYPE, PROBABILITIES_MEDIA_TYPE, FAILED_CLASS_INDEX,
+    NotAcceptableError, negotiate, encode, decode_probabilities
+)
+
+def prediction(top: str, confidence: float) -> dict:
+    rest = (1 - confidence) / (len(CLASSES) - 1)
+    return {
+        "class": top,
+        "confidence": confidence,
+        "all_predictions": {name: confidence if name == top else round(rest, 4) for name in CLASSES},
+    }
+
+@pytest.mark.parametrize("accept, expected", [
+    (None, JSON_MEDIA_TYPE),
+    ("", JSON_MEDIA_TYPE),
+    ("*/*", JSON_MEDIA_TYPE),
+    ("application/json", JSON_MEDIA_TYPE),
+    ("application/vnd.garbage.probabilities", PROBABILITIES_MEDIA_TYPE),
+    ("application/json;q=0.5, application/vnd.garbage.probabilities", PROBABILITIES_MEDIA_TYPE),
+    ("application/vnd.garbage.probabilities;q=0, application/json", JSON_MEDIA_TYPE),
+    ("text/html, application/*;q=0.1", JSON_MEDIA_TYPE),
+])
+def test_negotiate(accept, expected):
+    assert negotiate(accept, probabilities=True) == expected
+
+def test_negotiate_rejects_unavailable_formats():
+    with pytest.raises(NotAcceptableError):
+        negotiate("text/html")
+    with pytest.raises(NotAcceptableError):
+        negotiate("application/vnd.garbage.probabilities", probabilities=False)
+
+def test_json_is_compact_and_parses_back():
+    content = {"results": [prediction("glass", 0.85)], "total": 1}
+
+    body = encode(content, JSON_MEDIA_TYPE)
+
+    assert b" " not in body
+    assert json.loads(body) == content
+
+def test_msgpack_round_trips_floats_exactly():
+    msgpack = pytest.importorskip("msgpack")
+    content = prediction("metal", 0.85)
+
+    body = encode(content, MSGPACK_MEDIA_TYPE)
+
+    assert msgpack.unpackb(body) == content
+
+def test_msgpack_is_offered_only_when_installed(monkeypatch):
+    monkeypatch.setattr(encoding, "msgpack", None)
+
+    assert MSGPACK_MEDIA_TYPE not in encoding.available_media_types()
+    with pytest.raises(NotAcceptableError):
+        negotiate(MSGPACK_MEDIA_TYPE)
+
+def test_probabilities_round_trip_with_failed_records():
+    predictions = [prediction("paper", 0.9), {"filename": "bad.jpg", "error": "Invalid image"}, prediction("shoes", 0.6)]
+
+    body = encode(None, PROBABILITIES_MEDIA_TYPE, predictions)
+    classes, probabilities = decode_probabilities(body)
+
+    assert len(body) == 4 + 3 * (1 + 2 * len(CLASSES))
+    assert classes.tolist() == [CLASSES.index("paper"), FAILED_CLASS_INDEX, CLASSES.index("shoes")]
+    assert probabilities.shape == (3, len(CLASSES))
+    assert math.isclose(probabilities[0, CLASSES.index("paper")], 0.9, abs_tol=1e-3)
+    assert np.isnan(probabilities[1]).all()
+
+def test_probabilities_rejects_unknown_version():
+    body = bytearray(encode(None, PROBABILITIES_MEDIA_TYPE, [prediction("glass", 0.7)]))
+    body[0] = 99
+
+    with pytest.raises(ValueError):
+        decode_probabilities(bytes(body))
@@ -0,0 +1,45 @@
+"""
+Tests for the bounded inference executor (backend/apps/executor.py)
+"""
+import asyncio
+import threading
+
+import pytest
+
+from backend.apps.executor import InferenceExecutor, ServerOverloadedError
+
+def test_pool_size_is_at_least_one():
+    assert InferenceExecutor(max_workers=0).max_workers == 1
+
+def test_run_uses_the_pool():
+    executor = InferenceExecutor(max_workers=1)
+    try:
+        name = asyncio.run(executor.run(lambda: threading.current_thread().name))
+    finally:
+        executor.shutdown()
+
+    assert name.startswith("inference")
+
+def test_slot_rejects_beyond_limit():
+    executor = InferenceExecutor(max_workers=1, max_in_flight=2)
+
+    with executor.slot(), executor.slot():
+        with pytest.raises(ServerOverloadedError):
+            with executor.slot():
+                pass
+        assert executor.stats()["in_flight"] == 2
+
+    stats = executor.stats()
+    assert stats["in_flight"] == 0
+    assert stats["peak_in_flight"] == 2
+    assert stats["rejected"] == 1
+
+def test_slot_is_released_on_error():
+    executor = InferenceExecutor(max_workers=1, max_in_flight=1)
+
+    with pytest.raises(ValueError):
+        with executor.slot():
+            raise ValueError("boom")
+
+    with executor.slot():
+        assert executor.stats()["in_flight"] == 1
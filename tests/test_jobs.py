@@ -0,0 +1,182 @@
+"""
+Tests for the SQLite job queue (backend/apps/jobs.py)
+"""
+import asyncio
+import time
+import types
+
+import pytest
+
+from backend.apps import jobs as jobs_module
+from backend.apps.executor import inference_executor
+from backend.apps.jobs import JobNotFoundError, JobQueueFullError, JobRunner, JobStore
+
+@pytest.fixture
+def store(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"), lease_seconds=60, max_attempts=2)
+    yield store
+    store.close()
+
+def images(count: int, size: int = 10) -> list:
+    return [(f"{n}.jpg", b"x" * size, None) for n in range(count)]
+
+def test_jobs_are_disabled_without_a_path():
+    assert not JobStore("").enabled
+
+def test_create_claim_and_finish(store):
+    job = store.create(images(3) + [("bad.txt", None, {"filename": "bad.txt", "error": "Invalid file format"})])
+
+    assert (job["state"], job["total"], job["completed"], job["failed"]) == ("queued", 4, 1, 1)
+    claimed = store.claim()
+    assert claimed["job_id"] == job["job_id"] and claimed["state"] == "running"
+    assert store.claim() is None
+
+    pending = store.pending(job["job_id"], 2)
+    assert [position for position, _, _ in pending] == [0, 1]
+    assert store.save_results(job["job_id"], [(0, {"class": "glass"}), (1, {"class": "paper"})], "v1")
+    store.save_results(job["job_id"], [(2, {"class": "metal"})], "v1")
+    store.finish(job["job_id"])
+
+    finished = store.get(job["job_id"])
+    assert (finished["state"], finished["completed"], finished["model_version"]) == ("succeeded", 4, "v1")
+    assert [result["index"] for result in store.results(job["job_id"])] == [0, 1, 2, 3]
+    # Results in the order they were stored: the rejected file first
+    assert [result["index"] for result in store.updates(job["job_id"])] == [3, 0, 1, 2]
+
+def test_all_rejected_job_is_finished_at_once(store):
+    job = store.create([("bad.txt", None, {"filename": "bad.txt", "error": "Invalid file format"})])
+
+    assert job["state"] == "succeeded"
+    assert store.claim() is None
+
+def test_queue_is_capped_by_job_count(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"), max_queued=1)
+    store.create(images(1))
+
+    with pytest.raises(JobQueueFullError):
+        store.create(images(1))
+    store.close()
+
+def test_queue_is_capped_by_waiting_bytes(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"), max_queued_bytes=1000)
+    job = store.create(images(1, size=600))
+
+    with pytest.raises(JobQueueFullError):
+        store.create(images(1, size=600))
+
+    # Stored results drop their image bytes, freeing room
+    store.claim()
+    store.save_results(job["job_id"], [(0, {"class": "glass"})], "v1")
+    store.create(images(1, size=600))
+    store.close()
+
+def test_expired_lease_is_claimed_again_then_abandoned(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"), lease_seconds=0, max_attempts=2)
+    job = store.create(images(1))
+
+    assert store.claim()["job_id"] == job["job_id"]
+    time.sleep(0.01)
+    assert store.claim()["job_id"] == job["job_id"]
+    time.sleep(0.01)
+    assert store.claim() is None
+    assert store.get(job["job_id"])["state"] == "failed"
+    store.close()
+
+def test_release_returns_the_job_without_counting_the_attempt(store):
+    job = store.create(images(1))
+    store.claim()
+
+    store.release(job["job_id"])
+
+    assert store.get(job["job_id"])["state"] == "queued"
+    assert store.claim()["job_id"] == job["job_id"]
+
+def test_delete_and_prune(store):
+    failed = store.create(images(1))
+    cancelled = store.create(images(1))
+    store.claim()
+    store.finish(failed["job_id"], "stopped")
+
+    assert store.delete(cancelled["job_id"])["state"] == "cancelled"
+    with pytest.raises(JobNotFoundError):
+        store.get(cancelled["job_id"])
+    assert store.prune(retention_seconds=-1) == 1
+    assert store.counts() == {"queued": 0, "running": 0, "succeeded": 0, "failed": 0}
+
+@pytest.fixture
+def runner(store, monkeypatch):
+    """JobRunner on a fake model that labels every image "trash" """
+    model = types.SimpleNamespace(version="v1", cache_version="v1")
+    monkeypatch.setattr(jobs_module.loader, "is_ready", lambda: True)
+    monkeypatch.setattr(jobs_module.loader, "mark_first_prediction", lambda: None)
+    monkeypatch.setattr(jobs_module.loader, "get_predictor", lambda: types.SimpleNamespace(get_loaded=lambda v: model))
+
+    runner = JobRunner(store, workers=1, poll_seconds=0.02, chunk_size=2)
+    chunks = []
+
+    async def run_chunk(predictor, model, tta, version_key, items):
+        chunks.append(inference_executor.stats()["in_flight"])
+        return [(position, {"filename": filename, "class": "trash"}) for position, filename, _ in items]
+
+    runner._run_chunk = run_chunk
+    runner.chunks = chunks
+    return runner
+
+async def wait_for_state(store: JobStore, job_id: str, state: str, timeout: float = 5):
+    deadline = time.time() + timeout
+    while store.get(job_id)["state"] != state:
+        assert time.time() < deadline, f"job did not reach {state}"
+        await asyncio.sleep(0.01)
+
+def test_runner_processes_jobs_in_chunks_holding_a_slot(store, runner):
+    async def scenario():
+        job = store.create(images(5))
+        await runner.start()
+        try:
+            await wait_for_state(store, job["job_id"], "succeeded")
+        finally:
+            await runner.stop()
+        return job
+
+    job = asyncio.run(scenario())
+
+    assert runner.chunks == [1, 1, 1]
+    assert len(store.results(job["job_id"])) == 5
+
+def test_runner_waits_while_the_server_is_saturated(store, runner, monkeypatch):
+    monkeypatch.setattr(inference_executor, "max_in_flight", 1)
+
+    async def scenario():
+        job = store.create(images(1))
+        await runner.start()
+        try:
+            with inference_executor.slot():
+                await wait_for_state(store, job["job_id"], "running")
+                await asyncio.sleep(0.1)
+                assert runner.chunks == []
+            await wait_for_state(store, job["job_id"], "succeeded")
+        finally:
+            await runner.stop()
+
+    asyncio.run(scenario())
+
+    assert runner.chunks == [1]
+
+def test_stopping_returns_the_running_job_to_the_queue(store, runner):
+    async def never_finishes(predictor, model, tta, version_key, items):
+        await asyncio.sleep(60)
+
+    runner._run_chunk = never_finishes
+
+    async def scenario():
+        job = store.create(images(1))
+        await runner.start()
+        await wait_for_state(store, job["job_id"], "running")
+        await runner.stop()
+        return job
+
+    job = asyncio.run(scenario())
+
+    reopened = JobStore(store.path)
+    assert reopened.get(job["job_id"])["state"] == "queued"
+    reopened.close()
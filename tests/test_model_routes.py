@@ -0,0 +1,42 @@
+"""
+Tests for the model management endpoints (backend/api/routes.py)
+"""
+import pytest
+from fastapi.testclient import TestClient
+
+from backend.api import routes
+from backend.apps.main import app
+
+@pytest.fixture
+def client():
+    return TestClient(app)
+
+@pytest.mark.parametrize("method, path", [
+    ("post", "/models/load"),
+    ("post", "/models/v2/activate"),
+    ("delete", "/models/v2"),
+])
+def test_management_is_disabled_without_a_token(client, monkeypatch, method, path):
+    monkeypatch.setattr(routes, "MODEL_ADMIN_TOKEN", "")
+
+    response = client.request(method, path, json={"path": "v2.pth"}, headers={"X-Admin-Token": ""})
+
+    assert response.status_code == 403
+    assert "MODEL_ADMIN_TOKEN" in response.json()["detail"]
+
+def test_management_requires_the_configured_token(client, monkeypatch):
+    monkeypatch.setattr(routes, "MODEL_ADMIN_TOKEN", "secret")
+
+    assert client.post("/models/v2/activate", headers={"X-Admin-Token": "wrong"}).status_code == 403
+    # The right token gets past the check (no model is loaded in the tests)
+    assert client.post("/models/v2/activate", headers={"X-Admin-Token": "secret"}).status_code != 403
+
+def test_several_workers_need_the_shared_registry_state(client, monkeypatch):
+    monkeypatch.setattr(routes, "MODEL_ADMIN_TOKEN", "secret")
+    monkeypatch.setattr(routes, "API_WORKERS", 2)
+    monkeypatch.setattr(routes.registry_state, "path", "")
+
+    response = client.post("/models/v2/activate", headers={"X-Admin-Token": "secret"})
+
+    assert response.status_code == 409
+    assert "MODEL_REGISTRY_DB_PATH" in response.json()["detail"]
@@ -0,0 +1,63 @@
+"""
+Parity of the fast preprocessing engine with the original torchvision
+pipeline (backend/apps/model/preprocess.py, predictor.preprocess_bytes)
+"""
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+pytest.importorskip("torchvision")
+
+from backend.apps.model import predictor
+from backend.utils.image_utils import decode_image
+
+def photo(width: int, height: int, mode: str = "RGB", seed: int = 0) -> Image.Image:
+    """Colour gradients with sensor-like noise"""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width]
+    pixels = np.stack([x * 255 / width, y * 255 / height, (x + y) * 127 / (width + height)], axis=-1)
+    pixels += rng.normal(0, 8, pixels.shape)
+    return Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8)).convert(mode)
+
+def encode(image: Image.Image, fmt: str, **options) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, fmt, **options)
+    return buffer.getvalue()
+
+def reference(content: bytes):
+    """The original PIL + Resize/ToTensor/Normalize path"""
+    return predictor.transform(decode_image(content))
+
+@pytest.mark.parametrize("content", [
+    encode(photo(300, 200), "PNG"),
+    encode(photo(300, 200, "RGBA"), "PNG"),
+    encode(photo(300, 200, "L"), "PNG"),
+    # Too small for a reduced-scale JPEG decode
+    encode(photo(300, 260), "JPEG", quality=95),
+], ids=["png", "rgba", "greyscale", "small_jpeg"])
+def test_full_decodes_match_torchvision(content):
+    difference = (predictor.preprocess_bytes(content) - reference(content)).abs()
+
+    assert difference.max().item() <= 1e-5
+
+@pytest.mark.parametrize("size", [(1600, 1200), (4032, 3024)])
+def test_draft_decoded_jpegs_stay_close_to_torchvision(size):
+    content = encode(photo(*size), "JPEG", quality=92)
+
+    difference = (predictor.preprocess_bytes(content) - reference(content)).abs()
+
+    # Normalised units: 0.1 is about 6 grey levels
+    assert difference.max().item() <= 0.1
+    assert difference.mean().item() <= 0.02
+
+def test_batch_buffer_rows_match_single_tensors():
+    contents = [encode(photo(400, 300, seed=seed), "JPEG", quality=90) for seed in range(3)]
+    batch = predictor.new_batch_buffer(len(contents))
+
+    for row, content in zip(batch, contents):
+        predictor.preprocess_bytes(content, out=row)
+
+    for row, content in zip(batch, contents):
+        assert (row - predictor.preprocess_bytes(content)).abs().max().item() == 0
@@ -0,0 +1,76 @@
+"""
+Tests for the model version registry (backend/apps/model/registry.py)
+"""
+import time
+
+import pytest
+
+from backend.apps.model import registry as registry_module
+from backend.apps.model.registry import ModelRegistry, ModelVersionError
+
+def make_registry(max_loaded: int = 2) -> ModelRegistry:
+    return ModelRegistry(
+        builder=lambda path, backend: (object(), f"v-{path}"),
+        warmer=lambda net: 0.0,
+        sizer=lambda net: 1.0,
+        max_loaded=max_loaded,
+    )
+
+def wait_for(registry: ModelRegistry, job_id: str) -> dict:
+    deadline = time.time() + 5
+    while registry.status()["jobs"][job_id]["state"] == "loading":
+        assert time.time() < deadline, f"load job {job_id} did not finish"
+        time.sleep(0.01)
+    return registry.status()["jobs"][job_id]
+
+def test_load_job_reports_ready():
+    registry = make_registry()
+
+    registry.load_in_background("a.pth", "eager", version="a")
+
+    assert wait_for(registry, "a")["state"] == "ready"
+    assert registry.active_version() == "a"
+
+def test_evicted_version_marks_its_load_job():
+    registry = make_registry(max_loaded=2)
+    for version in ("a", "b", "c"):
+        registry.load_in_background(f"{version}.pth", "eager", version=version, activate=False)
+        wait_for(registry, version)
+
+    jobs = registry.status()["jobs"]
+    assert registry.versions() == ["a", "c"]
+    assert jobs["b"]["state"] == "evicted"
+    assert jobs["c"]["state"] == "ready"
+
+def test_unloaded_version_marks_its_load_job():
+    registry = make_registry()
+    registry.load("a.pth", "eager", version="a")
+    registry.load_in_background("b.pth", "eager", version="b", activate=False)
+    wait_for(registry, "b")
+
+    registry.unload("b")
+
+    assert registry.status()["jobs"]["b"]["state"] == "unloaded"
+    with pytest.raises(ModelVersionError):
+        registry.get("b")
+
+def test_finished_load_jobs_are_capped(monkeypatch):
+    monkeypatch.setattr(registry_module, "MAX_FINISHED_JOBS", 3)
+    registry = make_registry()
+
+    for n in range(6):
+        registry.load_in_background(f"{n}.pth", "eager", version=f"v{n}")
+        wait_for(registry, f"v{n}")
+
+    # The cap applies before each new job is added
+    assert list(registry.status()["jobs"]) == ["v2", "v3", "v4", "v5"]
+
+def test_reloading_a_version_name_changes_its_cache_version():
+    registry = make_registry()
+
+    first = registry.load("a.pth", "eager", version="prod")
+    second = registry.load("b.pth", "eager", version="prod")
+
+    assert registry.get("prod") is second
+    assert first.cache_version != second.cache_version
+    assert registry.load("c.pth", "eager").cache_version == "v-c.pth"
@@ -0,0 +1,141 @@
+"""
+Tests for the registry state shared between workers (backend/apps/model/registry_state.py)
+"""
+import time
+
+import pytest
+
+from backend.apps.model.registry import ModelRegistry, ModelVersionError
+from backend.apps.model.registry_state import RegistryStateStore, RegistrySync
+
+class Worker:
+    """One API worker: its own registry, synced through the shared store"""
+
+    def __init__(self, db_path: str, builder=None):
+        self.builds = []
+
+        def build(path, backend):
+            self.builds.append(path)
+            if builder is not None:
+                return builder(path, backend)
+            return object(), f"v-{path}"
+
+        self.registry = ModelRegistry(builder=build, warmer=lambda net: 0.0, sizer=lambda net: 1.0, max_loaded=2)
+        self.registry.load("default.pth", "eager")
+        self.store = RegistryStateStore(db_path, max_loaded=2)
+        self.sync = RegistrySync(self.registry, self.store, poll_seconds=0.02)
+
+    def settle(self):
+        """Apply the shared state until no load is running"""
+        deadline = time.time() + 5
+        while True:
+            self.sync.apply()
+            jobs = self.registry.status()["jobs"].values()
+            if not any(job["state"] == "loading" for job in jobs):
+                self.sync.apply()
+                return
+            assert time.time() < deadline, "registry did not settle"
+            time.sleep(0.01)
+
+@pytest.fixture
+def workers(tmp_path):
+    workers = [Worker(str(tmp_path / "registry.sqlite3")) for _ in range(2)]
+    yield workers
+    for worker in workers:
+        worker.sync.stop()
+        worker.store.close()
+
+def test_nothing_changes_before_state_is_recorded(workers):
+    first, _ = workers
+
+    first.sync.apply()
+
+    assert first.registry.versions() == ["v-default.pth"]
+
+def test_load_and_activate_reach_every_worker(workers):
+    first, second = workers
+
+    first.store.load("v2", "v2.pth", "eager", activate=True, seed=first.sync.seed())
+    for worker in workers:
+        worker.settle()
+
+    for worker in workers:
+        assert worker.registry.active_version() == "v2"
+        assert sorted(worker.registry.versions()) == ["v-default.pth", "v2"]
+
+    # Roll back through the other worker
+    second.store.activate("v-default.pth", seed=second.sync.seed())
+    for worker in workers:
+        worker.settle()
+    assert [worker.registry.active_version() for worker in workers] == ["v-default.pth"] * 2
+
+def test_unload_reaches_every_worker(workers):
+    first, second = workers
+    first.store.load("v2", "v2.pth", "eager", activate=False, seed=first.sync.seed())
+    for worker in workers:
+        worker.settle()
+
+    with pytest.raises(ModelVersionError):
+        second.store.unload("v-default.pth", seed=second.sync.seed())
+    second.store.unload("v2", seed=second.sync.seed())
+    for worker in workers:
+        worker.settle()
+
+    assert [worker.registry.versions() for worker in workers] == [["v-default.pth"]] * 2
+
+def test_reloading_a_name_from_another_file_replaces_it(workers):
+    first, second = workers
+    first.store.load("prod", "a.pth", "eager", activate=True, seed=first.sync.seed())
+    for worker in workers:
+        worker.settle()
+
+    first.store.load("prod", "b.pth", "eager", activate=True, seed=first.sync.seed())
+    for worker in workers:
+        worker.settle()
+
+    assert [worker.registry.get("prod").path for worker in workers] == ["b.pth"] * 2
+
+def test_a_worker_started_later_catches_up(tmp_path, workers):
+    first, _ = workers
+    first.store.load("v2", "v2.pth", "eager", activate=True, seed=first.sync.seed())
+
+    late = Worker(str(tmp_path / "registry.sqlite3"))
+    late.sync.start()
+    deadline = time.time() + 5
+    while late.registry.active_version() != "v2":
+        assert time.time() < deadline, "late worker did not load v2"
+        time.sleep(0.01)
+    late.sync.stop()
+    late.store.close()
+
+def test_failed_load_is_not_retried_until_requested_again(tmp_path):
+    def builder(path, backend):
+        if path == "broken.pth":
+            raise RuntimeError("bad checkpoint")
+        return object(), f"v-{path}"
+
+    worker = Worker(str(tmp_path / "registry.sqlite3"), builder=builder)
+    worker.store.load("v2", "broken.pth", "eager", activate=True, seed=worker.sync.seed())
+
+    worker.settle()
+    time.sleep(0.2)
+    worker.settle()
+    assert worker.builds.count("broken.pth") == 1
+    assert worker.registry.active_version() == "v-default.pth"
+
+    worker.store.load("v2", "broken.pth", "eager", activate=True, seed=worker.sync.seed())
+    worker.settle()
+    assert worker.builds.count("broken.pth") == 2
+    worker.store.close()
+
+def test_state_keeps_at_most_max_loaded_versions(tmp_path):
+    store = RegistryStateStore(str(tmp_path / "registry.sqlite3"), max_loaded=2)
+    seed = {"models": {"v1": {"path": "v1.pth", "backend": "eager", "added_at": 0}}, "active": "v1"}
+
+    store.load("v2", "v2.pth", "eager", activate=True, seed=seed)
+    state = store.load("v3", "v3.pth", "eager", activate=False, seed=seed)
+
+    assert sorted(state["models"]) == ["v2", "v3"]
+    assert state["active"] == "v2"
+    assert store.read()[0] == 2
+    store.close()
@@ -0,0 +1,95 @@
+"""
+Tests for the streaming helpers (backend/apps/stream.py)
+"""
+import asyncio
+
+import numpy as np
+import pytest
+
+from backend.apps.stream import LatestFrame, PredictionSmoother, StreamClassifier
+
+def prediction(label: str, cat: float) -> dict:
+    return {"class": label, "confidence": max(cat, 1 - cat), "all_predictions": {"cat": cat, "dog": 1 - cat}}
+
+def test_slow_consumer_only_sees_the_newest_frame():
+    async def scenario():
+        mailbox = LatestFrame()
+        inference_done = asyncio.Event()
+        taken = []
+
+        async def consumer():
+            while (frame := await mailbox.get()) is not None:
+                taken.append(frame[:2])
+                # A slow inference, during which several frames arrive
+                await inference_done.wait()
+                inference_done.clear()
+
+        task = asyncio.create_task(consumer())
+        mailbox.put(b"frame0")
+        await asyncio.sleep(0)
+        for n in range(1, 5):
+            mailbox.put(f"frame{n}".encode())
+        inference_done.set()
+        await asyncio.sleep(0)
+        inference_done.set()
+        mailbox.close()
+        await task
+        return mailbox, taken
+
+    mailbox, taken = asyncio.run(scenario())
+
+    assert taken == [(1, b"frame0"), (5, b"frame4")]
+    assert (mailbox.received, mailbox.dropped) == (5, 3)
+
+def test_get_after_close_returns_none():
+    async def scenario():
+        mailbox = LatestFrame()
+        mailbox.put(b"pending")
+        mailbox.close()
+        return await mailbox.get()
+
+    assert asyncio.run(scenario()) is None
+
+def test_ema_converges_geometrically():
+    smoother = PredictionSmoother("ema", alpha=0.5)
+    smoother.update(prediction("cat", 1.0))
+
+    # The average closes half the remaining gap to a steady input each step
+    results = [smoother.update(prediction("dog", 0.0)) for _ in range(6)]
+
+    assert [r["all_predictions"]["cat"] for r in results] == pytest.approx([0.5 ** n for n in range(1, 7)], abs=1e-4)
+    assert [r["class"] for r in results] == ["cat"] + ["dog"] * 5
+    assert all(r["raw_class"] == "dog" for r in results)
+
+def test_majority_keeps_the_current_label_on_a_tie():
+    smoother = PredictionSmoother("majority", window=4)
+
+    labels = [smoother.update(prediction(label, 0.9 if label == "cat" else 0.1))["class"]
+              for label in ["cat", "dog", "dog", "cat", "dog", "dog"]]
+
+    # cat, tie, dog wins, tie keeps dog, dog wins, dog wins
+    assert labels == ["cat", "cat", "dog", "dog", "dog", "dog"]
+
+def test_unknown_smoothing_mode_is_rejected():
+    with pytest.raises(ValueError):
+        PredictionSmoother("median")
+
+def test_unchanged_frames_are_skipped_up_to_the_limit():
+    stream = StreamClassifier(change_threshold=4, max_skip_frames=2, smoother=PredictionSmoother("none"))
+    still = np.zeros((32, 32), dtype=np.int16)
+    calls = []
+
+    def predict(signature):
+        calls.append(signature)
+        return prediction("cat", 0.9)
+
+    results = []
+    for signature in [still, still, still, still, still + 10]:
+        if stream.should_infer(signature):
+            results.append(stream.update(predict(signature), signature))
+        else:
+            results.append(stream.reuse())
+
+    assert [r["skipped"] for r in results] == [False, True, True, False, False]
+    assert len(calls) == 3
+    assert stream.stats() == {"frames": 5, "inferred": 3, "skipped": 2, "skip_rate": 0.4}
@@ -0,0 +1,70 @@
+"""
+Tests for test-time augmentation views (backend/apps/model/tta.py)
+"""
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from backend.apps.model.tta import TTA_MODES, tta_probabilities, tta_views, view_count
+
+EXPECTED_VIEWS = {"flip": 2, "five_crop": 5, "ten_crop": 10, "multi_scale": 6}
+
+def small_net():
+    """Random conv net, deterministic and not flip-invariant"""
+    torch.manual_seed(0)
+    return torch.nn.Sequential(
+        torch.nn.Conv2d(3, 4, 3, padding=1),
+        torch.nn.ReLU(),
+        torch.nn.Flatten(),
+        torch.nn.Linear(4 * 16 * 16, 5),
+    ).eval()
+
+def test_every_mode_has_an_expected_view_count():
+    assert set(TTA_MODES) == set(EXPECTED_VIEWS)
+
+@pytest.mark.parametrize("mode", EXPECTED_VIEWS)
+def test_views_are_view_major(mode):
+    # Image i is filled with the value i, which every crop and flip keeps
+    batch = torch.arange(3, dtype=torch.float32).reshape(3, 1, 1, 1).expand(3, 3, 16, 16).contiguous()
+
+    views = tta_views(batch, mode)
+
+    assert view_count(mode) == EXPECTED_VIEWS[mode]
+    assert views.shape == (EXPECTED_VIEWS[mode] * 3, 3, 16, 16)
+    for row, view in enumerate(views):
+        assert torch.allclose(view, torch.full_like(view, row % 3))
+
+@pytest.mark.parametrize("mode", ["flip", "ten_crop", "multi_scale"])
+def test_flipped_modes_end_with_the_mirrored_views(mode):
+    batch = torch.randn(2, 3, 16, 16)
+
+    views = tta_views(batch, mode)
+    half = len(views) // 2
+
+    assert torch.equal(views[half:], torch.flip(views[:half], dims=[3]))
+
+def test_flip_on_a_symmetric_image_matches_the_plain_prediction():
+    net = small_net()
+    half = torch.randn(2, 3, 16, 8)
+    batch = torch.cat([half, torch.flip(half, dims=[3])], dim=3)
+
+    with torch.no_grad():
+        plain = torch.softmax(net(batch), dim=1)
+
+    assert torch.allclose(tta_probabilities(net, batch, "flip", max_forward=64), plain, atol=1e-6)
+
+def test_chunked_forward_passes_give_the_same_probabilities():
+    net = small_net()
+    batch = torch.randn(5, 3, 16, 16)
+
+    together = tta_probabilities(net, batch, "ten_crop", max_forward=64)
+    # Fewer views per pass than one image has: still one image at a time
+    one_by_one = tta_probabilities(net, batch, "ten_crop", max_forward=4)
+
+    assert together.shape == (5, 5)
+    assert torch.allclose(together, one_by_one, atol=1e-6)
+    assert torch.allclose(together.sum(dim=1), torch.ones(5))
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError):
+        tta_views(torch.zeros(1, 3, 16, 16), "rotate")
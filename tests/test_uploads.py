@@ -0,0 +1,121 @@
+"""
+Tests for bounded upload handling (backend/apps/uploads.py, read_archive)
+"""
+import asyncio
+import io
+import tarfile
+import zipfile
+
+import pytest
+from fastapi import FastAPI, Request, UploadFile
+from fastapi.testclient import TestClient
+
+from backend.apps.uploads import (
+    BodySizeLimitMiddleware, UploadRejectedError, read_upload, sniff_image_format
+)
+from backend.utils.image_utils import ArchiveError, ArchiveTooLargeError, read_archive
+
+JPEG = b"\xff\xd8\xff\xe0" + b"\0" * 100
+MB = 1024 * 1024
+
+def upload(content: bytes) -> UploadFile:
+    return UploadFile(io.BytesIO(content), size=len(content), filename="image.jpg")
+
+def zip_archive(members: dict) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, content in members.items():
+            archive.writestr(name, content)
+    return buffer.getvalue()
+
+def tar_archive(members: dict) -> bytes:
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as archive:
+        for name, content in members.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            archive.addfile(info, io.BytesIO(content))
+    return buffer.getvalue()
+
+@pytest.mark.parametrize("head, expected", [
+    (b"\xff\xd8\xff\xdb", "jpeg"),
+    (b"\x89PNG\r\n\x1a\n....", "png"),
+    (b"GIF89a", "gif"),
+    (b"BM....", "bmp"),
+    (b"<html>", None),
+])
+def test_sniff_image_format(head, expected):
+    assert sniff_image_format(head) == expected
+
+def test_read_upload_returns_image_bytes():
+    assert asyncio.run(read_upload(upload(JPEG), MB)) == JPEG
+
+def test_read_upload_rejects_oversized_files():
+    with pytest.raises(UploadRejectedError) as error:
+        asyncio.run(read_upload(upload(JPEG), 10))
+    assert error.value.too_large
+
+def test_read_upload_rejects_non_images():
+    with pytest.raises(UploadRejectedError) as error:
+        asyncio.run(read_upload(upload(b"#!/bin/sh\necho hi"), MB))
+    assert not error.value.too_large
+
+def limited_app(limit: int) -> TestClient:
+    app = FastAPI()
+
+    @app.post("/upload")
+    async def receive(request: Request):
+        return {"bytes": len(await request.body())}
+
+    return TestClient(BodySizeLimitMiddleware(app, {"/upload": limit}))
+
+def test_body_within_limit_is_accepted():
+    response = limited_app(1000).post("/upload", content=b"x" * 1000)
+
+    assert response.status_code == 200
+    assert response.json() == {"bytes": 1000}
+
+def test_declared_length_over_limit_is_rejected_unread():
+    response = limited_app(1000).post("/upload", content=b"x" * 1001)
+
+    assert response.status_code == 413
+
+def test_streamed_body_over_limit_is_cut_off():
+    def chunks():
+        for _ in range(10):
+            yield b"x" * 500
+
+    response = limited_app(1000).post("/upload", content=chunks())
+
+    assert response.status_code == 413
+
+@pytest.mark.parametrize("build", [zip_archive, tar_archive])
+def test_read_archive_skips_hidden_and_oversized_members(build):
+    content = build({"a.jpg": JPEG, "big.jpg": b"x" * 200, ".hidden.jpg": JPEG, "__MACOSX/._a.jpg": JPEG})
+
+    members = dict(read_archive(content, max_members=10, max_member_bytes=150))
+
+    assert members == {"a.jpg": JPEG, "big.jpg": None}
+
+def test_read_archive_rejects_understated_member_sizes():
+    content = bytearray(zip_archive({"a.jpg": b"x" * 1000}))
+    # Understate the uncompressed size in the central directory
+    directory = content.rfind(b"PK\x01\x02")
+    content[directory + 24:directory + 28] = (10).to_bytes(4, "little")
+
+    with pytest.raises(ArchiveError):
+        read_archive(bytes(content), max_members=10, max_member_bytes=100)
+
+@pytest.mark.parametrize("build", [zip_archive, tar_archive])
+def test_read_archive_stops_at_total_size(build):
+    content = build({f"{n}.jpg": b"\0" * MB for n in range(8)})
+
+    assert len(read_archive(content, max_members=10, max_member_bytes=2 * MB)) == 8
+    with pytest.raises(ArchiveTooLargeError):
+        read_archive(content, max_members=10, max_member_bytes=2 * MB, max_total_bytes=3 * MB)
+
+def test_read_archive_rejects_too_many_members_and_garbage():
+    with pytest.raises(ArchiveError):
+        read_archive(zip_archive({f"{n}.jpg": JPEG for n in range(3)}), max_members=2, max_member_bytes=MB)
+    with pytest.raises(ArchiveError):
+        read_archive(b"not an archive", max_members=2, max_member_bytes=MB)
@@ -0,0 +1,77 @@
+"""
+Tests for the float16 embedding index (backend/apps/vector_index.py)
+"""
+import numpy as np
+import pytest
+
+from backend.apps.vector_index import VectorIndex, normalize
+
+DIM = 32
+
+def clustered(count: int, clusters: int = 16, seed: int = 0) -> np.ndarray:
+    """Unit vectors around a few random centres, like embeddings of a few classes"""
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((clusters, DIM))
+    return normalize(centres[rng.integers(clusters, size=count)] + 0.3 * rng.standard_normal((count, DIM)))
+
+@pytest.fixture
+def index(tmp_path):
+    index = VectorIndex.create(str(tmp_path / "index"), DIM, model_version="v1")
+    vectors = clustered(2000)
+    index.add(vectors, [{"path": f"{n}.jpg"} for n in range(len(vectors))], model_version="v1")
+    return index
+
+def test_add_and_search_round_trip(index):
+    queries = index.vectors(10, 13)
+
+    results = index.search(queries, k=3)
+
+    assert [neighbours[0][0] for neighbours in results] == [10, 11, 12]
+    assert all(neighbours[0][1] == pytest.approx(1.0, abs=1e-3) for neighbours in results)
+    assert all(a[1] >= b[1] for neighbours in results for a, b in zip(neighbours, neighbours[1:]))
+    assert index.metadata([10, 12]) == [{"path": "10.jpg"}, {"path": "12.jpg"}]
+
+def test_ivf_recall_against_exact_search(index):
+    queries = clustered(50, seed=1)
+    exact = index.search(queries, k=10, exact=True)
+
+    index.train_ivf(lists=16, seed=0)
+    approximate = index.search(queries, k=10, probes=4)
+
+    found = sum(len({i for i, _ in a} & {i for i, _ in e}) for a, e in zip(approximate, exact))
+    assert found / (10 * len(queries)) >= 0.9
+    # Probing every partition finds exactly what the full scan finds
+    assert index.search(queries, k=10, probes=16) == exact
+
+def test_rows_added_after_training_are_searched(index):
+    index.train_ivf(lists=16, seed=0)
+    extra = clustered(5, seed=2)
+
+    ids = index.add(extra, [{"path": f"extra{n}.jpg"} for n in range(5)], model_version="v1")
+
+    assert [neighbours[0][0] for neighbours in index.search(extra, k=1, probes=1)] == list(ids)
+
+def test_reopen_sees_the_same_rows(index):
+    reopened = VectorIndex(str(index.path))
+
+    assert (reopened.count, reopened.dim, reopened.model_version) == (2000, DIM, "v1")
+    assert reopened.search(index.vectors(5, 6), k=1)[0][0][0] == 5
+    assert reopened.metadata([1999]) == [{"path": "1999.jpg"}]
+
+def test_truncate_drops_rows_and_allows_resuming(index):
+    index.train_ivf(lists=16, seed=0)
+
+    index.truncate(100)
+    reopened = VectorIndex(str(index.path))
+
+    assert reopened.count == 100
+    assert reopened.ivf is None
+    assert (index.path / "vectors.f16").stat().st_size == 100 * DIM * 2
+    ids = reopened.add(clustered(3, seed=3), [{"path": f"new{n}.jpg"} for n in range(3)], model_version="v1")
+    assert list(ids) == [100, 101, 102]
+    assert reopened.metadata([100]) == [{"path": "new0.jpg"}]
+
+def test_other_model_version_is_rejected(index):
+    with pytest.raises(ValueError):
+        index.add(clustered(1), [{"path": "other.jpg"}], model_version="v2")
+    assert index.count == 2000